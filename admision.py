@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+def _entero(nombre: str, defecto: int) -> int:
+    return int(os.getenv(nombre, str(defecto)))
+
+
+def _decimal(nombre: str, defecto: float) -> float:
+    return float(os.getenv(nombre, str(defecto)))
+
+
+# Límites de histograma para el tiempo en cola (milisegundos)
+BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500)
+
+
+class Rechazada(Exception):
+    """La petición no cabe en la cola del grupo"""
+
+    def __init__(self, grupo: str, retry_after: int):
+        self.grupo = grupo
+        self.retry_after = retry_after
+
+
+@dataclass
+class MetricasGrupo:
+    aceptadas: int = 0
+    rechazadas: int = 0
+    espera_total_ms: float = 0.0
+    espera_maxima_ms: float = 0.0
+    histograma: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS_MS) + 1))
+
+    def registrar_espera(self, espera_ms: float) -> None:
+        self.aceptadas += 1
+        self.espera_total_ms += espera_ms
+        self.espera_maxima_ms = max(self.espera_maxima_ms, espera_ms)
+        for i, limite in enumerate(BUCKETS_MS):
+            if espera_ms <= limite:
+                self.histograma[i] += 1
+                return
+        self.histograma[-1] += 1
+
+
+class LimitadorGrupo:
+    """
+    Semáforo de concurrencia con cola acotada para un grupo de rutas.
+
+    Como máximo `concurrencia` peticiones se ejecutan a la vez y como máximo
+    `cola` esperan turno; el resto, o las que esperan más de `espera_maxima`
+    segundos, se rechazan de inmediato con 503.
+    """
+
+    def __init__(self, nombre: str, concurrencia: int, cola: int, espera_maxima: float, retry_after: int):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.cola = cola
+        self.espera_maxima = espera_maxima
+        self.retry_after = retry_after
+        self._semaforo = asyncio.Semaphore(concurrencia)
+        self.en_ejecucion = 0
+        self.en_cola = 0
+        self.metricas = MetricasGrupo()
+
+    async def adquirir(self) -> None:
+        # Hay cupo libre: acquire() retorna sin ceder el event loop
+        if not self._semaforo.locked():
+            await self._semaforo.acquire()
+            self.en_ejecucion += 1
+            self.metricas.registrar_espera(0.0)
+            return
+
+        if self.en_cola >= self.cola:
+            self.metricas.rechazadas += 1
+            raise Rechazada(self.nombre, self.retry_after)
+
+        inicio = time.perf_counter()
+        self.en_cola += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera_maxima)
+        except asyncio.TimeoutError:
+            self.metricas.rechazadas += 1
+            raise Rechazada(self.nombre, self.retry_after)
+        finally:
+            self.en_cola -= 1
+
+        self.en_ejecucion += 1
+        self.metricas.registrar_espera((time.perf_counter() - inicio) * 1000)
+
+    def liberar(self) -> None:
+        self.en_ejecucion -= 1
+        self._semaforo.release()
+
+    def resumen(self) -> dict:
+        metricas = self.metricas
+        return {
+            "concurrencia": self.concurrencia,
+            "cola_maxima": self.cola,
+            "en_ejecucion": self.en_ejecucion,
+            "en_cola": self.en_cola,
+            "aceptadas": metricas.aceptadas,
+            "rechazadas": metricas.rechazadas,
+            "espera_media_ms": round(metricas.espera_total_ms / metricas.aceptadas, 3) if metricas.aceptadas else 0.0,
+            "espera_maxima_ms": round(metricas.espera_maxima_ms, 3),
+            "histograma_espera_ms": {
+                **{f"<={limite}": n for limite, n in zip(BUCKETS_MS, metricas.histograma)},
+                f">{BUCKETS_MS[-1]}": metricas.histograma[-1]
+            }
+        }
+
+
+def _crear_grupo(nombre: str, concurrencia: int, cola: int, espera: float, retry_after: int) -> LimitadorGrupo:
+    prefijo = f"ADMISION_{nombre.upper()}"
+    return LimitadorGrupo(
+        nombre,
+        concurrencia=_entero(f"{prefijo}_CONCURRENCIA", concurrencia),
+        cola=_entero(f"{prefijo}_COLA", cola),
+        espera_maxima=_decimal(f"{prefijo}_ESPERA", espera),
+        retry_after=_entero(f"{prefijo}_RETRY_AFTER", retry_after)
+    )
+
+
+# ====== GRUPOS DE RUTAS ======
+
+# Analítica pesada: pocas a la vez para no agotar el threadpool (40 hilos)
+ANALITICA = _crear_grupo("analitica", concurrencia=4, cola=8, espera=2.0, retry_after=5)
+# Consultas ligeras: límites holgados, solo protegen de avalanchas
+LIGERA = _crear_grupo("ligera", concurrencia=32, cola=256, espera=5.0, retry_after=1)
+
+GRUPOS: Dict[str, LimitadorGrupo] = {g.nombre: g for g in (ANALITICA, LIGERA)}
+
+# (método, patrón de ruta, parámetros que la vuelven ligera)
+RUTAS_ANALITICA: List[Tuple[str, re.Pattern, Tuple[str, ...]]] = [
+    ("GET", re.compile(r"^/estadisticas/?$"), ("jugador_id", "partido_id")),
+    ("GET", re.compile(r"^/estadisticas/html/jugador/\d+$"), ()),
+    ("GET", re.compile(r"^/partidos/html/lista$"), ()),
+    ("GET", re.compile(r"^/jugadores/html/lista$"), ()),
+    ("GET", re.compile(r"^/clubes/resumen$"), ()),
+    ("GET", re.compile(r"^/partidos/eventos/histograma$"), ("partido_id",)),
+]
+
+# Rutas sin control: archivos estáticos, streams de larga duración y
+# administración (el perfilado tiene que funcionar con el servidor saturado)
+EXCLUIDAS = re.compile(r"^/static/|^/partidos/\d+/live$|^/admin/")
+
+
+def grupo_para(request: Request) -> Optional[LimitadorGrupo]:
+    """Clasificar la petición en un grupo de admisión"""
+    ruta = request.url.path
+    if EXCLUIDAS.match(ruta):
+        return None
+
+    for metodo, patron, filtros in RUTAS_ANALITICA:
+        if request.method == metodo and patron.match(ruta):
+            if filtros and any(request.query_params.get(f) for f in filtros):
+                break
+            return ANALITICA
+    return LIGERA
+
+
+def metricas() -> dict:
+    return {nombre: grupo.resumen() for nombre, grupo in GRUPOS.items()}
+
+
+# ====== MIDDLEWARE ======
+
+class AdmisionMiddleware:
+    """
+    Limitar la concurrencia por grupo de rutas y rechazar rápido con 503.
+
+    Es ASGI puro: el cupo se libera cuando la aplicación terminó de enviar
+    el cuerpo (o el cliente se desconectó), no cuando devuelve la respuesta.
+    Las vistas en streaming siguen consultando la base mientras envían filas
+    y ese trabajo también cuenta contra el límite del grupo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        grupo = grupo_para(Request(scope)) if scope["type"] == "http" else None
+        if grupo is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await grupo.adquirir()
+        except Rechazada as e:
+            respuesta = JSONResponse(
+                status_code=503,
+                content={"detail": f"Servidor ocupado ({e.grupo}), intente de nuevo más tarde"},
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            grupo.liberar()
@@ -0,0 +1,280 @@
+"""
+Agregados derivados de las estadísticas.
+
+Toda escritura de una `Estadistica` pasa por `aplicar_estadistica`, que en la
+misma transacción mantiene los totales por partido (columnas `total_*` de
+`partidos`) y la disciplina del jugador.
+"""
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, case, func, update
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+import disciplina
+from models import Estadistica, Estado, Jugador, Partido, ResultadoPartido
+
+
+# Columna de Partido -> campo sumado de Estadistica
+TOTALES_PARTIDO = {
+    "total_minutos": "minutos_jugados",
+    "total_goles": "goles_anotados",
+    "total_asistencias": "asistencias",
+    "total_amarillas": "tarjetas_amarillas",
+    "total_rojas": "tarjetas_rojas",
+}
+
+
+def aplicar_estadistica(
+        session: Session,
+        estadistica: Estadistica,
+        fecha_partido: date,
+        signo: int = 1
+) -> None:
+    """Aplicar (+1) o revertir (-1) una estadística en los agregados. No hace commit."""
+    valores = {"total_jugadores": Partido.total_jugadores + signo}
+    for columna, campo in TOTALES_PARTIDO.items():
+        valores[columna] = getattr(Partido, columna) + signo * getattr(estadistica, campo)
+
+    # Incremento atómico en SQL: correcto aunque haya escrituras concurrentes
+    session.exec(update(Partido).where(Partido.id == estadistica.partido_id).values(**valores))
+
+    disciplina.registrar_estadistica(session, estadistica, fecha_partido, signo)
+
+
+def recalcular_totales(session: Session, partido_ids: Optional[Iterable[int]] = None) -> int:
+    """Reconstruir los totales de los partidos con un único UPDATE. No hace commit."""
+    def suma(campo):
+        return (
+            select(func.coalesce(func.sum(getattr(Estadistica, campo)), 0))
+            .where(Estadistica.partido_id == Partido.id)
+            .scalar_subquery()
+        )
+
+    valores = {columna: suma(campo) for columna, campo in TOTALES_PARTIDO.items()}
+    valores["total_jugadores"] = (
+        select(func.count(Estadistica.id))
+        .where(Estadistica.partido_id == Partido.id)
+        .scalar_subquery()
+    )
+
+    sentencia = update(Partido).values(**valores).execution_options(synchronize_session=False)
+    if partido_ids is not None:
+        sentencia = sentencia.where(Partido.id.in_(list(partido_ids)))
+    return session.exec(sentencia).rowcount
+
+
+def balance_partidos(session: Session, *condiciones) -> dict:
+    """Partidos, victorias/empates/derrotas y goles en una sola consulta agregada"""
+    def contar(resultado):
+        return func.coalesce(func.sum(case((Partido.resultado == resultado, 1), else_=0)), 0)
+
+    fila = session.exec(
+        select(
+            func.count(Partido.id),
+            contar(ResultadoPartido.VICTORIA),
+            contar(ResultadoPartido.EMPATE),
+            contar(ResultadoPartido.DERROTA),
+            func.coalesce(func.sum(Partido.goles_sigmotaa), 0),
+            func.coalesce(func.sum(Partido.goles_rival), 0)
+        ).where(*condiciones)
+    ).one()
+
+    total, victorias, empates, derrotas, goles_favor, goles_contra = fila
+    return {
+        "total": total,
+        "victorias": victorias,
+        "empates": empates,
+        "derrotas": derrotas,
+        "goles_favor": goles_favor,
+        "goles_contra": goles_contra,
+        "diferencia": goles_favor - goles_contra
+    }
+
+
+def conteo_jugadores(session: Session) -> dict:
+    """Jugadores por estado con un solo GROUP BY"""
+    filas = session.exec(select(Jugador.estado, func.count()).group_by(Jugador.estado)).all()
+    por_estado = {estado.value if isinstance(estado, Estado) else estado: n for estado, n in filas}
+    return {
+        "total": sum(por_estado.values()),
+        "activos": por_estado.get(Estado.ACTIVO.value, 0),
+        "lesionados": por_estado.get(Estado.LESIONADO.value, 0),
+        "suspendidos": por_estado.get(Estado.SUSPENDIDO.value, 0)
+    }
+
+
+def goleadores(session: Session, limite: int = 10, *condiciones) -> List[dict]:
+    """Máximos goleadores con una consulta agregada (condiciones sobre Partido opcionales)"""
+    goles = func.sum(Estadistica.goles_anotados).label("goles")
+    statement = (
+        select(Jugador.id, Jugador.nombre_completo, goles)
+        .join(Estadistica, Estadistica.jugador_id == Jugador.id)
+    )
+    if condiciones:
+        statement = statement.join(Partido, Partido.id == Estadistica.partido_id).where(*condiciones)
+    filas = session.exec(
+        statement
+        .group_by(Jugador.id, Jugador.nombre_completo)
+        .having(goles > 0)
+        .order_by(goles.desc())
+        .limit(limite)
+    ).all()
+    return [
+        {"jugador_id": jugador_id, "nombre_completo": nombre, "goles": total}
+        for jugador_id, nombre, total in filas
+    ]
+
+
+def inconsistencias(session: Session, verificar_totales: bool = False) -> List[dict]:
+    """
+    Partidos cuyos goles de jugadores no coinciden con el marcador.
+
+    Solo usa las columnas denormalizadas; con `verificar_totales` además
+    compara esas columnas contra la suma real de las estadísticas.
+    """
+    partidos = session.exec(
+        select(Partido)
+        .where(and_(Partido.total_jugadores > 0, Partido.total_goles != Partido.goles_sigmotaa))
+        .order_by(Partido.fecha_partido.desc())
+    ).all()
+
+    resultado = [
+        {
+            "partido_id": p.id,
+            "fecha_partido": p.fecha_partido,
+            "rival": p.rival,
+            "problema": "goles_no_coinciden",
+            "goles_sigmotaa": p.goles_sigmotaa,
+            "total_goles_jugadores": p.total_goles
+        }
+        for p in partidos
+    ]
+
+    if verificar_totales:
+        reales = select(
+            Estadistica.partido_id,
+            func.count(Estadistica.id).label("jugadores"),
+            func.sum(Estadistica.goles_anotados).label("goles")
+        ).group_by(Estadistica.partido_id).subquery()
+
+        desactualizados = session.exec(
+            select(Partido.id, Partido.total_jugadores, Partido.total_goles, reales.c.jugadores, reales.c.goles)
+            .outerjoin(reales, reales.c.partido_id == Partido.id)
+            .where(
+                (Partido.total_jugadores != func.coalesce(reales.c.jugadores, 0))
+                | (Partido.total_goles != func.coalesce(reales.c.goles, 0))
+            )
+        ).all()
+
+        resultado.extend(
+            {
+                "partido_id": partido_id,
+                "problema": "totales_desactualizados",
+                "total_jugadores": total_jugadores,
+                "jugadores_reales": jugadores or 0,
+                "total_goles": total_goles,
+                "goles_reales": goles or 0
+            }
+            for partido_id, total_jugadores, total_goles, jugadores, goles in desactualizados
+        )
+
+    return resultado
+
+
+# ====== COMPARACIÓN DE JUGADORES ======
+
+# Clave de la respuesta -> campo sumado de Estadistica
+CAMPOS_COMPARACION = {
+    "minutos": "minutos_jugados",
+    "goles": "goles_anotados",
+    "asistencias": "asistencias",
+    "intercepciones": "intercepciones",
+    "balones_recuperados": "balones_recuperados",
+    "faltas_cometidas": "faltas_cometidas",
+    "tarjetas_amarillas": "tarjetas_amarillas",
+    "tarjetas_rojas": "tarjetas_rojas",
+}
+
+
+def _sumas_comparacion() -> list:
+    return [func.count(Estadistica.id)] + [
+        func.coalesce(func.sum(getattr(Estadistica, campo)), 0) for campo in CAMPOS_COMPARACION.values()
+    ]
+
+
+def _linea_comparacion(valores) -> dict:
+    """Totales y tasas cada 90 minutos (None sin minutos jugados)"""
+    totales = dict(zip(["partidos"] + list(CAMPOS_COMPARACION), valores))
+    minutos = totales["minutos"]
+    por_90 = {
+        clave: round(totales[clave] * 90 / minutos, 2) if minutos else None
+        for clave in CAMPOS_COMPARACION if clave != "minutos"
+    }
+    return {"totales": totales, "por_90": por_90}
+
+
+def comparar_jugadores(
+        session: Session,
+        ids: List[int],
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None
+) -> Optional[dict]:
+    """
+    Totales y tasas cada 90' de cada jugador y, por cada par, lo que hizo
+    en los partidos que jugó con el otro; todo alineado en el orden de
+    `ids`. Dos consultas sin importar cuántos jugadores se comparen. None
+    si falta algún jugador.
+    """
+    condiciones = []
+    if desde:
+        condiciones.append(Partido.fecha_partido >= desde)
+    if hasta:
+        condiciones.append(Partido.fecha_partido <= hasta)
+    en_rango = Estadistica.jugador_id.in_(ids)
+    if condiciones:
+        en_rango = and_(en_rango, Estadistica.partido_id.in_(select(Partido.id).where(*condiciones)))
+
+    # 1) Un GROUP BY por jugador; el LEFT JOIN conserva a quien no jugó en el rango
+    filas = session.exec(
+        select(Jugador.id, Jugador.nombre_completo, Jugador.numero_camiseta, Jugador.posicion, *_sumas_comparacion())
+        .outerjoin(Estadistica, and_(Estadistica.jugador_id == Jugador.id, en_rango))
+        .where(Jugador.id.in_(ids))
+        .group_by(Jugador.id, Jugador.nombre_completo, Jugador.numero_camiseta, Jugador.posicion)
+    ).all()
+    if len(filas) < len(set(ids)):
+        return None
+    por_id = {fila[0]: fila for fila in filas}
+
+    # 2) Cara a cara: lo de cada jugador en los partidos que compartió con cada otro
+    otro = aliased(Estadistica)
+    filas_compartidas = session.exec(
+        select(Estadistica.jugador_id, otro.jugador_id, *_sumas_comparacion())
+        .join(otro, and_(otro.partido_id == Estadistica.partido_id, otro.jugador_id != Estadistica.jugador_id))
+        .where(en_rango, otro.jugador_id.in_(ids))
+        .group_by(Estadistica.jugador_id, otro.jugador_id)
+    ).all()
+    compartidas = {(fila[0], fila[1]): tuple(fila[2:]) for fila in filas_compartidas}
+    vacia = (0,) * (len(CAMPOS_COMPARACION) + 1)
+
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "jugadores": [
+            {
+                "id": jugador_id,
+                "nombre_completo": por_id[jugador_id][1],
+                "numero_camiseta": por_id[jugador_id][2],
+                "posicion": por_id[jugador_id][3],
+                **_linea_comparacion(por_id[jugador_id][4:])
+            }
+            for jugador_id in ids
+        ],
+        "compartidos": [
+            {"id": jugador_id, "con": otro_id, **_linea_comparacion(compartidas.get((jugador_id, otro_id), vacia))}
+            for jugador_id in ids
+            for otro_id in ids
+            if otro_id != jugador_id
+        ]
+    }
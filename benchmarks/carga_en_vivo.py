@@ -0,0 +1,163 @@
+"""
+Prueba de carga del feed en vivo (/partidos/{id}/live).
+
+Abre N conexiones SSE concurrentes contra un worker en ejecución y reporta
+cuántas se establecen, cuántos eventos recibe cada una y cuántas fueron
+descartadas por el servidor.
+
+Uso:
+    uvicorn main:app --port 8000
+    python benchmarks/carga_en_vivo.py --partido 1 --conexiones 5000 --duracion 30
+
+Con --en-proceso se mide solo el hub (sin sockets) para aislar el costo
+del fan-out:
+    python benchmarks/carga_en_vivo.py --en-proceso --conexiones 10000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def _cliente(host: str, port: int, ruta: str, duracion: float, resultados: dict):
+    """Un cliente SSE mínimo sobre asyncio.open_connection"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        resultados["fallidas"] += 1
+        return
+
+    writer.write(
+        f"GET {ruta} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+
+    fin = time.monotonic() + duracion
+    establecida = False
+    try:
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                linea = await asyncio.wait_for(reader.readline(), restante)
+            except asyncio.TimeoutError:
+                break
+            if not linea:
+                break
+            if not establecida and linea.startswith(b"HTTP/1.1 200"):
+                establecida = True
+                resultados["establecidas"] += 1
+            elif linea.startswith(b"event: descartado"):
+                resultados["descartadas"] += 1
+            elif linea.startswith(b"event: "):
+                resultados["eventos"] += 1
+            elif linea.startswith(b": ping"):
+                resultados["heartbeats"] += 1
+    finally:
+        if not establecida:
+            resultados["fallidas"] += 1
+        writer.close()
+
+
+async def carga_http(args):
+    resultados = {"establecidas": 0, "fallidas": 0, "eventos": 0, "heartbeats": 0, "descartadas": 0}
+    ruta = f"/partidos/{args.partido}/live"
+
+    inicio = time.monotonic()
+    tareas = []
+    for _ in range(args.conexiones):
+        tareas.append(asyncio.create_task(
+            _cliente(args.host, args.port, ruta, args.duracion, resultados)
+        ))
+        # Escalonar las conexiones para no saturar el backlog del socket
+        if len(tareas) % 500 == 0:
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*tareas)
+    total = time.monotonic() - inicio
+
+    print(f"Conexiones solicitadas : {args.conexiones}")
+    print(f"Conexiones establecidas: {resultados['establecidas']}")
+    print(f"Conexiones fallidas    : {resultados['fallidas']}")
+    print(f"Clientes descartados   : {resultados['descartadas']}")
+    print(f"Eventos recibidos      : {resultados['eventos']}")
+    print(f"Heartbeats recibidos   : {resultados['heartbeats']}")
+    print(f"Duración               : {total:.1f}s")
+
+
+async def carga_en_proceso(args):
+    from en_vivo import HubEnVivo
+
+    hub = HubEnVivo(tamano_cola=args.cola, heartbeat=3600)
+    suscriptores = [hub.suscribir(1) for _ in range(args.conexiones)]
+
+    # Consumidores reales: cada uno drena su cola como lo haría el stream SSE
+    recibidos = [0]
+
+    async def consumir(sub):
+        async for _ in hub.flujo(sub, {}):
+            recibidos[0] += 1
+
+    tareas = [asyncio.create_task(consumir(s)) for s in suscriptores]
+    await asyncio.sleep(0)
+
+    # Cada consumidor recibe primero el estado inicial
+    while recibidos[0] < args.conexiones:
+        await asyncio.sleep(0.01)
+
+    entregas = args.conexiones * args.eventos
+    esperados = args.conexiones + entregas
+
+    inicio = time.perf_counter()
+    for i in range(args.eventos):
+        hub.publicar(1, "estadistica", {"id": i, "jugador_id": 7, "goles_anotados": 1})
+        if i % (args.cola // 2 or 1) == 0:
+            await asyncio.sleep(0)
+    limite = time.monotonic() + 30
+    while recibidos[0] + hub.descartados < esperados and time.monotonic() < limite:
+        await asyncio.sleep(0.001)
+    total = time.perf_counter() - inicio
+
+    memoria_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Suscriptores           : {args.conexiones}")
+    print(f"Eventos publicados     : {args.eventos}")
+    print(f"Entregas realizadas    : {recibidos[0]} de {esperados}")
+    print(f"Descartados            : {hub.descartados}")
+    print(f"Tiempo de fan-out      : {total:.3f}s ({entregas / total:,.0f} entregas/s)")
+    print(f"Memoria máxima (RSS)   : {memoria_mb:.1f} MB")
+
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del feed SSE de partidos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--partido", type=int, default=1)
+    parser.add_argument("--conexiones", type=int, default=1000)
+    parser.add_argument("--duracion", type=float, default=20.0)
+    parser.add_argument("--en-proceso", action="store_true", help="Medir solo el hub, sin HTTP")
+    parser.add_argument("--eventos", type=int, default=100)
+    parser.add_argument("--cola", type=int, default=64)
+    args = parser.parse_args()
+
+    # Cada conexión usa un descriptor de archivo
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if blando < args.conexiones + 100:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(duro, args.conexiones + 100), duro))
+
+    if args.en_proceso:
+        asyncio.run(carga_en_proceso(args))
+    else:
+        asyncio.run(carga_http(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Altas concurrentes de estadísticas: commit por petición vs. cola de escritura.
+
+Crea una base SQLite temporal con un plantel y varios partidos y, desde N
+hilos a la vez (como el threadpool de FastAPI con varias personas cargando
+datos), inserta estadísticas con la misma operación que POST /estadisticas/:
+- directo: cada petición con su sesión y su propio commit;
+- cola: las peticiones pasan por cola_escritura.ejecutar (un commit por lote).
+
+Reporta altas por segundo, latencia p50/p95, errores (p. ej. `database is
+locked`) y, en modo cola, commits y tamaño promedio de lote.
+
+Uso:
+    python benchmarks/cola_escritura.py --hilos 1,8,32 --altas 2000
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.chdir(RAIZ)
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench_cola_')}/bench.db"
+os.environ["SQL_ECHO"] = "0"
+
+from datetime import date, timedelta
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+import cola_escritura
+import database
+from models import DisciplinaJugador, Estadistica, EstadisticaCreate, Estado, Jugador, Partido, PieDominante, Position
+from routers.estadisticas import _insertar_estadistica
+
+
+def _sembrar(jugadores: int, partidos: int) -> tuple:
+    database.create_db_and_tables()
+    with Session(database.engine) as session:
+        for i in range(jugadores):
+            session.add(Jugador(
+                nombre_completo=f"Jugador {i}", numero_camiseta=i % 99 + 1, fecha_nacimiento=date(2000, 1, 1),
+                nacionalidad="CO", altura_cm=180, peso_kg=75, pie_dominante=PieDominante.DERECHO,
+                posicion=Position.VOLANTE_C, anio_ingreso=2020, estado=Estado.ACTIVO
+            ))
+        for i in range(partidos):
+            partido = Partido(
+                rival=f"Rival {i}", fecha_partido=date(2024, 1, 1) + timedelta(days=7 * i),
+                goles_sigmotaa=1, goles_rival=0
+            )
+            partido.resultado = partido.calcular_resultado()
+            session.add(partido)
+        session.commit()
+        jugador_ids = session.exec(select(Jugador.id)).all()
+        partido_ids = session.exec(select(Partido.id)).all()
+    return [(j, p) for p in partido_ids for j in jugador_ids]
+
+
+def _limpiar() -> None:
+    with Session(database.engine) as session:
+        session.exec(delete(Estadistica))
+        session.exec(delete(DisciplinaJugador))
+        session.exec(update(Partido).values(
+            total_jugadores=0, total_minutos=0, total_goles=0,
+            total_asistencias=0, total_amarillas=0, total_rojas=0
+        ))
+        session.commit()
+
+
+def _alta(par: tuple) -> tuple:
+    datos = EstadisticaCreate(jugador_id=par[0], partido_id=par[1], minutos_jugados=90, goles_anotados=1)
+    inicio = time.perf_counter()
+    try:
+        with Session(database.engine, info={"club": None}) as session:
+            cola_escritura.ejecutar(session, lambda s: _insertar_estadistica(s, datos))
+        error = None
+    except Exception as e:
+        error = str(getattr(e, "detail", e)).split("\n")[0][:60]
+    return (time.perf_counter() - inicio) * 1000, error
+
+
+def _percentil(valores: list, p: float) -> float:
+    return valores[max(math.ceil(len(valores) * p) - 1, 0)]
+
+
+def _correr(modo: str, hilos: int, pares: list) -> None:
+    _limpiar()
+    cola_escritura.MODO = modo
+    lotes_antes = sum(c["lotes"] for c in cola_escritura.resumen()["clubes"].values())
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(hilos) as ejecutor:
+        resultados = list(ejecutor.map(_alta, pares))
+    duracion = time.perf_counter() - inicio
+
+    latencias = sorted(ms for ms, _ in resultados)
+    errores = Counter(error for _, error in resultados if error)
+    nombre = "cola" if modo == "1" else "directo"
+    linea = (
+        f"{nombre:>8} {hilos:>4} hilos: {len(pares) / duracion:8.0f} altas/s  "
+        f"p50 {_percentil(latencias, 0.5):7.1f} ms  p95 {_percentil(latencias, 0.95):7.1f} ms  "
+        f"errores {sum(errores.values())}"
+    )
+    if modo == "1":
+        lotes = sum(c["lotes"] for c in cola_escritura.resumen()["clubes"].values()) - lotes_antes
+        linea += f"  commits {lotes} (lote promedio {(len(pares) - sum(errores.values())) / max(lotes, 1):.1f})"
+    print(linea)
+    for error, veces in errores.most_common(3):
+        print(f"{'':>20}{veces}x {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", default="1,8,32")
+    parser.add_argument("--altas", type=int, default=2000)
+    parser.add_argument("--jugadores", type=int, default=50)
+    args = parser.parse_args()
+
+    pares = _sembrar(args.jugadores, math.ceil(args.altas / args.jugadores))[:args.altas]
+    print(f"Altas: {len(pares)}  Base: {database.DATABASE_URL}")
+    for hilos in (int(h) for h in args.hilos.split(",")):
+        for modo in ("0", "1"):
+            _correr(modo, hilos, pares)
+    cola_escritura.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Rendimiento de servidor.py según el número de workers.
+
+Crea una base SQLite temporal, levanta `python servidor.py` con 1, 2, 4...
+workers y lo carga durante unos segundos desde varios procesos cliente, cada
+uno con conexiones keep-alive concurrentes sobre asyncio. Reporta peticiones
+por segundo y la aceleración respecto de un worker. Con más workers que
+núcleos la aceleración se aplana; los clientes también consumen CPU, así que
+conviene medir desde otra máquina para números absolutos.
+
+Uso:
+    python benchmarks/escalado_workers.py --workers 1,2,4,8 --ruta /partidos/1 --duracion 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def _sembrar(url: str) -> None:
+    os.environ["DATABASE_URL"] = url
+    os.environ["SQL_ECHO"] = "0"
+    from datetime import date, timedelta
+    from sqlmodel import Session
+    import database
+    from models import Partido
+
+    database.create_db_and_tables()
+    with Session(database.engine) as session:
+        for i in range(50):
+            partido = Partido(
+                rival=f"Rival {i % 10}",
+                fecha_partido=date(2024, 1, 1) + timedelta(days=7 * i),
+                goles_sigmotaa=i % 4,
+                goles_rival=i % 3
+            )
+            partido.resultado = partido.calcular_resultado()
+            session.add(partido)
+        session.commit()
+
+
+async def _conexion(puerto: int, ruta: str, fin: float) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    peticion = f"GET {ruta} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+    completadas = 0
+    try:
+        while time.monotonic() < fin:
+            writer.write(peticion)
+            encabezados = await reader.readuntil(b"\r\n\r\n")
+            largo = 0
+            for linea in encabezados.split(b"\r\n"):
+                if linea.lower().startswith(b"content-length:"):
+                    largo = int(linea.split(b":")[1])
+            await reader.readexactly(largo)
+            completadas += 1
+    finally:
+        writer.close()
+    return completadas
+
+
+def _cliente(puerto: int, ruta: str, conexiones: int, duracion: float) -> int:
+    async def correr():
+        fin = time.monotonic() + duracion
+        resultados = await asyncio.gather(*(_conexion(puerto, ruta, fin) for _ in range(conexiones)))
+        return sum(resultados)
+    return asyncio.run(correr())
+
+
+def _esperar(puerto: int, timeout: float = 30) -> None:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/api", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("El servidor no respondió a tiempo")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--ruta", default="/partidos/1")
+    parser.add_argument("--duracion", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=2, help="Procesos cliente")
+    parser.add_argument("--conexiones", type=int, default=32, help="Conexiones por proceso cliente")
+    parser.add_argument("--puerto", type=int, default=8799)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{tempfile.mkdtemp(prefix='bench_workers_')}/bench.db"
+    _sembrar(url)
+
+    print(f"Ruta: {args.ruta}  CPUs: {os.cpu_count()}  Conexiones: {args.clientes * args.conexiones}")
+    base = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        entorno = dict(os.environ, DATABASE_URL=url, WEB_CONCURRENCY=str(workers), PORT=str(args.puerto))
+        servidor = subprocess.Popen(
+            [sys.executable, "servidor.py"], cwd=RAIZ, env=entorno,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _esperar(args.puerto)
+            with multiprocessing.Pool(args.clientes) as pool:
+                totales = pool.starmap(
+                    _cliente, [(args.puerto, args.ruta, args.conexiones, args.duracion)] * args.clientes
+                )
+            rps = sum(totales) / args.duracion
+            base = base or rps
+            print(f"{workers:>3} workers: {rps:9.0f} req/s  aceleración x{rps / base:4.2f}")
+        finally:
+            servidor.send_signal(signal.SIGTERM)
+            servidor.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
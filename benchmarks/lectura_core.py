@@ -0,0 +1,132 @@
+"""
+Latencia y memoria de las rutas de lectura: ORM contra Core (lectura.py).
+
+Crea una base SQLite temporal con 10.000 partidos y 10.000 estadísticas y
+mide cada ruta con las dos implementaciones: tiempo por petición (mediana y
+p95) y pico de memoria asignada durante la petición según tracemalloc.
+
+Uso:
+    python benchmarks/lectura_core.py --filas 10000 --repeticiones 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _sembrar(engine, filas: int) -> None:
+    from sqlalchemy import insert
+    from models import Estadistica, Jugador, Partido, PieDominante, Position, ResultadoPartido
+
+    aleatorio = random.Random(7)
+    with engine.begin() as conexion:
+        conexion.execute(insert(Jugador), [
+            {
+                "nombre_completo": f"Jugador {i}",
+                "numero_camiseta": i,
+                "fecha_nacimiento": date(2000, 1, 1),
+                "nacionalidad": "CO",
+                "altura_cm": 180,
+                "peso_kg": 75.0,
+                "pie_dominante": PieDominante.DERECHO,
+                "posicion": aleatorio.choice(list(Position)),
+                "anio_ingreso": 2020
+            }
+            for i in range(1, 100)
+        ])
+        conexion.execute(insert(Partido), [
+            {
+                "rival": f"Rival {i % 40}",
+                "fecha_partido": date(2000, 1, 1) + timedelta(days=i),
+                "goles_sigmotaa": i % 4,
+                "goles_rival": i % 3,
+                "resultado": ResultadoPartido.EMPATE,
+                "es_local": i % 2 == 0
+            }
+            for i in range(filas)
+        ])
+        conexion.execute(insert(Estadistica), [
+            {
+                "jugador_id": aleatorio.randint(1, 99),
+                "partido_id": i + 1,
+                "minutos_jugados": aleatorio.randint(1, 90),
+                "goles_anotados": aleatorio.randint(0, 2)
+            }
+            for i in range(filas)
+        ])
+
+
+def _medir(cliente, ruta: str, repeticiones: int) -> dict:
+    cliente.get(ruta)  # calentar cachés de compilación
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(ruta)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        assert respuesta.status_code == 200, respuesta.text[:200]
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    cliente.get(ruta)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tiempos.sort()
+    return {
+        "mediana_ms": statistics.median(tiempos),
+        "p95_ms": tiempos[max(0, int(len(tiempos) * 0.95) - 1)],
+        "pico_kb": pico / 1024
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="bench_lectura_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{directorio}/bench.db"
+
+    import logging
+    logging.disable(logging.INFO)
+    from fastapi.testclient import TestClient
+    import database
+    import lectura
+    import main as aplicacion
+
+    database.engine.echo = False
+    database.create_db_and_tables()
+    _sembrar(database.engine, args.filas)
+
+    rutas = [
+        "/partidos/",
+        "/partidos/?ordenar_por=total_goles&ascendente=true",
+        "/estadisticas/",
+        "/jugadores/",
+        f"/partidos/{args.filas // 2}",
+        f"/estadisticas/{args.filas // 2}",
+    ]
+
+    print(f"Filas: {args.filas}  Repeticiones: {args.repeticiones}")
+    print(f"{'ruta':<52} {'modo':<5} {'mediana':>9} {'p95':>9} {'pico':>10}")
+    with TestClient(aplicacion.app) as cliente:
+        for ruta in rutas:
+            for modo, activas in (("orm", set()), ("core", set(lectura.RUTAS))):
+                lectura.ACTIVAS = activas
+                r = _medir(cliente, ruta, args.repeticiones)
+                print(
+                    f"{ruta:<52} {modo:<5} {r['mediana_ms']:7.2f}ms {r['p95_ms']:7.2f}ms "
+                    f"{r['pico_kb']:8.0f}KB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Escalado de la generación de reportes de temporada con el número de procesos.
+
+Crea una base SQLite temporal con un plantel y una temporada sintéticos y
+genera el zip completo con 1, 2, 4... procesos, reportando el tiempo y la
+aceleración respecto de un proceso.
+
+Uso:
+    python benchmarks/reportes_temporada.py --jugadores 400 --partidos 40 --procesos 1,2,4,8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _sembrar(engine, jugadores: int, partidos: int, temporada: int) -> None:
+    from sqlmodel import Session
+    from models import Estadistica, Jugador, Partido, PieDominante, Position
+
+    aleatorio = random.Random(7)
+    with Session(engine) as session:
+        session.add_all(
+            Jugador(
+                nombre_completo=f"Jugador {i}",
+                numero_camiseta=i,
+                fecha_nacimiento=date(2000, 1, 1),
+                nacionalidad="CO",
+                altura_cm=180,
+                peso_kg=75,
+                pie_dominante=PieDominante.DERECHO,
+                posicion=aleatorio.choice(list(Position)),
+                anio_ingreso=2020
+            )
+            for i in range(1, jugadores + 1)
+        )
+        for i in range(partidos):
+            partido = Partido(
+                fecha_partido=date(temporada, 1, 5) + timedelta(days=7 * i),
+                rival=f"Rival {i % 12}",
+                goles_sigmotaa=aleatorio.randint(0, 4),
+                goles_rival=aleatorio.randint(0, 3),
+                es_local=i % 2 == 0
+            )
+            partido.resultado = partido.calcular_resultado()
+            session.add(partido)
+        session.flush()
+        session.add_all(
+            Estadistica(
+                jugador_id=j,
+                partido_id=p,
+                minutos_jugados=aleatorio.randint(1, 90),
+                goles_anotados=aleatorio.randint(0, 2),
+                asistencias=aleatorio.randint(0, 2),
+                intercepciones=aleatorio.randint(0, 5),
+                balones_recuperados=aleatorio.randint(0, 8)
+            )
+            for p in range(1, partidos + 1)
+            for j in aleatorio.sample(range(1, jugadores + 1), min(jugadores, 18))
+        )
+        session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", type=int, default=400)
+    parser.add_argument("--partidos", type=int, default=40)
+    parser.add_argument("--procesos", default="1,2,4")
+    parser.add_argument("--temporada", type=int, default=2024)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="bench_reportes_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{directorio}/bench.db"
+    os.environ["REPORTES_DIR"] = directorio
+
+    import logging
+    import database
+    import reportes
+
+    database.engine.echo = False
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    database.create_db_and_tables()
+    _sembrar(database.engine, args.jugadores, args.partidos, args.temporada)
+
+    print(f"Jugadores: {args.jugadores}  Partidos: {args.partidos}  CPUs: {os.cpu_count()}")
+    base = None
+    for procesos in (int(p) for p in args.procesos.split(",")):
+        reportes.cerrar()
+        reportes.PROCESOS = procesos
+        # Calentar el pool: arranque de los procesos spawn fuera de la medición
+        list(reportes._ejecutor().map(time.sleep, [0.5] * procesos))
+
+        trabajo = reportes.TrabajoReporte(id=f"bench{procesos}", temporada=args.temporada, club=None)
+        inicio = time.perf_counter()
+        reportes._ejecutar(trabajo)
+        duracion = time.perf_counter() - inicio
+        if trabajo.estado != "completado":
+            raise SystemExit(f"Falló con {procesos} procesos: {trabajo.error}")
+
+        base = base or duracion
+        print(f"{procesos:>3} procesos: {duracion:7.2f}s  aceleración x{base / duracion:4.2f}")
+    reportes.cerrar()
+
+
+if __name__ == "__main__":
+    main()
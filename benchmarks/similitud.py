@@ -0,0 +1,108 @@
+"""
+Búsqueda de jugadores parecidos: latencia según el tamaño del padrón.
+
+El número de camiseta es único por club, así que una base real no pasa de
+99 jugadores; para medir padrones de liga entera se carga el índice de
+similitud.py con jugadores sintéticos (sin base) y se compara:
+- python: distancia fila por fila y `sorted` completo;
+- numpy: la búsqueda de similitud.similares (bloques + argpartition).
+
+Reporta normalización (se paga al cambiar los datos) y p50/p95 por consulta.
+
+Uso:
+    python benchmarks/similitud.py --jugadores 1000,20000,200000 --k 10
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.chdir(RAIZ)
+os.environ["SQL_ECHO"] = "0"
+
+import numpy as np
+
+import similitud
+
+
+def _indice(n: int) -> similitud.IndiceSimilitud:
+    rng = np.random.default_rng(7)
+    indice = similitud.IndiceSimilitud()
+    indice.ids = np.arange(1, n + 1, dtype=np.int64)
+    minutos = rng.integers(0, 3000, n)
+    indice.crudos = np.column_stack([
+        rng.integers(160, 200, n),
+        rng.uniform(60, 95, n),
+        date(2000, 1, 1).toordinal() + rng.integers(-4000, 2500, n),
+        minutos,
+        *(rng.poisson(minutos / 90 * tasa) for tasa in (0.3, 0.2, 1.5, 4.0, 1.2))
+    ]).astype(np.float64)
+    indice.posiciones = rng.integers(0, len(similitud.POSICIONES), n).astype(np.int8)
+    indice.pies = rng.integers(0, len(similitud.PIES), n).astype(np.int8)
+    indice.estados = np.zeros(n, dtype=np.int8)
+    indice.numeros = rng.integers(1, 100, n).astype(np.int16)
+    indice.nombres = [f"Jugador {i}" for i in range(n)]
+    return indice
+
+
+def _python(matriz: list, fila: int, k: int) -> list:
+    consulta = matriz[fila]
+    distancias = [
+        (sum((a - b) ** 2 for a, b in zip(consulta, otra)), i)
+        for i, otra in enumerate(matriz) if i != fila
+    ]
+    return [i for _, i in sorted(distancias)[:k]]
+
+
+def _numpy(vista: similitud.Vista, fila: int, k: int) -> list:
+    validas = np.ones(len(vista.ids), dtype=bool)
+    validas[fila] = False
+    filas, _ = similitud._mas_cercanos(vista, vista.matriz[fila], validas, k)
+    return filas.tolist()
+
+
+def _percentil(valores: list, p: float) -> float:
+    return valores[max(math.ceil(len(valores) * p) - 1, 0)]
+
+
+def _medir(nombre: str, buscar, consultas: list) -> list:
+    latencias, resultados = [], []
+    for fila in consultas:
+        inicio = time.perf_counter()
+        resultados.append(buscar(fila))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    latencias.sort()
+    print(f"{'':>10}{nombre:>7}: p50 {_percentil(latencias, 0.5):9.2f} ms  p95 {_percentil(latencias, 0.95):9.2f} ms")
+    return resultados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", default="1000,20000,200000")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--consultas", type=int, default=50)
+    parser.add_argument("--python-hasta", type=int, default=20000, help="sin comparación en Python por encima")
+    args = parser.parse_args()
+
+    for n in (int(j) for j in args.jugadores.split(",")):
+        indice = _indice(n)
+        inicio = time.perf_counter()
+        vista = indice.normalizar(date.today())
+        print(f"{n:>8} jugadores: normalización {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        consultas = [random.Random(i).randrange(n) for i in range(args.consultas)]
+        rapidos = _medir("numpy", lambda f: _numpy(vista, f, args.k), consultas)
+        if n <= args.python_hasta:
+            matriz = vista.matriz.astype(np.float64).tolist()
+            lentos = _medir("python", lambda f: _python(matriz, f, args.k), consultas[:5])
+            coinciden = sum(len(set(a) & set(b)) for a, b in zip(rapidos, lentos)) / (5 * args.k)
+            print(f"{'':>10}coincidencia top-{args.k}: {coinciden:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Caché en memoria de resultados agregados, invalidada por las escrituras.
+
+Cada entrada se guarda con las tablas de las que depende. Los eventos de la
+`Session` anotan qué tablas toca cada transacción (flush del ORM y
+UPDATE/DELETE/INSERT en bloque) y, al confirmarse el commit, se descartan
+las entradas del mismo club que dependen de esas tablas. Un rollback no
+invalida nada. El TTL es solo una red de seguridad (p. ej. para lo que
+depende de la fecha de hoy).
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+TTL_S = float(os.getenv("CACHE_TTL_S", "300"))
+MAXIMO = int(os.getenv("CACHE_MAX_ENTRADAS", "256"))
+
+CLAVE_TABLAS = "tablas_modificadas"
+
+
+class CacheEtiquetas:
+    def __init__(self, ttl: float = TTL_S, maximo: int = MAXIMO):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._entradas: Dict[Tuple, Tuple[float, frozenset, Any]] = {}
+        # Versión por club: un cálculo que empezó antes de una invalidación no se guarda
+        self._versiones: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener_o_calcular(
+            self,
+            club: Optional[str],
+            clave: Hashable,
+            tablas: Iterable[str],
+            calcular: Callable[[], Any]
+    ) -> Tuple[Any, bool]:
+        """Devuelve (valor, acierto). `calcular` corre fuera del lock."""
+        completa = (club, clave)
+        with self._lock:
+            entrada = self._entradas.get(completa)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.aciertos += 1
+                return entrada[2], True
+            self.fallos += 1
+            version = self._versiones.get(club, 0)
+
+        valor = calcular()
+
+        with self._lock:
+            if self._versiones.get(club, 0) == version:
+                if len(self._entradas) >= self.maximo and completa not in self._entradas:
+                    self._entradas.pop(min(self._entradas, key=lambda c: self._entradas[c][0]))
+                self._entradas[completa] = (time.monotonic() + self.ttl, frozenset(tablas), valor)
+        return valor, False
+
+    def invalidar(self, club: Optional[str], tablas: Optional[Set[str]]) -> int:
+        """Descartar las entradas del club que dependen de alguna de las tablas (todas si es None)"""
+        with self._lock:
+            self._versiones[club] = self._versiones.get(club, 0) + 1
+            descartar = [
+                c for c, (_, deps, _) in self._entradas.items()
+                if c[0] == club and (tablas is None or deps & tablas)
+            ]
+            for completa in descartar:
+                del self._entradas[completa]
+            self.invalidaciones += len(descartar)
+            return len(descartar)
+
+    def clubes(self) -> Set[Optional[str]]:
+        """Clubes con entradas guardadas"""
+        with self._lock:
+            return {club for club, _ in self._entradas}
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "invalidaciones": self.invalidaciones,
+                "ttl_s": self.ttl
+            }
+
+
+cache = CacheEtiquetas()
+
+
+# ====== INVALIDACIÓN POR EVENTOS DE SESIÓN ======
+
+def _anotar(session: Session, tablas: Iterable[str]) -> None:
+    session.info.setdefault(CLAVE_TABLAS, set()).update(tablas)
+
+
+@event.listens_for(Session, "after_flush")
+def _tablas_del_flush(session, contexto) -> None:
+    objetos = list(session.new) + list(session.dirty) + list(session.deleted)
+    _anotar(session, {obj.__table__.name for obj in objetos if hasattr(obj, "__table__")})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _tablas_en_bloque(estado) -> None:
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabla = getattr(estado.statement, "table", None)
+        if tabla is not None:
+            _anotar(estado.session, {tabla.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session) -> None:
+    tablas = session.info.pop(CLAVE_TABLAS, None)
+    if tablas:
+        cache.invalidar(session.info.get("club"), tablas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session) -> None:
+    session.info.pop(CLAVE_TABLAS, None)
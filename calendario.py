@@ -0,0 +1,62 @@
+"""
+Partidos que pasan de próximos a jugados.
+
+Un partido con fecha futura es un próximo: no cuenta como fecha cumplida de
+una sanción ni mueve los ratings (su marcador es provisorio). Cuando llega su
+fecha nadie lo toca, así que al arrancar y cada CALENDARIO_INTERVALO_MIN
+minutos se procesan los partidos que ya se jugaron en la base principal y en
+la de cada club abierto.
+"""
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+import database
+import disciplina
+import ratings
+
+logger = logging.getLogger("sigmotaa.calendario")
+
+INTERVALO_MIN = float(os.getenv("CALENDARIO_INTERVALO_MIN", "60"))
+
+
+def cerrar_fechas(session: Session, hoy: Optional[date] = None) -> dict:
+    """Disciplina y ratings de lo jugado hasta `hoy`. No hace commit."""
+    return {
+        "jugadores_recalculados": disciplina.cumplir_fechas(session, hoy),
+        "fotos_rating": ratings.registrar_jugados(session, hoy)
+    }
+
+
+def _clubes() -> List[Optional[str]]:
+    if database.engines_club is None:
+        return [None]
+    return database.engines_club.resumen()["abiertos"]
+
+
+def cerrar_todas() -> None:
+    for club in _clubes():
+        try:
+            with Session(database.engine_club(club), info={"club": club}) as session:
+                cerrar_fechas(session)
+                session.commit()
+        except Exception:
+            logger.exception("No se pudieron cerrar las fechas%s", f" del club {club}" if club else "")
+
+
+async def _programado(intervalo_min: float) -> None:
+    while True:
+        await run_in_threadpool(cerrar_todas)
+        await asyncio.sleep(intervalo_min * 60)
+
+
+def iniciar_programado(intervalo_min: float = INTERVALO_MIN) -> Optional[asyncio.Task]:
+    """Revisar al arrancar y luego periódicamente (desactivado si el intervalo es 0)"""
+    if intervalo_min <= 0:
+        return None
+    return asyncio.create_task(_programado(intervalo_min))
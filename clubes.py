@@ -0,0 +1,79 @@
+"""
+Consultas agregadas entre clubes.
+
+Cada club vive en su propia base, así que un resumen global se resuelve en
+paralelo (una consulta por club en un pool de hilos) y los resultados
+parciales se combinan en memoria. Un club caído o lento no tumba el resumen:
+aparece con su error y el resto se suma igual.
+"""
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, List, Optional
+
+from sqlmodel import Session
+
+import agregados
+import database
+
+HILOS_FANOUT = int(os.getenv("CLUB_FANOUT_HILOS", "8"))
+TIMEOUT_FANOUT = float(os.getenv("CLUB_FANOUT_TIMEOUT", "10"))
+
+_ejecutor = ThreadPoolExecutor(max_workers=HILOS_FANOUT, thread_name_prefix="clubes")
+
+# Campos que se suman entre clubes
+_SUMABLES_PARTIDOS = ("total", "victorias", "empates", "derrotas", "goles_favor", "goles_contra", "diferencia")
+_SUMABLES_JUGADORES = ("total", "activos", "lesionados", "suspendidos")
+
+
+def resumen_club(club: str, top_goleadores: int = 10) -> dict:
+    """Resumen de un club contra su propia base (réplica si existe)"""
+    inicio = time.perf_counter()
+    with Session(database.engine_lectura_club(club), info={"club": club}) as session:
+        resumen = {
+            "club": club,
+            "partidos": agregados.balance_partidos(session),
+            "jugadores": agregados.conteo_jugadores(session),
+            "goleadores": agregados.goleadores(session, top_goleadores)
+        }
+    resumen["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return resumen
+
+
+def _combinar(parciales: List[dict], top_goleadores: int) -> dict:
+    partidos = {campo: sum(p["partidos"][campo] for p in parciales) for campo in _SUMABLES_PARTIDOS}
+    jugadores = {campo: sum(p["jugadores"][campo] for p in parciales) for campo in _SUMABLES_JUGADORES}
+    goleadores = heapq.nlargest(
+        top_goleadores,
+        ({**g, "club": p["club"]} for p in parciales for g in p["goleadores"]),
+        key=lambda g: g["goles"]
+    )
+    return {"partidos": partidos, "jugadores": jugadores, "goleadores": goleadores}
+
+
+def resumen_clubes(clubes: Optional[Iterable[str]] = None, top_goleadores: int = 10) -> dict:
+    """Consultar todos los clubes en paralelo y combinar los resultados"""
+    clubes = list(clubes or database.CLUBES)
+    inicio = time.perf_counter()
+    futuros = {club: _ejecutor.submit(resumen_club, club, top_goleadores) for club in clubes}
+    wait(futuros.values(), timeout=TIMEOUT_FANOUT)
+
+    parciales, errores = [], {}
+    for club, futuro in futuros.items():
+        if not futuro.done():
+            futuro.cancel()
+            errores[club] = f"sin respuesta en {TIMEOUT_FANOUT}s"
+        elif futuro.exception() is not None:
+            errores[club] = str(futuro.exception())
+        else:
+            parciales.append(futuro.result())
+
+    return {
+        "clubes": len(clubes),
+        "respondieron": len(parciales),
+        "global": _combinar(parciales, top_goleadores),
+        "por_club": parciales,
+        "errores": errores,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2)
+    }
@@ -0,0 +1,227 @@
+"""
+Cola de escritura con commit agrupado.
+
+En SQLite hay un solo escritor a la vez: con varias personas cargando
+estadísticas en simultáneo cada commit paga su propio fsync y, con
+contención, algunas peticiones terminan en `database is locked`. Aquí las
+altas (estadísticas, partidos, jugadores) se encolan y un hilo escritor por
+club las ejecuta en lotes:
+
+- toma lo que ya está en la cola (hasta COLA_LOTE_MAXIMO) y, si se
+  configura, espera COLA_ESPERA_MS a que lleguen más;
+- ejecuta cada operación dentro de un SAVEPOINT: si una falla (validación,
+  duplicado) se deshace solo esa y el resto del lote sigue;
+- hace un único COMMIT para todo el lote y entrega a cada petición su
+  resultado o su error.
+
+Con la cola llena se responde 503 de inmediato en lugar de acumular
+latencia. COLA_ESCRITURA=sqlite (por defecto) la usa solo con SQLite, 1
+siempre y 0 nunca. El hilo de un club sin actividad termina a los
+COLA_INACTIVA_S segundos y se vuelve a crear con la siguiente escritura.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as EsperaAgotada
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+import database
+
+MODO = os.getenv("COLA_ESCRITURA", "sqlite").lower()
+LOTE_MAXIMO = int(os.getenv("COLA_LOTE_MAXIMO", "64"))
+ESPERA_S = float(os.getenv("COLA_ESPERA_MS", "0")) / 1000
+TAMANO_MAXIMO = int(os.getenv("COLA_TAMANO_MAXIMO", "1000"))
+TIMEOUT_S = float(os.getenv("COLA_TIMEOUT_S", "10"))
+INACTIVA_S = float(os.getenv("COLA_INACTIVA_S", "60"))
+
+T = TypeVar("T")
+
+logger = logging.getLogger("sigmotaa.escritura")
+
+
+class _Pedido:
+    __slots__ = ("operacion", "futuro")
+
+    def __init__(self, operacion: Callable[[Session], object]):
+        self.operacion = operacion
+        self.futuro: Future = Future()
+
+
+class ColaEscritura:
+    """Cola y hilo escritor de un club"""
+
+    def __init__(self, club: Optional[str]):
+        self.club = club
+        self.pendientes: "queue.Queue[Optional[_Pedido]]" = queue.Queue(maxsize=TAMANO_MAXIMO)
+        self.engine = database.engine_escritor(club)
+        self._engine_propio = self.engine is not database.engine_club(club)
+        self.lotes = 0
+        self.operaciones = 0
+        self.mayor_lote = 0
+        self.hilo = threading.Thread(target=self._escribir, name=f"escritor-{club or 'principal'}", daemon=True)
+
+    def _juntar(self, primero: _Pedido) -> List[Optional[_Pedido]]:
+        lote: List[Optional[_Pedido]] = [primero]
+        limite = time.monotonic() + ESPERA_S
+        while len(lote) < LOTE_MAXIMO and lote[-1] is not None:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self.pendientes.get(timeout=restante) if restante > 0 else self.pendientes.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _ejecutar(self, lote: List[_Pedido]) -> None:
+        hechos = []
+        with Session(self.engine, info={"club": self.club}, expire_on_commit=False) as session:
+            for pedido in lote:
+                if not pedido.futuro.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        resultado = pedido.operacion(session)
+                    hechos.append((pedido, resultado))
+                except Exception as e:
+                    pedido.futuro.set_exception(e)
+
+            if not hechos:
+                session.rollback()
+                return
+            try:
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                for pedido, _ in hechos:
+                    pedido.futuro.set_exception(e)
+                return
+
+        for pedido, resultado in hechos:
+            pedido.futuro.set_result(resultado)
+        self.lotes += 1
+        self.operaciones += len(hechos)
+        self.mayor_lote = max(self.mayor_lote, len(hechos))
+
+    def _escribir(self) -> None:
+        while True:
+            try:
+                primero = self.pendientes.get(timeout=INACTIVA_S)
+            except queue.Empty:
+                if _retirar_si_vacia(self):
+                    break
+                continue
+            if primero is None:
+                break
+
+            lote = self._juntar(primero)
+            detener = lote[-1] is None
+            pedidos = [p for p in lote if p is not None]
+            try:
+                self._ejecutar(pedidos)
+            except Exception as e:
+                # Error fuera de las operaciones (p. ej. sin conexión): falla todo el lote
+                logger.exception("Lote de escritura de %s fallido", self.club or "principal")
+                for pedido in pedidos:
+                    if not pedido.futuro.done():
+                        pedido.futuro.set_exception(e)
+            if detener:
+                break
+
+        if self._engine_propio:
+            self.engine.dispose()
+
+    def resumen(self) -> dict:
+        return {
+            "pendientes": self.pendientes.qsize(),
+            "lotes": self.lotes,
+            "operaciones": self.operaciones,
+            "promedio_lote": round(self.operaciones / self.lotes, 2) if self.lotes else None,
+            "mayor_lote": self.mayor_lote
+        }
+
+
+_colas: Dict[Optional[str], ColaEscritura] = {}
+_lock = threading.Lock()
+
+
+def _retirar_si_vacia(cola: ColaEscritura) -> bool:
+    """Retirar una cola inactiva; los encolados ocurren bajo el mismo lock"""
+    with _lock:
+        if not cola.pendientes.empty():
+            return False
+        if _colas.get(cola.club) is cola:
+            del _colas[cola.club]
+        return True
+
+
+def activa(session: Session) -> bool:
+    if MODO in ("0", "no", "false"):
+        return False
+    if MODO == "sqlite":
+        return session.get_bind().dialect.name == "sqlite"
+    return True
+
+
+def _encolar(club: Optional[str], operacion: Callable[[Session], T]) -> Future:
+    pedido = _Pedido(operacion)
+    with _lock:
+        cola = _colas.get(club)
+        if cola is None:
+            cola = _colas[club] = ColaEscritura(club)
+            cola.hilo.start()
+        try:
+            cola.pendientes.put_nowait(pedido)
+        except queue.Full:
+            raise HTTPException(
+                status_code=503,
+                detail="Cola de escritura llena, intente de nuevo más tarde",
+                headers={"Retry-After": "1"}
+            )
+    return pedido.futuro
+
+
+def ejecutar(session: Session, operacion: Callable[[Session], T]) -> T:
+    """
+    Ejecutar `operacion(session)` y confirmar. Con la cola activa corre en
+    el hilo escritor del club de `session`, agrupada con otras; si no, en
+    `session` con su propio commit. La operación no debe hacer commit.
+    """
+    if not activa(session):
+        resultado = operacion(session)
+        session.commit()
+        return resultado
+
+    futuro = _encolar(database.club_de_sesion(session), operacion)
+    try:
+        return futuro.result(timeout=TIMEOUT_S)
+    except EsperaAgotada:
+        if futuro.cancel():
+            raise HTTPException(status_code=503, detail="Escritura demorada, intente de nuevo más tarde")
+        # Ya está en ejecución: su commit puede confirmarse, hay que esperar el resultado real
+        return futuro.result()
+
+
+def resumen() -> dict:
+    with _lock:
+        colas = dict(_colas)
+    return {
+        "modo": MODO,
+        "lote_maximo": LOTE_MAXIMO,
+        "espera_ms": ESPERA_S * 1000,
+        "clubes": {club or "principal": cola.resumen() for club, cola in colas.items()}
+    }
+
+
+def detener(timeout: float = 10) -> None:
+    """Procesar lo pendiente y terminar los hilos escritores (apagado ordenado)"""
+    with _lock:
+        colas = list(_colas.values())
+        _colas.clear()
+    for cola in colas:
+        cola.pendientes.put(None)
+    for cola in colas:
+        cola.hilo.join(timeout=timeout)
@@ -1,25 +1,504 @@
-from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import HTTPException, Request
+from sqlalchemy import event, text
+from sqlmodel import create_engine, Session
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
+import hashlib
+import logging
+import math
 import os
+import re
+import tempfile
+import threading
+import time
 
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sigmotaa_fc.db")
+def _normalizar_url(url: str) -> str:
+    # Ajuste para PostgreSQL en Railway/Render
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+psycopg://", 1)
+    return url
 
-# Ajuste para PostgreSQL en Railway/Render
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg://", 1)
 
-# Configuración del engine
-connect_args = {"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-engine = create_engine(DATABASE_URL, echo=True, connect_args=connect_args)
+def _activar_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignora ON DELETE CASCADE si no se activa en cada conexión
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+# ====== CONTEO DE CONSULTAS ======
+
+# Modo desarrollo: cuenta las consultas de cada petición y avisa de patrones N+1
+SQL_DEBUG = os.getenv("SQL_DEBUG", "0") == "1"
+UMBRAL_N_MAS_1 = int(os.getenv("SQL_N_MAS_1_UMBRAL", "5"))
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def huella_sql(statement: str) -> str:
+    """Forma de la consulta: sin literales ni listas IN de largo variable"""
+    huella = _LITERALES.sub("?", statement)
+    huella = _LISTAS.sub("(?+)", huella)
+    return _ESPACIOS.sub(" ", huella).strip()
+
+
+class RegistroConsultas:
+    """Consultas emitidas dentro de un contexto (una petición, un test)"""
+
+    def __init__(self, padre: Optional["RegistroConsultas"] = None):
+        self.padre = padre
+        self.total = 0
+        self.huellas: Counter = Counter()
+
+    def registrar(self, statement: str) -> None:
+        huella = huella_sql(statement)
+        registro = self
+        while registro is not None:
+            registro.total += 1
+            registro.huellas[huella] += 1
+            registro = registro.padre
+
+    def repetidas(self, umbral: int = UMBRAL_N_MAS_1) -> List[Tuple[str, int]]:
+        """Consultas con la misma forma emitidas `umbral` o más veces (N+1)"""
+        return [(h, n) for h, n in self.huellas.most_common() if n >= umbral]
+
+
+_registro_actual: ContextVar[Optional[RegistroConsultas]] = ContextVar("registro_consultas", default=None)
+
+
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    registro = _registro_actual.get()
+    if registro is not None:
+        registro.registrar(statement)
+
+
+@contextmanager
+def contar_consultas() -> Iterator[RegistroConsultas]:
+    """
+    Contar las consultas emitidas dentro del bloque:
+
+        with contar_consultas() as registro:
+            client.get("/partidos/html/lista")
+        assert registro.total <= 3
+    """
+    registro = RegistroConsultas(padre=_registro_actual.get())
+    token = _registro_actual.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_actual.reset(token)
+
+
+@contextmanager
+def limite_consultas(maximo: int) -> Iterator[RegistroConsultas]:
+    """Falla con AssertionError si el bloque emite más de `maximo` consultas"""
+    with contar_consultas() as registro:
+        yield registro
+    if registro.total > maximo:
+        detalle = "\n".join(f"  {n}x {h}" for h, n in registro.huellas.most_common(5))
+        raise AssertionError(f"Se esperaban como máximo {maximo} consultas y hubo {registro.total}:\n{detalle}")
+
+
+# ====== LATENCIA DE ESCRITURA ======
+
+class MedidorEscrituras:
+    """Últimas duraciones de transacciones de escritura (para medir el impacto de tareas de fondo)"""
+
+    def __init__(self, maximo: int = 10000):
+        self._muestras: deque = deque(maxlen=maximo)
+
+    def registrar(self, duracion_ms: float) -> None:
+        self._muestras.append((time.time(), duracion_ms))
+
+    def resumen(self, desde: float, hasta: Optional[float] = None) -> dict:
+        hasta = hasta or time.time()
+        valores = sorted(ms for t, ms in list(self._muestras) if desde <= t <= hasta)
+        if not valores:
+            return {"escrituras": 0, "media_ms": None, "p95_ms": None}
+        return {
+            "escrituras": len(valores),
+            "media_ms": round(sum(valores) / len(valores), 3),
+            "p95_ms": round(valores[math.ceil(len(valores) * 0.95) - 1], 3)
+        }
+
+
+medidor_escrituras = MedidorEscrituras()
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE")
+# Conexión DBAPI -> inicio de su primera escritura en la transacción actual
+_inicio_transaccion: Dict[int, float] = {}
+
+
+def _inicio_escritura(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip()[:6].upper() in _ESCRITURAS:
+        _inicio_transaccion.setdefault(id(cursor.connection), time.perf_counter())
+
+
+def _medir_transacciones(dialecto) -> None:
+    """
+    Medir cada transacción de escritura hasta que termina su COMMIT: en
+    SQLite la espera por el lock exclusivo ocurre en el COMMIT, no en el
+    INSERT/UPDATE, y no hay evento posterior al commit.
+    """
+    do_commit, do_rollback = dialecto.do_commit, dialecto.do_rollback
+
+    def clave(conexion) -> int:
+        # El dialecto recibe el proxy del pool; el cursor, la conexión DBAPI
+        return id(getattr(conexion, "dbapi_connection", conexion))
+
+    def commit_medido(dbapi_connection):
+        try:
+            do_commit(dbapi_connection)
+        finally:
+            inicio = _inicio_transaccion.pop(clave(dbapi_connection), None)
+            if inicio is not None:
+                medidor_escrituras.registrar((time.perf_counter() - inicio) * 1000)
+
+    def rollback_medido(dbapi_connection):
+        _inicio_transaccion.pop(clave(dbapi_connection), None)
+        do_rollback(dbapi_connection)
+
+    dialecto.do_commit = commit_medido
+    dialecto.do_rollback = rollback_medido
+
+
+# Log de cada sentencia SQL (útil en desarrollo; servidor.py lo desactiva)
+SQL_ECHO = os.getenv("SQL_ECHO", "1") == "1"
+
+
+def _crear_engine(url: str, **opciones):
+    """Configuración del engine"""
+    connect_args = {"check_same_thread": False} if "sqlite" in url else {}
+    nuevo_engine = create_engine(url, echo=SQL_ECHO, connect_args=connect_args, **opciones)
+    if "sqlite" in url:
+        event.listen(nuevo_engine, "connect", _activar_foreign_keys)
+    event.listen(nuevo_engine, "before_cursor_execute", _contar_consulta)
+    event.listen(nuevo_engine, "before_cursor_execute", _inicio_escritura)
+    _medir_transacciones(nuevo_engine.dialect)
+    return nuevo_engine
+
+
+DATABASE_URL = _normalizar_url(os.getenv("DATABASE_URL", "sqlite:///./sigmotaa_fc.db"))
+
+# Réplica de solo lectura opcional (otra base Postgres o una copia del archivo SQLite).
+# Sin DATABASE_READ_URL todo usa el mismo engine.
+_read_url: Optional[str] = os.getenv("DATABASE_READ_URL")
+DATABASE_READ_URL = _normalizar_url(_read_url) if _read_url else DATABASE_URL
+
+engine = _crear_engine(DATABASE_URL)
+read_engine = engine if DATABASE_READ_URL == DATABASE_URL else _crear_engine(DATABASE_READ_URL)
+hay_replica = read_engine is not engine
+
+# Read-your-writes: tras una escritura el cliente lee del primario durante unos segundos
+COOKIE_ESCRITURA = "sigmotaa_escritura"
+SEGUNDOS_LECTURA_PRIMARIO = int(os.getenv("DATABASE_READ_STICKY_SECONDS", "5"))
+
+
+# Clave del advisory lock de PostgreSQL durante la inicialización
+CLAVE_INICIALIZACION = 7_302_115
+
+
+@contextmanager
+def _bloqueo_inicializacion(destino) -> Iterator[None]:
+    """
+    Un solo proceso a la vez inicializa cada base: con varios workers
+    create_all y los rellenos compiten (comprueban y luego crean). En
+    PostgreSQL con un advisory lock; en SQLite con un flock sobre un archivo
+    temporal asociado a la base.
+    """
+    if destino.dialect.name == "postgresql":
+        with destino.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:clave)"), {"clave": CLAVE_INICIALIZACION})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": CLAVE_INICIALIZACION})
+                conn.commit()
+        return
+
+    ruta = destino.url.database
+    try:
+        import fcntl
+    except ImportError:  # Windows: desarrollo con un solo proceso
+        fcntl = None
+    if destino.dialect.name != "sqlite" or fcntl is None or not ruta or ruta == ":memory:":
+        yield
+        return
+
+    nombre = hashlib.sha1(os.path.abspath(ruta).encode()).hexdigest()[:16]
+    with open(os.path.join(tempfile.gettempdir(), f"sigmotaa-init-{nombre}.lock"), "w") as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+def _inicializar(destino, esquema: Optional[str] = None) -> None:
+    """Aplicar las migraciones pendientes y sembrar las versiones de tabla"""
+    with _bloqueo_inicializacion(destino):
+        _inicializar_sin_bloqueo(destino, esquema)
+
+
+def _inicializar_sin_bloqueo(destino, esquema: Optional[str] = None) -> None:
+    import invalidacion
+    import migraciones
+
+    if migraciones.AL_INICIAR:
+        migraciones.migrar(destino, esquema)
+    else:
+        faltantes = migraciones.pendientes(destino, esquema)
+        if faltantes:
+            logging.getLogger("sigmotaa.migraciones").warning(
+                "Migraciones pendientes%s: %s (python migraciones.py aplicar)",
+                f" en {esquema}" if esquema else "", ", ".join(f"{m.version} {m.nombre}" for m in faltantes)
+            )
+        if faltantes and faltantes[0].version == 1:
+            return  # base sin tablas: no hay versiones que sembrar
+
+    with Session(destino) as session:
+        invalidacion.sembrar(session)
+        session.commit()
 
 
 def create_db_and_tables():
     """Crea todas las tablas en la base de datos"""
-    SQLModel.metadata.create_all(engine)
+    _inicializar(engine)
+
+
+# ====== MULTI-CLUB ======
+
+# Cada club (o categoría juvenil) tiene su propia base: un archivo SQLite o un
+# schema de PostgreSQL. Sin DATABASE_URL_CLUB la aplicación es de un solo club.
+#   DATABASE_URL_CLUB=sqlite:///./clubes/{club}.db
+#   DATABASE_URL_CLUB=postgresql+psycopg://.../sigmotaa   (un schema por club)
+_url_club: Optional[str] = os.getenv("DATABASE_URL_CLUB")
+DATABASE_URL_CLUB = _normalizar_url(_url_club) if _url_club else None
+_read_url_club: Optional[str] = os.getenv("DATABASE_READ_URL_CLUB")
+DATABASE_READ_URL_CLUB = _normalizar_url(_read_url_club) if _read_url_club else None
+
+# Clubes permitidos (vacío = cualquier nombre válido) y club sin cabecera ni subdominio
+CLUBES = [c.strip().lower() for c in os.getenv("CLUBES", "").split(",") if c.strip()]
+CLUB_POR_DEFECTO = os.getenv("CLUB_POR_DEFECTO") or None
+CABECERA_CLUB = "X-Club"
+# Con CLUB_DOMINIO_BASE=sigmotaa.app, river.sigmotaa.app -> club "river"
+CLUB_DOMINIO_BASE = os.getenv("CLUB_DOMINIO_BASE", "").lower() or None
+
+MAX_ENGINES_CLUB = int(os.getenv("CLUB_MAX_ENGINES", "16"))
+POOL_CLUB = int(os.getenv("CLUB_POOL_TAMANO", "2"))
+POOL_EXTRA_CLUB = int(os.getenv("CLUB_POOL_EXTRA", "3"))
+
+_NOMBRE_CLUB = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+
+
+class RegistroEngines:
+    """
+    Engines por club creados bajo demanda, con pools pequeños y como máximo
+    `maximo` abiertos: el menos usado recientemente se cierra (dispose) al
+    superar el límite. Las conexiones en uso de un engine expulsado siguen
+    siendo válidas hasta que se devuelven.
+    """
+
+    def __init__(self, plantilla: str, maximo: int, inicializar: bool):
+        self.plantilla = plantilla
+        self.maximo = maximo
+        self.inicializar = inicializar
+        self._engines: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.creados = 0
+        self.expulsados = 0
+
+    def _crear(self, club: str):
+        opciones = {"pool_size": POOL_CLUB, "max_overflow": POOL_EXTRA_CLUB}
+        if "sqlite" not in self.plantilla:
+            opciones["pool_pre_ping"] = True
+
+        esquema = None
+        if "{club}" in self.plantilla:
+            url = self.plantilla.format(club=club)
+            if url.startswith("sqlite:///"):
+                directorio = os.path.dirname(url[len("sqlite:///"):])
+                if directorio:
+                    os.makedirs(directorio, exist_ok=True)
+        else:
+            # Misma base, un schema por club
+            url, esquema = self.plantilla, club
+            opciones["execution_options"] = {"schema_translate_map": {None: club}}
+
+        nuevo = _crear_engine(url, **opciones)
+        if self.inicializar:
+            _inicializar(nuevo, esquema)
+        return nuevo
+
+    def obtener(self, club: str):
+        with self._lock:
+            existente = self._engines.get(club)
+            if existente is not None:
+                self._engines.move_to_end(club)
+                return existente
+
+            nuevo = self._crear(club)
+            self._engines[club] = nuevo
+            self.creados += 1
+            while len(self._engines) > self.maximo:
+                _, viejo = self._engines.popitem(last=False)
+                viejo.dispose()
+                self.expulsados += 1
+            return nuevo
+
+    def soltar_conexiones(self) -> None:
+        """Olvidar las conexiones heredadas sin cerrarlas (las sigue usando el padre)"""
+        with self._lock:
+            for abierto in self._engines.values():
+                abierto.dispose(close=False)
+
+    def resumen(self) -> dict:
+        with self._lock:
+            abiertos = list(self._engines)
+        return {
+            "abiertos": abiertos,
+            "maximo": self.maximo,
+            "creados": self.creados,
+            "expulsados": self.expulsados
+        }
+
+
+engines_club = RegistroEngines(DATABASE_URL_CLUB, MAX_ENGINES_CLUB, True) if DATABASE_URL_CLUB else None
+engines_lectura_club = (
+    RegistroEngines(DATABASE_READ_URL_CLUB, MAX_ENGINES_CLUB, False) if DATABASE_READ_URL_CLUB else None
+)
+
+
+def validar_club(club: str) -> str:
+    club = club.strip().lower()
+    if not _NOMBRE_CLUB.match(club) or (CLUBES and club not in CLUBES):
+        raise HTTPException(status_code=404, detail=f"Club '{club}' no encontrado")
+    return club
+
 
+def club_de(request: Request) -> Optional[str]:
+    """Club de la petición: cabecera X-Club, subdominio o CLUB_POR_DEFECTO"""
+    if engines_club is None:
+        return None
+    if hasattr(request.state, "club"):
+        return request.state.club
 
-def get_session() -> Generator[Session, None, None]:
+    club = request.headers.get(CABECERA_CLUB)
+    if not club and CLUB_DOMINIO_BASE:
+        host = request.headers.get("host", "").split(":")[0].lower()
+        if host.endswith("." + CLUB_DOMINIO_BASE):
+            club = host[:-len(CLUB_DOMINIO_BASE) - 1]
+    club = club or CLUB_POR_DEFECTO
+
+    request.state.club = validar_club(club) if club else None
+    return request.state.club
+
+
+def engine_club(club: Optional[str]):
+    """Engine de escritura del club (el principal si no hay club)"""
+    if club is None or engines_club is None:
+        return engine
+    return engines_club.obtener(club)
+
+
+def engine_lectura_club(club: Optional[str]):
+    """Engine de lectura del club: su réplica si está configurada"""
+    if club is None or engines_club is None:
+        return read_engine
+    if engines_lectura_club is None:
+        return engines_club.obtener(club)
+    return engines_lectura_club.obtener(club)
+
+
+def club_de_sesion(session: Session) -> Optional[str]:
+    """Club con el que se abrió la sesión (para claves de caché y canales en vivo)"""
+    return session.info.get("club")
+
+
+def tras_fork() -> None:
+    """
+    En un worker recién creado con fork (gunicorn --preload) los pools traen
+    conexiones abiertas por el padre: se descartan sin cerrarlas para que
+    cada worker abra las suyas.
+    """
+    for abierto in {engine, read_engine}:
+        abierto.dispose(close=False)
+    for registro in (engines_club, engines_lectura_club):
+        if registro is not None:
+            registro.soltar_conexiones()
+
+
+def _sin_transaccion_implicita(dbapi_connection, connection_record):
+    # pysqlite abre la transacción recién con el primer INSERT y un SAVEPOINT
+    # previo se confirmaría al liberarlo: la transacción la abre el evento "begin"
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def engine_escritor(club: Optional[str]):
+    """
+    Engine para un hilo escritor dedicado (ver cola_escritura.py). En SQLite
+    es un engine propio cuyas transacciones empiezan con BEGIN IMMEDIATE:
+    toman el lock de escritura al inicio y admiten SAVEPOINT. En otras bases
+    es el engine del club.
+    """
+    base = engine_club(club)
+    if base.dialect.name != "sqlite" or base.url.database in (None, "", ":memory:"):
+        return base
+    escritor = _crear_engine(base.url.render_as_string(hide_password=False), pool_size=1, max_overflow=0)
+    event.listen(escritor, "connect", _sin_transaccion_implicita)
+    event.listen(escritor, "begin", _begin_immediate)
+    return escritor
+
+
+def get_session(request: Request) -> Generator[Session, None, None]:
     """Generador de sesiones para dependency injection"""
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    club = club_de(request)
+    with Session(engine_club(club), info={"club": club}) as session:
+        yield session
+
+
+def _leer_del_primario(request: Request) -> bool:
+    """True si el cliente escribió hace poco y la réplica podría estar atrasada"""
+    marca = request.cookies.get(COOKIE_ESCRITURA)
+    if not marca:
+        return False
+    try:
+        return time.time() - float(marca) < SEGUNDOS_LECTURA_PRIMARIO
+    except ValueError:
+        return False
+
+
+def engine_lectura(request: Request):
+    """Engine para lecturas: réplica, o primario si el cliente escribió hace poco"""
+    club = club_de(request)
+    if _leer_del_primario(request):
+        return engine_club(club)
+    return engine_lectura_club(club)
+
+
+def get_read_session(request: Request) -> Generator[Session, None, None]:
+    """Sesión para rutas de solo lectura (réplica, o primario tras una escritura)"""
+    club = club_de(request)
+    with Session(engine_lectura(request), info={"club": club}) as session:
+        yield session
+
+
+def marcar_escritura(response) -> None:
+    """Fijar la cookie de read-your-writes en la respuesta"""
+    if hay_replica or engines_lectura_club is not None:
+        response.set_cookie(
+            COOKIE_ESCRITURA,
+            str(time.time()),
+            max_age=SEGUNDOS_LECTURA_PRIMARIO,
+            httponly=True,
+            samesite="lax"
+        )
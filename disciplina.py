@@ -0,0 +1,326 @@
+"""
+Motor de disciplina: acumulación de tarjetas y suspensiones.
+
+Cada jugador tiene un registro con contadores acumulados (amarillas sueltas,
+rojas directas, dobles amarillas) y los partidos de sanción ya cumplidos.
+Los partidos pendientes se derivan de esos contadores y de las reglas, así
+que insertar una estadística actualiza el estado en O(1); borrarla, o cargarla
+en un partido que ya se le contó como cumplido, recalcula solo a ese jugador.
+
+Un partido cuenta como fecha cumplida recién cuando se jugó (fecha hasta hoy):
+los próximos no levantan sanciones. `cumplir_fechas` acredita los partidos
+que pasan de próximos a jugados (ver calendario.py).
+"""
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import and_, update
+from sqlmodel import Session, select
+
+from models import DisciplinaJugador, Estadistica, Estado, Jugador, Partido
+
+
+@dataclass(frozen=True)
+class ReglasDisciplina:
+    amarillas_por_suspension: int = 5
+    partidos_por_acumulacion: int = 1
+    partidos_por_roja: int = 1
+    partidos_por_doble_amarilla: int = 1
+
+
+REGLAS = ReglasDisciplina(
+    amarillas_por_suspension=int(os.getenv("DISCIPLINA_AMARILLAS_SUSPENSION", "5")),
+    partidos_por_acumulacion=int(os.getenv("DISCIPLINA_PARTIDOS_ACUMULACION", "1")),
+    partidos_por_roja=int(os.getenv("DISCIPLINA_PARTIDOS_ROJA", "1")),
+    partidos_por_doble_amarilla=int(os.getenv("DISCIPLINA_PARTIDOS_DOBLE_AMARILLA", "1")),
+)
+
+
+def _aporte(tarjetas_amarillas: int, tarjetas_rojas: int):
+    """(amarillas que acumulan, roja directa, doble amarilla) de una estadística"""
+    if tarjetas_amarillas >= 2:
+        return 0, 0, 1
+    if tarjetas_rojas > 0:
+        return tarjetas_amarillas, 1, 0
+    return tarjetas_amarillas, 0, 0
+
+
+def partidos_sancion(registro: DisciplinaJugador, reglas: ReglasDisciplina = REGLAS) -> int:
+    """Total de partidos de sanción generados por las tarjetas del jugador"""
+    return (
+        registro.rojas_directas * reglas.partidos_por_roja
+        + registro.dobles_amarillas * reglas.partidos_por_doble_amarilla
+        + (registro.amarillas_acumuladas // reglas.amarillas_por_suspension) * reglas.partidos_por_acumulacion
+    )
+
+
+def partidos_pendientes(registro: DisciplinaJugador, reglas: ReglasDisciplina = REGLAS) -> int:
+    return max(0, partidos_sancion(registro, reglas) - registro.partidos_cumplidos)
+
+
+def _sincronizar_estado(session: Session, registro: DisciplinaJugador) -> None:
+    """
+    Suspender o habilitar al jugador según sus partidos pendientes. Solo se
+    levantan las suspensiones que puso el motor; las manuales se respetan.
+    """
+    jugador = session.get(Jugador, registro.jugador_id)
+    if not jugador:
+        return
+
+    pendientes = partidos_pendientes(registro)
+    if pendientes > 0 and jugador.estado == Estado.ACTIVO:
+        jugador.estado = Estado.SUSPENDIDO
+        registro.suspension_por_tarjetas = True
+    elif pendientes == 0 and registro.suspension_por_tarjetas:
+        registro.suspension_por_tarjetas = False
+        if jugador.estado != Estado.SUSPENDIDO:
+            return
+        jugador.estado = Estado.ACTIVO
+    else:
+        return
+
+    jugador.fecha_actualizacion = datetime.utcnow()
+    session.add(jugador)
+
+
+def marcar_estado_manual(session: Session, jugador_id: int) -> None:
+    """Un cambio manual de estado deja de ser una suspensión del motor. No hace commit."""
+    registro = session.get(DisciplinaJugador, jugador_id)
+    if registro is not None and registro.suspension_por_tarjetas:
+        registro.suspension_por_tarjetas = False
+        session.add(registro)
+
+
+# ====== ACTUALIZACIÓN INCREMENTAL ======
+
+def registrar_estadistica(
+        session: Session,
+        estadistica: Estadistica,
+        fecha_partido: date,
+        signo: int = 1
+) -> Optional[DisciplinaJugador]:
+    """
+    Aplicar (+1) o revertir (-1) las tarjetas de una estadística. No hace commit.
+
+    Revertir no es simétrico: los partidos ya cumplidos y la fecha de la última
+    sanción dependen del orden de las tarjetas, así que se recalcula el jugador
+    sin esa estadística.
+    """
+    if signo < 0:
+        recalcular(session, [estadistica.jugador_id], excluir=estadistica.id)
+        session.flush()
+        return session.get(DisciplinaJugador, estadistica.jugador_id)
+
+    registro = session.get(DisciplinaJugador, estadistica.jugador_id)
+    if registro is None:
+        registro = DisciplinaJugador(jugador_id=estadistica.jugador_id)
+    elif (
+            registro.partidos_cumplidos
+            and registro.fecha_ultima_sancion is not None
+            and registro.fecha_ultima_sancion < fecha_partido <= date.today()
+    ):
+        # El partido pudo contársele como cumplido, pero lo jugó: deshacerlo
+        recalcular(session, [estadistica.jugador_id])
+        session.flush()
+        return session.get(DisciplinaJugador, estadistica.jugador_id)
+
+    sancion_previa = partidos_sancion(registro)
+
+    amarillas, roja, doble = _aporte(estadistica.tarjetas_amarillas, estadistica.tarjetas_rojas)
+    registro.amarillas_acumuladas = max(0, registro.amarillas_acumuladas + signo * amarillas)
+    registro.rojas_directas = max(0, registro.rojas_directas + signo * roja)
+    registro.dobles_amarillas = max(0, registro.dobles_amarillas + signo * doble)
+
+    if partidos_sancion(registro) > sancion_previa:
+        if registro.fecha_ultima_sancion is None or fecha_partido > registro.fecha_ultima_sancion:
+            registro.fecha_ultima_sancion = fecha_partido
+
+    registro.fecha_actualizacion = datetime.utcnow()
+    session.add(registro)
+    _sincronizar_estado(session, registro)
+    return registro
+
+
+def registrar_partido(session: Session, partido: Partido) -> int:
+    """
+    Un nuevo partido ya jugado cuenta como fecha cumplida para cada jugador
+    sancionado antes de esa fecha; uno próximo no cuenta todavía. No hace
+    commit. Devuelve cuántos cumplieron.
+    """
+    if not partido.jugado():
+        return 0
+
+    registros = session.exec(
+        select(DisciplinaJugador).where(DisciplinaJugador.fecha_ultima_sancion < partido.fecha_partido)
+    ).all()
+
+    cumplieron = 0
+    for registro in registros:
+        if partidos_pendientes(registro) == 0:
+            continue
+        registro.partidos_cumplidos += 1
+        registro.fecha_actualizacion = datetime.utcnow()
+        session.add(registro)
+        _sincronizar_estado(session, registro)
+        cumplieron += 1
+    return cumplieron
+
+
+# ====== RECÁLCULO EN BLOQUE ======
+
+def recalcular(
+        session: Session,
+        jugador_ids: Optional[Iterable[int]] = None,
+        excluir: Optional[int] = None,
+        hoy: Optional[date] = None
+) -> Dict[str, int]:
+    """
+    Reconstruir los registros de disciplina en una sola pasada sobre los
+    partidos ordenados por fecha (con sus estadísticas). Si se indican
+    `jugador_ids` solo se recalculan esos jugadores; `excluir` ignora una
+    estadística que se está revirtiendo. Solo los partidos hasta `hoy`
+    cuentan como fechas cumplidas. No hace commit.
+    """
+    hoy = hoy or date.today()
+    filtro: Optional[Set[int]] = set(jugador_ids) if jugador_ids is not None else None
+
+    union = Estadistica.partido_id == Partido.id
+    if filtro is not None:
+        union = and_(union, Estadistica.jugador_id.in_(filtro))
+    if excluir is not None:
+        union = and_(union, Estadistica.id != excluir)
+
+    filas = session.exec(
+        select(
+            Partido.id, Partido.fecha_partido,
+            Estadistica.jugador_id, Estadistica.tarjetas_amarillas, Estadistica.tarjetas_rojas
+        )
+        .outerjoin(Estadistica, union)
+        .order_by(Partido.fecha_partido, Partido.id)
+    )
+
+    registros: Dict[int, DisciplinaJugador] = {}
+    sancionados: Set[int] = set()
+    partido_actual = None
+    fecha_actual = None
+    participantes: list = []
+
+    def cerrar_partido():
+        # Los sancionados antes de esta fecha que no jugaron cumplen una fecha
+        jugaron = {fila[0] for fila in participantes}
+        # Un partido próximo todavía no es una fecha cumplida
+        for jugador_id in list(sancionados) if fecha_actual <= hoy else ():
+            registro = registros[jugador_id]
+            if jugador_id in jugaron or registro.fecha_ultima_sancion >= fecha_actual:
+                continue
+            registro.partidos_cumplidos += 1
+            if partidos_pendientes(registro) == 0:
+                sancionados.discard(jugador_id)
+
+        for jugador_id, amarillas_partido, rojas_partido in participantes:
+            registro = registros.get(jugador_id)
+            if registro is None:
+                registro = registros[jugador_id] = DisciplinaJugador(jugador_id=jugador_id)
+            previa = partidos_sancion(registro)
+            amarillas, roja, doble = _aporte(amarillas_partido, rojas_partido)
+            registro.amarillas_acumuladas += amarillas
+            registro.rojas_directas += roja
+            registro.dobles_amarillas += doble
+            if partidos_sancion(registro) > previa:
+                registro.fecha_ultima_sancion = fecha_actual
+            if partidos_pendientes(registro) > 0:
+                sancionados.add(jugador_id)
+
+    for partido_id, fecha, jugador_id, amarillas, rojas in filas:
+        if partido_id != partido_actual:
+            if partido_actual is not None:
+                cerrar_partido()
+            partido_actual, fecha_actual, participantes = partido_id, fecha, []
+        if jugador_id is not None:
+            participantes.append((jugador_id, amarillas, rojas))
+    if partido_actual is not None:
+        cerrar_partido()
+
+    # Reemplazar los registros existentes, conservando qué suspensiones puso el motor
+    existentes = select(DisciplinaJugador)
+    if filtro is not None:
+        existentes = existentes.where(DisciplinaJugador.jugador_id.in_(filtro))
+    impuestas: Set[int] = set()
+    for registro in session.exec(existentes).all():
+        if registro.suspension_por_tarjetas:
+            impuestas.add(registro.jugador_id)
+        session.delete(registro)
+    session.flush()
+
+    estados = dict(session.exec(
+        select(Jugador.id, Jugador.estado).where(Jugador.id.in_(set(registros) | impuestas))
+    ).all())
+
+    suspendidos, habilitados = [], [j for j in impuestas if j not in registros]
+    for jugador_id, registro in registros.items():
+        if partidos_pendientes(registro) == 0:
+            if jugador_id in impuestas:
+                habilitados.append(jugador_id)
+        elif jugador_id in impuestas or estados.get(jugador_id) == Estado.ACTIVO:
+            registro.suspension_por_tarjetas = True
+            suspendidos.append(jugador_id)
+
+    ahora = datetime.utcnow()
+    for registro in registros.values():
+        registro.fecha_actualizacion = ahora
+        session.add(registro)
+
+    if suspendidos:
+        session.exec(
+            update(Jugador)
+            .where(Jugador.id.in_(suspendidos), Jugador.estado == Estado.ACTIVO)
+            .values(estado=Estado.SUSPENDIDO, fecha_actualizacion=ahora)
+            .execution_options(synchronize_session="evaluate")
+        )
+    if habilitados:
+        session.exec(
+            update(Jugador)
+            .where(Jugador.id.in_(habilitados), Jugador.estado == Estado.SUSPENDIDO)
+            .values(estado=Estado.ACTIVO, fecha_actualizacion=ahora)
+            .execution_options(synchronize_session="evaluate")
+        )
+
+    return {
+        "jugadores_recalculados": len(registros),
+        "suspendidos": sum(1 for r in registros.values() if partidos_pendientes(r) > 0)
+    }
+
+
+def cumplir_fechas(session: Session, hoy: Optional[date] = None) -> int:
+    """
+    Acreditar los partidos que pasaron de próximos a jugados: se recalculan
+    los jugadores con partidos pendientes. No hace commit. Devuelve cuántos.
+    """
+    hoy = hoy or date.today()
+    registros = session.exec(
+        select(DisciplinaJugador).where(DisciplinaJugador.fecha_ultima_sancion < hoy)
+    ).all()
+    sancionados = [r.jugador_id for r in registros if partidos_pendientes(r) > 0]
+    if sancionados:
+        recalcular(session, sancionados, hoy=hoy)
+    return len(sancionados)
+
+
+def resumen(registro: Optional[DisciplinaJugador], jugador_id: int) -> dict:
+    """Estado disciplinario de un jugador para la API"""
+    if registro is None:
+        registro = DisciplinaJugador(jugador_id=jugador_id)
+    return {
+        "jugador_id": jugador_id,
+        "amarillas_acumuladas": registro.amarillas_acumuladas,
+        "amarillas_para_suspension": REGLAS.amarillas_por_suspension
+        - registro.amarillas_acumuladas % REGLAS.amarillas_por_suspension,
+        "rojas_directas": registro.rojas_directas,
+        "dobles_amarillas": registro.dobles_amarillas,
+        "partidos_sancion": partidos_sancion(registro),
+        "partidos_cumplidos": registro.partidos_cumplidos,
+        "partidos_pendientes": partidos_pendientes(registro),
+        "fecha_ultima_sancion": registro.fecha_ultima_sancion
+    }
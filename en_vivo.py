@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import threading
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+
+# Configuración del hub (por proceso / worker)
+TAMANO_COLA = int(os.getenv("EN_VIVO_TAMANO_COLA", "64"))
+HEARTBEAT_SEGUNDOS = float(os.getenv("EN_VIVO_HEARTBEAT", "15"))
+
+
+class Suscriptor:
+    """Cliente SSE conectado a un partido con su propia cola acotada"""
+
+    __slots__ = ("partido_id", "canal", "cola", "descartado")
+
+    def __init__(self, partido_id: int, tamano_cola: int, club: Optional[str] = None):
+        self.partido_id = partido_id
+        self.canal = (club, partido_id)
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=tamano_cola)
+        self.descartado = False
+
+
+class HubEnVivo:
+    """
+    Hub de difusión en memoria para los partidos en vivo.
+
+    Los routers publican eventos (desde el threadpool o desde el event loop)
+    y el hub los reparte a todos los suscriptores del partido. Cada mensaje
+    se serializa una sola vez; un cliente lento que llena su cola se
+    descarta en lugar de frenar al resto.
+    """
+
+    def __init__(self, tamano_cola: int = TAMANO_COLA, heartbeat: float = HEARTBEAT_SEGUNDOS):
+        self.tamano_cola = tamano_cola
+        self.heartbeat = heartbeat
+        # Canal = (club, partido_id): los ids de partido se repiten entre clubes
+        self._suscriptores: Dict[Tuple[Optional[str], int], Set[Suscriptor]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._secuencia = 0
+        self.publicados = 0
+        self.descartados = 0
+
+    # ====== SUSCRIPCIONES ======
+
+    def suscribir(self, partido_id: int, club: Optional[str] = None) -> Suscriptor:
+        """Registrar un nuevo cliente (debe llamarse dentro del event loop)"""
+        self._loop = asyncio.get_running_loop()
+        suscriptor = Suscriptor(partido_id, self.tamano_cola, club)
+        self._suscriptores.setdefault(suscriptor.canal, set()).add(suscriptor)
+        return suscriptor
+
+    def cancelar(self, suscriptor: Suscriptor) -> None:
+        """Eliminar un cliente del hub"""
+        suscriptores = self._suscriptores.get(suscriptor.canal)
+        if suscriptores is None:
+            return
+        suscriptores.discard(suscriptor)
+        if not suscriptores:
+            del self._suscriptores[suscriptor.canal]
+
+    def total_suscriptores(self) -> int:
+        return sum(len(s) for s in self._suscriptores.values())
+
+    # ====== PUBLICACIÓN ======
+
+    def publicar(self, partido_id: int, evento: str, datos: dict, club: Optional[str] = None) -> None:
+        """Publicar un evento para un partido (seguro desde cualquier hilo)"""
+        canal = (club, partido_id)
+        loop = self._loop
+        if loop is None or loop.is_closed() or canal not in self._suscriptores:
+            return
+
+        with self._lock:
+            self._secuencia += 1
+            secuencia = self._secuencia
+
+        carga = json.dumps(datos, separators=(",", ":"), default=str)
+        mensaje = f"id: {secuencia}\nevent: {evento}\ndata: {carga}\n\n"
+
+        try:
+            en_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            en_loop = False
+
+        if en_loop:
+            self._difundir(canal, mensaje)
+        else:
+            loop.call_soon_threadsafe(self._difundir, canal, mensaje)
+
+    def _difundir(self, canal: Tuple[Optional[str], int], mensaje: str) -> None:
+        """Repartir un mensaje ya serializado (se ejecuta en el event loop)"""
+        suscriptores = self._suscriptores.get(canal)
+        if not suscriptores:
+            return
+
+        self.publicados += 1
+        for suscriptor in list(suscriptores):
+            try:
+                suscriptor.cola.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                self._descartar(suscriptor)
+
+    def _descartar(self, suscriptor: Suscriptor) -> None:
+        """Cortar un consumidor lento: vaciar su cola y dejarle solo el cierre"""
+        suscriptor.descartado = True
+        self.descartados += 1
+        self.cancelar(suscriptor)
+        while not suscriptor.cola.empty():
+            suscriptor.cola.get_nowait()
+        suscriptor.cola.put_nowait(None)
+
+    # ====== STREAM SSE ======
+
+    async def flujo(self, suscriptor: Suscriptor, inicial: dict) -> AsyncIterator[str]:
+        """Generador SSE: estado inicial, diferencias y heartbeats"""
+        try:
+            carga = json.dumps(inicial, separators=(",", ":"), default=str)
+            yield f"retry: 3000\nevent: estado\ndata: {carga}\n\n"
+
+            while True:
+                # Drenar sin crear timers mientras haya mensajes pendientes
+                try:
+                    mensaje = suscriptor.cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    try:
+                        mensaje = await asyncio.wait_for(suscriptor.cola.get(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ": ping\n\n"
+                        continue
+
+                if mensaje is None:
+                    yield "event: descartado\ndata: {}\n\n"
+                    break
+                yield mensaje
+        finally:
+            self.cancelar(suscriptor)
+
+
+hub = HubEnVivo()
+
+
+def diferencias_estadistica(estadistica) -> dict:
+    """Representación compacta de una estadística: solo los valores distintos de cero"""
+    datos = {"id": estadistica.id, "jugador_id": estadistica.jugador_id}
+    for campo in (
+        "minutos_jugados", "goles_anotados", "asistencias", "intercepciones",
+        "balones_recuperados", "tarjetas_amarillas", "tarjetas_rojas", "faltas_cometidas"
+    ):
+        valor = getattr(estadistica, campo)
+        if valor:
+            datos[campo] = valor
+    return datos
@@ -0,0 +1,144 @@
+"""
+Eventos minuto a minuto de los partidos.
+
+`eventos_partido` solo se agrega: cada evento son cuatro enteros (partido,
+jugador, tipo codificado y minuto). Al registrar un lote, los conteos de
+cada jugador se suman a su `Estadistica` del partido (creándola si no
+existe) y pasan por `agregados.aplicar_estadistica`, así que los totales del
+partido y la disciplina quedan al día en la misma transacción. Los cambios
+(entra/sale) se guardan pero no suman a ningún total.
+"""
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+
+import agregados
+from models import Estadistica, EventoCreate, EventoPartido, Partido, TipoEvento
+
+MAX_LOTE = int(os.getenv("EVENTOS_MAX_LOTE", "5000"))
+
+# Tipo de evento -> campo de Estadistica que incrementa
+CAMPOS_ESTADISTICA = {
+    TipoEvento.GOL: "goles_anotados",
+    TipoEvento.ASISTENCIA: "asistencias",
+    TipoEvento.AMARILLA: "tarjetas_amarillas",
+    TipoEvento.ROJA: "tarjetas_rojas",
+    TipoEvento.FALTA: "faltas_cometidas",
+}
+
+
+# ====== ESCRITURA ======
+
+def registrar_lote(session: Session, partido: Partido, eventos: Sequence[EventoCreate]) -> List[Estadistica]:
+    """
+    Guardar un lote de eventos con un INSERT por lotes y sumar sus conteos a
+    las estadísticas del partido. Devuelve las estadísticas modificadas.
+    No hace commit.
+    """
+    session.execute(
+        insert(EventoPartido),
+        [
+            {"partido_id": partido.id, "jugador_id": e.jugador_id, "tipo": int(e.tipo), "minuto": e.minuto}
+            for e in eventos
+        ]
+    )
+
+    conteos: Dict[int, Counter] = defaultdict(Counter)
+    for evento in eventos:
+        campo = CAMPOS_ESTADISTICA.get(evento.tipo)
+        if campo:
+            conteos[evento.jugador_id][campo] += 1
+    if not conteos:
+        return []
+
+    existentes = {
+        e.jugador_id: e
+        for e in session.exec(
+            select(Estadistica).where(
+                Estadistica.partido_id == partido.id,
+                Estadistica.jugador_id.in_(list(conteos))
+            )
+        )
+    }
+
+    modificadas = []
+    for jugador_id, conteo in conteos.items():
+        estadistica = existentes.get(jugador_id)
+        if estadistica is None:
+            estadistica = Estadistica(jugador_id=jugador_id, partido_id=partido.id, minutos_jugados=0)
+            session.add(estadistica)
+        else:
+            # Revertir el aporte anterior y aplicar el nuevo: la disciplina no es lineal en las tarjetas
+            agregados.aplicar_estadistica(session, estadistica, partido.fecha_partido, signo=-1)
+
+        for campo, cantidad in conteo.items():
+            setattr(estadistica, campo, getattr(estadistica, campo) + cantidad)
+        if estadistica.tarjetas_amarillas > 2 or estadistica.tarjetas_rojas > 1:
+            raise ValueError(f"El jugador {jugador_id} supera el máximo de tarjetas en el partido")
+
+        agregados.aplicar_estadistica(session, estadistica, partido.fecha_partido)
+        modificadas.append(estadistica)
+
+    return modificadas
+
+
+# ====== LECTURA ======
+
+def listar(
+        session: Session,
+        partido_id: int,
+        tipo: Optional[TipoEvento] = None,
+        desde_minuto: Optional[int] = None,
+        hasta_minuto: Optional[int] = None
+) -> List[dict]:
+    """Eventos de un partido en orden cronológico (usa el índice partido + minuto)"""
+    statement = (
+        select(EventoPartido.id, EventoPartido.jugador_id, EventoPartido.tipo, EventoPartido.minuto)
+        .where(EventoPartido.partido_id == partido_id)
+        .order_by(EventoPartido.minuto, EventoPartido.id)
+    )
+    if tipo is not None:
+        statement = statement.where(EventoPartido.tipo == int(tipo))
+    if desde_minuto is not None:
+        statement = statement.where(EventoPartido.minuto >= desde_minuto)
+    if hasta_minuto is not None:
+        statement = statement.where(EventoPartido.minuto <= hasta_minuto)
+
+    return [
+        {"id": evento_id, "jugador_id": jugador_id, "tipo": TipoEvento(tipo_).name, "minuto": minuto}
+        for evento_id, jugador_id, tipo_, minuto in session.exec(statement)
+    ]
+
+
+def histograma(
+        session: Session,
+        tamano: int = 15,
+        tipos: Optional[Sequence[TipoEvento]] = None,
+        partido_id: Optional[int] = None,
+        jugador_id: Optional[int] = None
+) -> dict:
+    """Eventos por tipo y tramo de `tamano` minutos con un único GROUP BY"""
+    tramo = (EventoPartido.minuto // tamano).label("tramo")
+    statement = (
+        select(EventoPartido.tipo, tramo, func.count())
+        .group_by(EventoPartido.tipo, tramo)
+        .order_by(EventoPartido.tipo, tramo)
+    )
+    if tipos:
+        statement = statement.where(EventoPartido.tipo.in_([int(t) for t in tipos]))
+    if partido_id is not None:
+        statement = statement.where(EventoPartido.partido_id == partido_id)
+    if jugador_id is not None:
+        statement = statement.where(EventoPartido.jugador_id == jugador_id)
+
+    por_tipo: Dict[str, List[dict]] = defaultdict(list)
+    for tipo, numero_tramo, eventos in session.exec(statement):
+        por_tipo[TipoEvento(tipo).name].append({
+            "desde": numero_tramo * tamano,
+            "hasta": numero_tramo * tamano + tamano - 1,
+            "eventos": eventos
+        })
+    return {"tamano": tamano, "tipos": dict(por_tipo)}
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from database import club_de, engine
+from models import RespuestaIdempotente
+
+
+CABECERA = "Idempotency-Key"
+TTL = timedelta(hours=float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24")))
+ESPERA_MAXIMA_SEGUNDOS = 10.0
+# Una reserva 'en proceso' vence pronto: si el worker murió, otro puede tomarla
+RESERVA = timedelta(seconds=float(os.getenv("IDEMPOTENCIA_RESERVA_S", str(ESPERA_MAXIMA_SEGUNDOS * 6))))
+PURGAR_CADA = 200
+
+# Cabeceras de la respuesta original que se guardan para la repetición
+CABECERAS_GUARDADAS = ("content-type", "location")
+
+
+class _Almacenada:
+    """Respuesta lista para repetirse (en memoria)"""
+
+    __slots__ = ("huella", "estado_http", "cabeceras", "cuerpo")
+
+    def __init__(self, huella: str, estado_http: int, cabeceras: dict, cuerpo: bytes):
+        self.huella = huella
+        self.estado_http = estado_http
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+
+    def respuesta(self) -> Response:
+        cabeceras = dict(self.cabeceras)
+        cabeceras["Idempotent-Replayed"] = "true"
+        return Response(content=self.cuerpo, status_code=self.estado_http, headers=cabeceras)
+
+
+def _hash(*partes: bytes) -> str:
+    digest = hashlib.sha256()
+    for parte in partes:
+        digest.update(parte)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# ====== ACCESO A LA TABLA ======
+
+def _leer(clave: str) -> Optional[RespuestaIdempotente]:
+    with Session(engine) as session:
+        registro = session.get(RespuestaIdempotente, clave)
+        if registro and registro.expira_en < datetime.utcnow():
+            session.delete(registro)
+            session.commit()
+            return None
+        return registro
+
+
+def _reservar(clave: str, huella: str) -> bool:
+    """
+    Insertar la clave como 'en proceso' con una reserva corta; False si otro
+    worker la tiene. Una reserva vencida (worker caído) se toma en su lugar.
+    """
+    ahora = datetime.utcnow()
+    with Session(engine) as session:
+        session.add(RespuestaIdempotente(
+            clave=clave,
+            huella=huella,
+            estado_http=0,
+            expira_en=ahora + RESERVA
+        ))
+        try:
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+
+        tomada = session.exec(
+            update(RespuestaIdempotente)
+            .where(
+                RespuestaIdempotente.clave == clave,
+                RespuestaIdempotente.estado_http == 0,
+                RespuestaIdempotente.expira_en < ahora
+            )
+            .values(huella=huella, expira_en=ahora + RESERVA)
+        )
+        session.commit()
+        return tomada.rowcount == 1
+
+
+def _completar(clave: str, almacenada: _Almacenada) -> None:
+    with Session(engine) as session:
+        registro = session.get(RespuestaIdempotente, clave)
+        if not registro:
+            return
+        registro.estado_http = almacenada.estado_http
+        registro.expira_en = datetime.utcnow() + TTL
+        registro.tipo_contenido = almacenada.cabeceras.get("content-type")
+        registro.ubicacion = almacenada.cabeceras.get("location")
+        registro.cuerpo = almacenada.cuerpo
+        session.add(registro)
+        session.commit()
+
+
+def _liberar(clave: str) -> None:
+    """Borrar la reserva cuando la petición falló y puede reintentarse"""
+    with Session(engine) as session:
+        session.exec(delete(RespuestaIdempotente).where(RespuestaIdempotente.clave == clave))
+        session.commit()
+
+
+def purgar_expiradas() -> int:
+    """Eliminar las respuestas cuyo TTL ya venció"""
+    with Session(engine) as session:
+        resultado = session.exec(
+            delete(RespuestaIdempotente).where(RespuestaIdempotente.expira_en < datetime.utcnow())
+        )
+        session.commit()
+        return resultado.rowcount
+
+
+def _desde_registro(registro: RespuestaIdempotente) -> _Almacenada:
+    cabeceras = {}
+    if registro.tipo_contenido:
+        cabeceras["content-type"] = registro.tipo_contenido
+    if registro.ubicacion:
+        cabeceras["location"] = registro.ubicacion
+    return _Almacenada(registro.huella, registro.estado_http, cabeceras, registro.cuerpo or b"")
+
+
+# ====== MIDDLEWARE ======
+
+class IdempotenciaMiddleware(BaseHTTPMiddleware):
+    """
+    Soporte de `Idempotency-Key` para los endpoints POST.
+
+    La primera petición con una clave se ejecuta normalmente y su respuesta
+    se guarda en la tabla `idempotencia`. Los reintentos con la misma clave
+    reciben la respuesta guardada sin tocar las tablas del dominio, y los
+    duplicados simultáneos esperan a que termine la primera ejecución.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._en_curso: Dict[str, asyncio.Future] = {}
+        self._guardadas = 0
+
+    async def dispatch(self, request, call_next):
+        clave_cliente = request.headers.get(CABECERA)
+        if request.method != "POST" or not clave_cliente:
+            return await call_next(request)
+
+        if len(clave_cliente) > 255:
+            return JSONResponse(status_code=400, content={"detail": f"{CABECERA} demasiado larga"})
+
+        try:
+            club = club_de(request)
+        except HTTPException:
+            # Club desconocido: la ruta responde el 404
+            return await call_next(request)
+
+        # La tabla vive en la base principal: con varios clubes la clave incluye el club
+        partes = (request.url.path.encode(), clave_cliente.encode())
+        clave = _hash(club.encode(), *partes) if club else _hash(*partes)
+
+        # Duplicado concurrente en este worker: esperar a la ejecución original.
+        # El futuro se registra antes del primer await para que dos duplicados
+        # simultáneos no lleguen los dos a la tabla.
+        pendiente = self._en_curso.get(clave)
+        if pendiente is not None:
+            huella = _hash(await request.body())
+            try:
+                almacenada = await asyncio.wait_for(asyncio.shield(pendiente), ESPERA_MAXIMA_SEGUNDOS)
+            except asyncio.TimeoutError:
+                return self._conflicto()
+            if almacenada is None:
+                return self._conflicto()
+            return self._repetir(almacenada, huella)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = futuro
+        almacenada = None
+        try:
+            huella = _hash(await request.body())
+
+            registro = await run_in_threadpool(_leer, clave)
+            if registro is not None:
+                if registro.estado_http == 0:
+                    # Otro worker la está procesando
+                    return self._conflicto()
+                almacenada = _desde_registro(registro)
+                return self._repetir(almacenada, huella)
+
+            if not await run_in_threadpool(_reservar, clave, huella):
+                return self._conflicto()
+
+            return await self._ejecutar(request, call_next, clave, huella, futuro)
+        finally:
+            if not futuro.done():
+                futuro.set_result(almacenada)
+            del self._en_curso[clave]
+
+    async def _ejecutar(self, request, call_next, clave: str, huella: str, futuro: asyncio.Future) -> Response:
+        """Primera ejecución con la clave reservada: guardar la respuesta o liberar la reserva"""
+        almacenada = None
+        try:
+            respuesta = await call_next(request)
+            contenido = b"".join([parte async for parte in respuesta.body_iterator])
+
+            cabeceras = {
+                nombre: respuesta.headers[nombre]
+                for nombre in CABECERAS_GUARDADAS if nombre in respuesta.headers
+            }
+            if respuesta.status_code < 500:
+                almacenada = _Almacenada(huella, respuesta.status_code, cabeceras, contenido)
+                await run_in_threadpool(_completar, clave, almacenada)
+            else:
+                await run_in_threadpool(_liberar, clave)
+
+            final = Response(content=contenido, status_code=respuesta.status_code)
+            # raw_headers conserva las cabeceras repetidas (varios set-cookie)
+            final.raw_headers = respuesta.raw_headers
+            return final
+        except BaseException:
+            await run_in_threadpool(_liberar, clave)
+            raise
+        finally:
+            futuro.set_result(almacenada)
+            await self._purgar_periodicamente()
+
+    async def _purgar_periodicamente(self):
+        self._guardadas += 1
+        if self._guardadas % PURGAR_CADA == 0:
+            await run_in_threadpool(purgar_expiradas)
+
+    @staticmethod
+    def _repetir(almacenada: _Almacenada, huella: str) -> Response:
+        if almacenada.huella != huella:
+            return JSONResponse(
+                status_code=422,
+                content={"detail": f"{CABECERA} ya fue usada con un cuerpo diferente"}
+            )
+        return almacenada.respuesta()
+
+    @staticmethod
+    def _conflicto() -> Response:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": "Hay una petición con la misma Idempotency-Key en proceso"},
+            headers={"Retry-After": "1"}
+        )
@@ -0,0 +1,253 @@
+"""
+Invalidación de la caché entre procesos.
+
+Con varios workers cada uno tiene su propia caché (cache.py). Para que una
+escritura en un worker invalide a los demás, cada commit que toca alguna
+tabla VIGILADA (las que usan las entradas de caché y el índice de
+similitud) incrementa su versión en `versiones_tabla`, y cada worker vigila
+esas versiones para descartar solo las entradas de las tablas que cambiaron:
+
+- SQLite: el incremento es un único UPSERT ... RETURNING dentro de la misma
+  transacción (SQLite ya serializa a los escritores). Un hilo consulta
+  `PRAGMA data_version` cada CACHE_SONDEO_MS (solo cambia cuando otra
+  conexión hizo commit) y recién entonces lee la tabla de versiones.
+- PostgreSQL: las transacciones del dominio no tocan `versiones_tabla` (sus
+  filas serían un bloqueo compartido por todos los escritores hasta el
+  commit). Tras el commit, una transacción corta propia incrementa las
+  versiones y emite un NOTIFY; un hilo por base las recibe con LISTEN. Al
+  reconectar se vacía la caché, porque los avisos perdidos no se reenvían.
+  Si el proceso muere entre ambos commits, CACHE_TTL_S acota lo obsoleto.
+
+Las sesiones que solo tocan tablas no vigiladas (idempotencia, migraciones,
+perfilado...) no pagan nada. No hace falta ningún servicio externo.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, insert, select, text
+from sqlmodel import Session
+
+import database
+from cache import CLAVE_TABLAS, cache
+from models import VersionTabla
+
+SONDEO_S = float(os.getenv("CACHE_SONDEO_MS", "500")) / 1000
+CANAL = "sigmotaa_cache"
+# Tablas de las que dependen la caché (tablero.py, opciones.py, balance de
+# partidos) y el índice de similitud; las demás no versionan
+VIGILADAS = frozenset({"jugadores", "partidos", "estadisticas", "disciplina_jugadores"})
+
+logger = logging.getLogger("sigmotaa.cache")
+
+_conocidas: Dict[Optional[str], Dict[str, int]] = {}
+_lock = threading.Lock()
+_detener = threading.Event()
+_hilos: List[threading.Thread] = []
+_oyentes: Dict[str, threading.Thread] = {}
+
+# Funciones a llamar tras cada commit con (session, versiones nuevas o {}), p. ej. similitud.py
+al_confirmar: List[Callable[[Session, Dict[str, int]], None]] = []
+
+
+# ====== VERSIONES EN EL COMMIT ======
+
+def _insertar(dialecto: str):
+    if dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insertar
+    elif dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insertar
+    else:
+        return None
+    return insertar
+
+
+def _incrementar(conexion, tablas: Iterable[str]) -> Dict[str, int]:
+    """Sumar 1 a la versión de cada tabla (creando su fila) en una sola sentencia"""
+    sentencia = _insertar(conexion.dialect.name)(VersionTabla).values(
+        [{"tabla": t, "version": 1} for t in sorted(tablas)]
+    )
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[VersionTabla.tabla],
+        set_={"version": VersionTabla.version + 1}
+    ).returning(VersionTabla.tabla, VersionTabla.version)
+    return dict(conexion.execute(sentencia).all())
+
+
+@event.listens_for(Session, "before_commit")
+def _versiones_en_la_transaccion(session) -> None:
+    session.flush()  # anotar también las tablas de lo que aún está pendiente
+    tablas = VIGILADAS.intersection(session.info.get(CLAVE_TABLAS, ()))
+    if not tablas:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        session.info["tablas_a_versionar"] = tablas
+    else:
+        session.info["versiones_nuevas"] = _incrementar(session.connection(), tablas)
+
+
+def _versiones_tras_el_commit(session, tablas) -> Dict[str, int]:
+    """PostgreSQL: transacción corta aparte; NOTIFY llega a los demás solo si se confirma"""
+    club = session.info.get("club")
+    with session.get_bind().begin() as conexion:
+        versiones = _incrementar(conexion, tablas)
+        conexion.execute(
+            text("SELECT pg_notify(:canal, :datos)"),
+            {"canal": CANAL, "datos": json.dumps({"club": club, "versiones": versiones})}
+        )
+    return versiones
+
+
+@event.listens_for(Session, "after_commit")
+def _registrar_propias(session) -> None:
+    """Las versiones de los commits propios ya están invalidadas localmente"""
+    versiones = session.info.pop("versiones_nuevas", None)
+    tablas = session.info.pop("tablas_a_versionar", None)
+    if tablas:
+        try:
+            versiones = _versiones_tras_el_commit(session, tablas)
+        except Exception as e:
+            # El commit ya está hecho: los demás workers lo verán al vencer CACHE_TTL_S
+            logger.warning("No se pudieron publicar las versiones de %s: %s", sorted(tablas), e)
+
+    for funcion in al_confirmar:
+        funcion(session, versiones or {})
+    if not versiones:
+        return
+    with _lock:
+        _conocidas.setdefault(session.info.get("club"), {}).update(versiones)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_propias(session) -> None:
+    session.info.pop("versiones_nuevas", None)
+    session.info.pop("tablas_a_versionar", None)
+
+
+def sembrar(session: Session) -> None:
+    """Crear la fila de versión de cada tabla que aún no la tenga. No hace commit."""
+    existentes = set(session.execute(select(VersionTabla.tabla)).scalars())
+    faltantes = VIGILADAS - existentes
+    if not faltantes:
+        return
+
+    # Varios workers arrancan a la vez sobre la misma base: el que llega segundo no inserta nada
+    insertar = _insertar(session.get_bind().dialect.name)
+    sentencia = insert(VersionTabla) if insertar is None else insertar(VersionTabla).on_conflict_do_nothing()
+    session.execute(sentencia, [{"tabla": t, "version": 0} for t in sorted(faltantes)])
+
+
+# ====== VIGILANCIA ======
+
+def _aplicar(club: Optional[str], versiones: Dict[str, int], completas: bool) -> int:
+    """
+    Comparar versiones leídas con las conocidas y descartar lo que cambió.
+    Si el club no tenía línea base y `versiones` es la tabla completa, se
+    descarta todo lo del club (pudo cambiar antes de empezar a vigilar).
+    """
+    with _lock:
+        conocidas = _conocidas.get(club)
+        _conocidas[club] = dict(versiones) if completas else {**(conocidas or {}), **versiones}
+
+    if conocidas is None and completas:
+        return cache.invalidar(club, None)
+    cambiadas = {t for t, v in versiones.items() if (conocidas or {}).get(t) != v}
+    return cache.invalidar(club, cambiadas) if cambiadas else 0
+
+
+def _leer_versiones(conexion) -> Dict[str, int]:
+    return dict(conexion.execute("SELECT tabla, version FROM versiones_tabla").fetchall())
+
+
+def _sondear(club: Optional[str], conexiones: dict) -> None:
+    engine = database.engine_club(club)
+    if engine.dialect.name == "postgresql":
+        _asegurar_oyente(engine)
+        return
+
+    ruta = engine.url.database
+    if engine.dialect.name != "sqlite" or not ruta or ruta == ":memory:":
+        return
+
+    entrada = conexiones.get(club)
+    if entrada is None:
+        entrada = conexiones[club] = [sqlite3.connect(ruta, check_same_thread=False), None]
+    version_datos = entrada[0].execute("PRAGMA data_version").fetchone()[0]
+    if version_datos != entrada[1]:
+        entrada[1] = version_datos
+        _aplicar(club, _leer_versiones(entrada[0]), completas=True)
+
+
+def _vigilar() -> None:
+    conexiones: dict = {}
+    while not _detener.wait(SONDEO_S):
+        for club in cache.clubes():
+            try:
+                _sondear(club, conexiones)
+            except Exception as e:
+                logger.warning("No se pudo sondear versiones de %s: %s", club or "principal", e)
+    for conexion, _ in conexiones.values():
+        conexion.close()
+
+
+def _escuchar(url: str) -> None:
+    import psycopg
+
+    reconexion = False
+    while not _detener.is_set():
+        try:
+            with psycopg.connect(url, autocommit=True) as conexion:
+                conexion.execute(f"LISTEN {CANAL}")
+                if reconexion:
+                    cache.limpiar()
+                reconexion = True
+                while not _detener.is_set():
+                    for aviso in conexion.notifies(timeout=1.0):
+                        datos = json.loads(aviso.payload)
+                        _aplicar(datos["club"], datos["versiones"], completas=False)
+        except Exception as e:
+            logger.warning("LISTEN %s interrumpido: %s", CANAL, e)
+            reconexion = True
+            _detener.wait(5)
+
+
+def _asegurar_oyente(engine) -> None:
+    url = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    with _lock:
+        if url in _oyentes:
+            return
+        hilo = threading.Thread(target=_escuchar, args=(url,), name="cache-listen", daemon=True)
+        _oyentes[url] = hilo
+    hilo.start()
+
+
+def _linea_base(club: Optional[str]) -> None:
+    engine = database.engine_club(club)
+    if engine.dialect.name == "postgresql":
+        _asegurar_oyente(engine)
+        return
+    with engine.connect() as conexion:
+        _aplicar(club, dict(conexion.execute(select(VersionTabla.tabla, VersionTabla.version)).all()), True)
+
+
+def iniciar() -> None:
+    """Tomar la línea base de los clubes por defecto y arrancar la vigilancia (en el lifespan)"""
+    _detener.clear()
+    _linea_base(None)
+    if database.engines_club is not None and database.CLUB_POR_DEFECTO:
+        _linea_base(database.validar_club(database.CLUB_POR_DEFECTO))
+
+    hilo = threading.Thread(target=_vigilar, name="cache-sondeo", daemon=True)
+    _hilos.append(hilo)
+    hilo.start()
+
+
+def detener() -> None:
+    _detener.set()
+    for hilo in _hilos + list(_oyentes.values()):
+        hilo.join(timeout=2)
+    _hilos.clear()
+    _oyentes.clear()
@@ -0,0 +1,148 @@
+"""
+Ruta rápida de lectura con SQLAlchemy Core.
+
+Las rutas GET que solo devuelven datos no necesitan el identity map ni
+instancias de SQLModel: aquí cada consulta es un `lambda_stmt`, que
+SQLAlchemy compila una vez y reutiliza (los valores de los filtros viajan
+como parámetros), y las filas se serializan directo desde sus mappings.
+
+Se activa por ruta con LECTURA_CORE (nombres separados por coma, `*` para
+todas); sin configurar, todas usan el ORM:
+    LECTURA_CORE=jugadores,jugador,partidos
+"""
+import json
+import os
+from datetime import date, datetime
+from enum import Enum
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import lambda_stmt, select
+from sqlmodel import Session
+
+from models import Estadistica, Estado, Jugador, Partido, Position, ResultadoPartido
+
+RUTAS = ("jugadores", "jugador", "partidos", "partido", "estadisticas", "estadistica")
+
+_configuradas = {r.strip() for r in os.getenv("LECTURA_CORE", "").split(",") if r.strip()}
+ACTIVAS = set(RUTAS) if "*" in _configuradas else _configuradas & set(RUTAS)
+
+_jugadores = Jugador.__table__
+_partidos = Partido.__table__
+_estadisticas = Estadistica.__table__
+
+
+def activa(ruta: str) -> bool:
+    return ruta in ACTIVAS
+
+
+# ====== SERIALIZACIÓN ======
+
+def _a_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.value
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+class RespuestaFilas(JSONResponse):
+    """JSONResponse que acepta fechas y enums sin pasar por jsonable_encoder"""
+
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content,
+            default=_a_json,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+
+
+def _lista(session: Session, statement) -> RespuestaFilas:
+    filas = session.connection().execute(statement).mappings()
+    return RespuestaFilas([dict(fila) for fila in filas])
+
+
+def _una(session: Session, statement, no_encontrado: str) -> RespuestaFilas:
+    fila = session.connection().execute(statement).mappings().first()
+    if fila is None:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    return RespuestaFilas(dict(fila))
+
+
+# ====== CONSULTAS ======
+
+def jugadores(session: Session, estado: Optional[Estado] = None) -> RespuestaFilas:
+    statement = lambda_stmt(lambda: select(_jugadores))
+    if estado:
+        statement += lambda s: s.where(_jugadores.c.estado == estado)
+    return _lista(session, statement)
+
+
+def jugador(session: Session, jugador_id: int) -> RespuestaFilas:
+    statement = lambda_stmt(lambda: select(_jugadores).where(_jugadores.c.id == jugador_id))
+    return _una(session, statement, "Jugador no encontrado")
+
+
+def partidos(
+        session: Session,
+        ordenar_por: str,
+        ascendente: bool,
+        resultado: Optional[ResultadoPartido] = None,
+        min_total_goles: Optional[int] = None,
+        min_total_amarillas: Optional[int] = None
+) -> RespuestaFilas:
+    columna = _partidos.c[ordenar_por]
+    orden = columna.asc() if ascendente else columna.desc()
+    statement = lambda_stmt(
+        lambda: select(_partidos).order_by(orden, _partidos.c.fecha_partido.desc()),
+        track_on=[ordenar_por, ascendente]
+    )
+    if resultado:
+        statement += lambda s: s.where(_partidos.c.resultado == resultado)
+    if min_total_goles is not None:
+        statement += lambda s: s.where(_partidos.c.total_goles >= min_total_goles)
+    if min_total_amarillas is not None:
+        statement += lambda s: s.where(_partidos.c.total_amarillas >= min_total_amarillas)
+    return _lista(session, statement)
+
+
+def partido(session: Session, partido_id: int) -> RespuestaFilas:
+    statement = lambda_stmt(lambda: select(_partidos).where(_partidos.c.id == partido_id))
+    return _una(session, statement, "Partido no encontrado")
+
+
+def estadisticas(
+        session: Session,
+        jugador_id: Optional[int] = None,
+        partido_id: Optional[int] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        posicion: Optional[Position] = None,
+        resultado: Optional[ResultadoPartido] = None
+) -> RespuestaFilas:
+    statement = lambda_stmt(lambda: select(_estadisticas))
+    if jugador_id:
+        statement += lambda s: s.where(_estadisticas.c.jugador_id == jugador_id)
+    if partido_id:
+        statement += lambda s: s.where(_estadisticas.c.partido_id == partido_id)
+    if desde or hasta or resultado:
+        statement += lambda s: s.join(_partidos, _partidos.c.id == _estadisticas.c.partido_id)
+        if desde:
+            statement += lambda s: s.where(_partidos.c.fecha_partido >= desde)
+        if hasta:
+            statement += lambda s: s.where(_partidos.c.fecha_partido <= hasta)
+        if resultado:
+            statement += lambda s: s.where(_partidos.c.resultado == resultado)
+    if posicion:
+        statement += lambda s: s.join(_jugadores, _jugadores.c.id == _estadisticas.c.jugador_id).where(
+            _jugadores.c.posicion == posicion
+        )
+    return _lista(session, statement)
+
+
+def estadistica(session: Session, estadistica_id: int) -> RespuestaFilas:
+    statement = lambda_stmt(lambda: select(_estadisticas).where(_estadisticas.c.id == estadistica_id))
+    return _una(session, statement, "Estadística no encontrada")
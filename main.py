@@ -1,18 +1,49 @@
+import logging
+import tracemalloc
+
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.datastructures import MutableHeaders
 from contextlib import asynccontextmanager
 
-from database import create_db_and_tables
-from routers import jugadores, partidos, estadisticas
+import admision
+import calendario
+import cola_escritura
+import database
+import invalidacion
+import perfilado
+import respaldos
+import tablero
+from database import create_db_and_tables, marcar_escritura
+from idempotencia import IdempotenciaMiddleware
+from reportes import cerrar as cerrar_reportes
+from routers import admin, clubes, dashboard, jugadores, partidos, estadisticas, reportes
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Inicializar base de datos al arrancar la aplicación"""
     create_db_and_tables()
+    invalidacion.iniciar()
+    perfilado.iniciar()
+    try:
+        tablero.calentar()
+    except Exception as e:
+        logging.getLogger("sigmotaa").warning("No se pudo precalcular el tablero: %s", e)
+    tarea_respaldos = respaldos.iniciar_programados()
+    tarea_calendario = calendario.iniciar_programado()
     yield
+    if tarea_respaldos:
+        tarea_respaldos.cancel()
+    if tarea_calendario:
+        tarea_calendario.cancel()
+    cerrar_reportes()
+    cola_escritura.detener()
+    perfilado.detener()
+    invalidacion.detener()
 
 
 app = FastAPI(
@@ -22,6 +53,99 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Reintentos seguros de los POST con Idempotency-Key
+app.add_middleware(IdempotenciaMiddleware)
+
+logger = logging.getLogger("sigmotaa.sql")
+
+class ContarConsultasSQL:
+    """
+    Modo desarrollo: cabeceras con el número de consultas y aviso de N+1.
+
+    Es ASGI puro para seguir contando mientras se envía el cuerpo: las
+    vistas en streaming consultan filas después de mandar las cabeceras, así
+    que `X-SQL-Queries` cuenta solo lo previo a ellas y el total (con los
+    avisos de N+1) se registra en el log al terminar la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        antes_del_cuerpo = 0
+        with database.contar_consultas() as registro:
+            async def enviar(mensaje):
+                nonlocal antes_del_cuerpo
+                if mensaje["type"] == "http.response.start":
+                    antes_del_cuerpo = registro.total
+                    cabeceras = MutableHeaders(scope=mensaje)
+                    cabeceras["X-SQL-Queries"] = str(registro.total)
+                    repetidas = registro.repetidas()
+                    if repetidas:
+                        cabeceras["X-SQL-N-Plus-1"] = str(len(repetidas))
+                await send(mensaje)
+
+            await self.app(scope, receive, enviar)
+
+        metodo, ruta = scope["method"], scope["path"]
+        if registro.total > antes_del_cuerpo:
+            logger.info(
+                "%s %s: %d consultas (%d durante el envío del cuerpo)",
+                metodo, ruta, registro.total, registro.total - antes_del_cuerpo
+            )
+        for huella, veces in registro.repetidas():
+            logger.warning("Posible N+1 en %s %s: %dx %s", metodo, ruta, veces, huella)
+
+
+if database.SQL_DEBUG:
+    app.add_middleware(ContarConsultasSQL)
+
+
+@app.middleware("http")
+async def lectura_tras_escritura(request: Request, call_next):
+    """Tras una escritura exitosa, las lecturas del cliente van al primario"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        marcar_escritura(response)
+    return response
+
+
+# Concurrencia por grupo de rutas; el cupo dura hasta enviar todo el cuerpo
+app.add_middleware(admision.AdmisionMiddleware)
+
+
+@app.middleware("http")
+async def perfilar_peticion(request: Request, call_next):
+    """Perfil de la petición con X-Perfil (solo admin) y memoria por ruta con tracemalloc activo"""
+    if not perfilado.habilitado():
+        return await call_next(request)
+
+    modos = request.headers.get(perfilado.CABECERA_PERFIL)
+    if modos and perfilado.token_valido(request.headers.get(perfilado.CABECERA_TOKEN)):
+        perfil = perfilado.PerfilPeticion(m.strip().lower() for m in modos.split(","))
+        await run_in_threadpool(perfil.iniciar)
+        try:
+            with perfil.seguir():
+                response = await call_next(request)
+        finally:
+            await run_in_threadpool(perfil.terminar)
+        response.headers["X-Perfil-Id"] = perfil.id
+        response.headers["X-Perfil-Ms"] = f"{perfil.duracion_ms:.1f}"
+        return response
+
+    if not tracemalloc.is_tracing():
+        return await call_next(request)
+    antes = tracemalloc.get_traced_memory()[0]
+    response = await call_next(request)
+    ruta = request.scope.get("route")
+    perfilado.registrar_ruta(f"{request.method} {getattr(ruta, 'path', request.url.path)}", antes)
+    return response
+
+
 # Configurar archivos estáticos y templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -30,6 +154,10 @@ templates = Jinja2Templates(directory="templates")
 app.include_router(jugadores.router)
 app.include_router(partidos.router)
 app.include_router(estadisticas.router)
+app.include_router(clubes.router)
+app.include_router(reportes.router)
+app.include_router(dashboard.router)
+app.include_router(admin.router)
 
 
 # ====== RUTAS PRINCIPALES ======
@@ -50,11 +178,26 @@ async def api_info(request: Request):
             "docs": "/docs",
             "jugadores": "/jugadores",
             "partidos": "/partidos",
-            "estadisticas": "/estadisticas"
+            "estadisticas": "/estadisticas",
+            "clubes": "/clubes",
+            "reportes": "/reportes",
+            "dashboard": "/api/dashboard"
         }
     }
 
 
+@app.get("/api/admision")
+async def metricas_admision():
+    """Métricas del control de admisión: concurrencia, cola y tiempos de espera"""
+    return admision.metricas()
+
+
+@app.get("/api/escrituras")
+async def metricas_escrituras():
+    """Cola de escritura: lotes confirmados, tamaño promedio y pendientes por club"""
+    return cola_escritura.resumen()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
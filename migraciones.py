@@ -0,0 +1,355 @@
+"""
+Migraciones versionadas del esquema.
+
+`SQLModel.metadata.create_all` solo crea tablas que no existen: no agrega
+columnas ni índices a tablas ya creadas. Cada cambio de esquema es aquí una
+migración numerada; las aplicadas quedan en `versiones_esquema` con su
+duración, de modo que cada base (y cada club) aplica solo lo que le falta.
+
+- Los cambios aditivos (tablas, columnas con default) son transaccionales:
+  la migración y su registro se confirman juntos o no se confirma nada.
+  Agregar una columna con default constante no reescribe la tabla ni en
+  SQLite ni en PostgreSQL 11+.
+- Los índices no bloquean las escrituras por mucho tiempo: en PostgreSQL
+  se crean con CREATE INDEX CONCURRENTLY (fuera de transacción, borrando
+  antes un índice inválido de un intento interrumpido). SQLite no puede
+  construir un índice por partes: CREATE INDEX recorre la tabla entera y
+  retiene el bloqueo de escritura hasta terminar. Lo único que se reparte
+  es el conjunto: cada índice va en su propia transacción, así las
+  escrituras se intercalan entre uno y otro. En tablas grandes conviene
+  aplicar la migración con `python migraciones.py aplicar` fuera de hora.
+- Los rellenos de datos se hacen por lotes de MIGRACIONES_LOTE filas con un
+  commit por lote.
+
+Las migraciones no transaccionales se registran al terminar y son
+idempotentes: si se interrumpen, la siguiente ejecución las repite.
+
+Se aplican al arrancar (MIGRAR_AL_INICIAR=0 para solo advertir las
+pendientes) o desde la línea de comandos:
+
+    python migraciones.py estado [--club X]
+    python migraciones.py aplicar [--hasta N] [--club X]
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, select
+
+import database
+from models import DisciplinaJugador, Estado, Jugador, Partido, VersionEsquema
+
+AL_INICIAR = os.getenv("MIGRAR_AL_INICIAR", "1") == "1"
+LOTE = int(os.getenv("MIGRACIONES_LOTE", "500"))
+
+logger = logging.getLogger("sigmotaa.migraciones")
+
+
+@dataclass
+class Contexto:
+    """Base sobre la que corre una migración"""
+    destino: object
+    esquema: Optional[str] = None
+    conn: Optional[object] = None  # conexión con la transacción abierta (solo transaccionales)
+
+    @property
+    def dialecto(self) -> str:
+        return self.destino.dialect.name
+
+    def tabla(self, nombre: str) -> str:
+        """Nombre calificado para SQL textual (schema_translate_map no aplica a text())"""
+        quote = self.destino.dialect.identifier_preparer.quote
+        return f"{quote(self.esquema)}.{quote(nombre)}" if self.esquema else quote(nombre)
+
+
+@dataclass(frozen=True)
+class Migracion:
+    version: int
+    nombre: str
+    aplicar: Callable[[Contexto], object]
+    transaccional: bool = True
+
+
+@contextmanager
+def _transaccion(destino) -> Iterator[object]:
+    """
+    Transacción que incluye el DDL: pysqlite solo abre transacciones antes
+    de un INSERT/UPDATE/DELETE, así que en SQLite se abre explícitamente
+    (IMMEDIATE: toma el lock de escritura desde el inicio).
+    """
+    with destino.begin() as conn:
+        if destino.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        yield conn
+
+
+# ====== OPERACIONES ======
+
+def _agregar_columnas(ctx: Contexto, tabla: str, columnas: List[str]) -> List[str]:
+    """ALTER TABLE ADD COLUMN de las columnas del modelo que aún no existan"""
+    modelo = SQLModel.metadata.tables[tabla]
+    existentes = {c["name"] for c in inspect(ctx.conn).get_columns(tabla, schema=ctx.esquema)}
+    agregadas = []
+    for nombre in columnas:
+        if nombre in existentes:
+            continue
+        columna = modelo.columns[nombre]
+        ddl = f"ALTER TABLE {ctx.tabla(tabla)} ADD COLUMN {nombre} {columna.type.compile(ctx.destino.dialect)}"
+        if columna.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {columna.server_default.arg}"
+        ctx.conn.execute(text(ddl))
+        agregadas.append(f"{tabla}.{nombre}")
+    return agregadas
+
+
+def _indice_invalido_postgres(conn, ctx: Contexto, nombre: str) -> bool:
+    """Un CREATE INDEX CONCURRENTLY interrumpido deja el índice creado pero inválido"""
+    return conn.execute(text(
+        "SELECT 1 FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :nombre AND n.nspname = coalesce(:esquema, current_schema()) "
+        "AND NOT i.indisvalid"
+    ), {"nombre": nombre, "esquema": ctx.esquema}).first() is not None
+
+
+def _crear_indices(ctx: Contexto, tabla: str, nombres: List[str]) -> List[str]:
+    """Crear los índices del modelo indicados, de a uno (en SQLite, una transacción por índice)"""
+    indices = {i.name: i for i in SQLModel.metadata.tables[tabla].indexes}
+    quote = ctx.destino.dialect.identifier_preparer.quote
+    prefijo = f"{quote(ctx.esquema)}." if ctx.esquema else ""
+    creados = []
+
+    for nombre in nombres:
+        indice = indices[nombre]
+        columnas = ", ".join(quote(c.name) for c in indice.columns)
+        unico = "UNIQUE " if indice.unique else ""
+        if ctx.dialecto == "postgresql":
+            with ctx.destino.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                if _indice_invalido_postgres(conn, ctx, nombre):
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {prefijo}{quote(nombre)}"))
+                conn.execute(text(
+                    f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {quote(nombre)} "
+                    f"ON {ctx.tabla(tabla)} ({columnas})"
+                ))
+        else:
+            # Un recorrido completo de la tabla con el bloqueo de escritura: no se puede partir
+            with _transaccion(ctx.destino) as conn:
+                conn.execute(text(
+                    f"CREATE {unico}INDEX IF NOT EXISTS {prefijo}{quote(nombre)} "
+                    f"ON {ctx.tabla(tabla)} ({columnas})"
+                ))
+        creados.append(nombre)
+    return creados
+
+
+# ====== MIGRACIONES ======
+
+def _tablas_base(ctx: Contexto) -> None:
+    import ratings  # noqa: F401  registra todos los modelos antes de create_all
+    SQLModel.metadata.create_all(ctx.conn)
+
+
+def _columnas_totales(ctx: Contexto) -> List[str]:
+    return _agregar_columnas(ctx, "partidos", [
+        "total_jugadores", "total_minutos", "total_goles",
+        "total_asistencias", "total_amarillas", "total_rojas"
+    ])
+
+
+def _rellenar_totales(ctx: Contexto) -> int:
+    """Totales por partido de las bases anteriores a esas columnas, por lotes"""
+    import agregados
+    ultimo, actualizados = 0, 0
+    with Session(ctx.destino) as session:
+        while True:
+            ids = session.exec(
+                select(Partido.id).where(Partido.id > ultimo).order_by(Partido.id).limit(LOTE)
+            ).all()
+            if not ids:
+                return actualizados
+            actualizados += agregados.recalcular_totales(session, ids)
+            session.commit()
+            ultimo = ids[-1]
+
+
+def _indices_consultas(ctx: Contexto) -> List[str]:
+    return (
+        _crear_indices(ctx, "partidos", ["ix_partidos_fecha_id"])
+        + _crear_indices(ctx, "estadisticas", ["ix_estadisticas_partido_jugador"])
+    )
+
+
+def _ratings_historicos(ctx: Contexto) -> int:
+    """Ratings de los partidos cargados antes de existir la tabla"""
+    import ratings
+    with Session(bind=ctx.conn) as session:
+        if not ratings.pendientes(session):
+            return 0
+        fotos = ratings.recalcular(session)
+        session.commit()
+        return fotos
+
+
+def _columna_suspension_disciplina(ctx: Contexto) -> List[str]:
+    return _agregar_columnas(ctx, "disciplina_jugadores", ["suspension_por_tarjetas"])
+
+
+def _recalcular_disciplina(ctx: Contexto) -> dict:
+    """
+    Registros de disciplina sin la marca de suspensión del motor: se asume que
+    un SUSPENDIDO con partidos pendientes lo puso el motor y se recalcula todo.
+    """
+    import disciplina
+    with Session(bind=ctx.conn) as session:
+        filas = session.exec(
+            select(DisciplinaJugador, Jugador.estado).join(Jugador, Jugador.id == DisciplinaJugador.jugador_id)
+        ).all()
+        for registro, estado_jugador in filas:
+            if estado_jugador == Estado.SUSPENDIDO and disciplina.partidos_pendientes(registro) > 0:
+                registro.suspension_por_tarjetas = True
+                session.add(registro)
+        session.flush()
+        resultado = disciplina.recalcular(session)
+        session.commit()
+        return resultado
+
+
+MIGRACIONES = [
+    Migracion(1, "tablas_base", _tablas_base),
+    Migracion(2, "columnas_totales_partido", _columnas_totales),
+    Migracion(3, "rellenar_totales_partido", _rellenar_totales, transaccional=False),
+    Migracion(4, "indices_consultas", _indices_consultas, transaccional=False),
+    Migracion(5, "ratings_historicos", _ratings_historicos),
+    Migracion(6, "columna_suspension_disciplina", _columna_suspension_disciplina),
+    Migracion(7, "recalcular_disciplina", _recalcular_disciplina),
+]
+
+
+# ====== EJECUCIÓN ======
+
+def _preparar(destino, esquema: Optional[str]) -> None:
+    if esquema and destino.dialect.name == "postgresql":
+        with destino.begin() as conn:
+            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{esquema}"'))
+    VersionEsquema.__table__.create(destino, checkfirst=True)
+
+
+def _aplicadas(destino) -> dict:
+    with destino.connect() as conn:
+        filas = conn.execute(VersionEsquema.__table__.select()).mappings().all()
+    return {f["version"]: dict(f) for f in filas}
+
+
+def _registrar(conn, migracion: Migracion, duracion_ms: float) -> None:
+    conn.execute(VersionEsquema.__table__.insert().values(
+        version=migracion.version, nombre=migracion.nombre, duracion_ms=round(duracion_ms, 1)
+    ))
+
+
+def pendientes(destino, esquema: Optional[str] = None) -> List[Migracion]:
+    if not inspect(destino).has_table(VersionEsquema.__tablename__, schema=esquema):
+        return list(MIGRACIONES)
+    aplicadas = _aplicadas(destino)
+    return [m for m in MIGRACIONES if m.version not in aplicadas]
+
+
+def migrar(destino, esquema: Optional[str] = None, hasta: Optional[int] = None) -> List[dict]:
+    """
+    Aplicar en orden las migraciones pendientes (hasta la versión `hasta`).
+    Devuelve versión, nombre, duración y resultado de cada una. Quien llama
+    debe impedir que dos procesos migren la misma base a la vez (ver
+    database._bloqueo_inicializacion).
+    """
+    _preparar(destino, esquema)
+    aplicadas = _aplicadas(destino)
+    resultados = []
+
+    for migracion in MIGRACIONES:
+        if migracion.version in aplicadas or (hasta is not None and migracion.version > hasta):
+            continue
+        ctx = Contexto(destino, esquema)
+        inicio = time.perf_counter()
+        if migracion.transaccional:
+            with _transaccion(destino) as conn:
+                ctx.conn = conn
+                detalle = migracion.aplicar(ctx)
+                duracion_ms = (time.perf_counter() - inicio) * 1000
+                _registrar(conn, migracion, duracion_ms)
+        else:
+            detalle = migracion.aplicar(ctx)
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            with _transaccion(destino) as conn:
+                _registrar(conn, migracion, duracion_ms)
+
+        logger.info(
+            "Migración %d %s aplicada en %.1f ms%s", migracion.version, migracion.nombre,
+            duracion_ms, f" ({esquema})" if esquema else ""
+        )
+        resultados.append({
+            "version": migracion.version,
+            "nombre": migracion.nombre,
+            "duracion_ms": round(duracion_ms, 1),
+            "detalle": detalle
+        })
+    return resultados
+
+
+def estado(destino, esquema: Optional[str] = None) -> dict:
+    aplicadas = _aplicadas(destino) if inspect(destino).has_table(
+        VersionEsquema.__tablename__, schema=esquema
+    ) else {}
+    return {
+        "aplicadas": [aplicadas[v] for v in sorted(aplicadas)],
+        "pendientes": [{"version": m.version, "nombre": m.nombre} for m in MIGRACIONES if m.version not in aplicadas]
+    }
+
+
+# ====== LÍNEA DE COMANDOS ======
+
+def _destino(club: Optional[str]) -> tuple:
+    """Engine sin inicializar (la migración la hace este comando) y schema del club"""
+    if club is None:
+        return database.engine, None
+    if database.DATABASE_URL_CLUB is None:
+        raise SystemExit("DATABASE_URL_CLUB no está configurada")
+    plantilla = database.DATABASE_URL_CLUB
+    registro = database.RegistroEngines(plantilla, 1, False)
+    return registro.obtener(database.validar_club(club)), None if "{club}" in plantilla else club
+
+
+def _opcion(argv: List[str], nombre: str) -> Optional[str]:
+    if nombre not in argv:
+        return None
+    i = argv.index(nombre)
+    return argv[i + 1]
+
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("estado", "aplicar"):
+        print("Uso: python migraciones.py estado | aplicar [--hasta N] [--club X]")
+        return 2
+
+    destino, esquema = _destino(_opcion(argv, "--club"))
+    if argv[0] == "estado":
+        resultado = estado(destino, esquema)
+    else:
+        hasta = _opcion(argv, "--hasta")
+        with database._bloqueo_inicializacion(destino):
+            aplicadas = migrar(destino, esquema, int(hasta) if hasta else None)
+        resultado = {"aplicadas": aplicadas, "pendientes": estado(destino, esquema)["pendientes"]}
+
+    print(json.dumps(resultado, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
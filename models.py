@@ -1,7 +1,9 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, SmallInteger, false
+from pydantic import field_validator
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from datetime import date, datetime
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 # Enums
@@ -36,6 +38,17 @@ class ResultadoPartido(str, Enum):
     DERROTA = "DERROTA"
 
 
+class TipoEvento(IntEnum):
+    """Se guarda como entero pequeño: los códigos no deben cambiar"""
+    GOL = 1
+    ASISTENCIA = 2
+    AMARILLA = 3
+    ROJA = 4
+    FALTA = 5
+    CAMBIO_ENTRA = 6
+    CAMBIO_SALE = 7
+
+
 # Modelos de Base de Datos
 class Jugador(SQLModel, table=True):
     __tablename__ = "jugadores"
@@ -68,6 +81,10 @@ class Jugador(SQLModel, table=True):
 
 class Partido(SQLModel, table=True):
     __tablename__ = "partidos"
+    __table_args__ = (
+        # Rangos de fechas que devuelven ids sin leer la tabla (filtros por temporada)
+        Index("ix_partidos_fecha_id", "fecha_partido", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -83,11 +100,22 @@ class Partido(SQLModel, table=True):
     estadio: Optional[str] = Field(default=None, max_length=200)
     observaciones: Optional[str] = Field(default=None, max_length=500)
 
+    # Totales del equipo (denormalizados, ver agregados.py)
+    total_jugadores: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total_minutos: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total_goles: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total_asistencias: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total_amarillas: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total_rojas: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
     # Fechas de control
     fecha_creacion: datetime = Field(default_factory=datetime.utcnow)
 
-    # Relaciones
-    estadisticas: List["Estadistica"] = Relationship(back_populates="partido")
+    # Relaciones (el borrado en cascada lo hace la base de datos)
+    estadisticas: List["Estadistica"] = Relationship(
+        back_populates="partido",
+        sa_relationship_kwargs={"passive_deletes": True}
+    )
 
     def calcular_resultado(self) -> ResultadoPartido:
         """Calcula automáticamente el resultado del partido"""
@@ -98,15 +126,29 @@ class Partido(SQLModel, table=True):
         else:
             return ResultadoPartido.EMPATE
 
+    def jugado(self, hoy: Optional[date] = None) -> bool:
+        """Los partidos con fecha futura son próximos: aún no cuentan"""
+        return self.fecha_partido <= (hoy or date.today())
+
 
 class Estadistica(SQLModel, table=True):
     __tablename__ = "estadisticas"
+    __table_args__ = (
+        Index("ix_estadisticas_partido_jugador", "partido_id", "jugador_id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     # Foreign Keys
     jugador_id: int = Field(foreign_key="jugadores.id", index=True)
-    partido_id: int = Field(foreign_key="partidos.id", index=True)
+    partido_id: int = Field(
+        sa_column=Column(
+            Integer,
+            ForeignKey("partidos.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True
+        )
+    )
 
     # Estadísticas del Jugador en el Partido
     minutos_jugados: int = Field(ge=0, le=120)  # Tiempo en minutos
@@ -130,6 +172,97 @@ class Estadistica(SQLModel, table=True):
     partido: Optional[Partido] = Relationship(back_populates="estadisticas")
 
 
+class DisciplinaJugador(SQLModel, table=True):
+    """Contadores acumulados de tarjetas y sanciones (ver disciplina.py)"""
+    __tablename__ = "disciplina_jugadores"
+
+    jugador_id: int = Field(foreign_key="jugadores.id", primary_key=True)
+
+    amarillas_acumuladas: int = Field(default=0, ge=0)
+    rojas_directas: int = Field(default=0, ge=0)
+    dobles_amarillas: int = Field(default=0, ge=0)
+    partidos_cumplidos: int = Field(default=0, ge=0)
+    fecha_ultima_sancion: Optional[date] = Field(default=None, index=True)
+    # El estado SUSPENDIDO actual lo puso el motor (no un cambio manual)
+    suspension_por_tarjetas: bool = Field(default=False, sa_column_kwargs={"server_default": false()})
+
+    fecha_actualizacion: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RatingPartido(SQLModel, table=True):
+    """Ratings Elo antes y después de cada partido (ver ratings.py)"""
+    __tablename__ = "ratings_partido"
+    __table_args__ = (
+        Index("ix_ratings_partido_orden", "fecha_partido", "partido_id"),
+        Index("ix_ratings_partido_rival_orden", "rival", "fecha_partido", "partido_id"),
+    )
+
+    partido_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("partidos.id", ondelete="CASCADE"), primary_key=True)
+    )
+    fecha_partido: date
+    rival: str = Field(max_length=100)
+
+    rating_sigmotaa_antes: float
+    rating_rival_antes: float
+    # Puntuación esperada de sigmotaa antes del partido (1 = victoria segura)
+    esperado: float
+    rating_sigmotaa_despues: float
+    rating_rival_despues: float
+
+
+class EventoPartido(SQLModel, table=True):
+    """Evento minuto a minuto de un partido, solo se agrega (ver eventos.py)"""
+    __tablename__ = "eventos_partido"
+    __table_args__ = (
+        Index("ix_eventos_partido_minuto", "partido_id", "minuto"),
+        Index("ix_eventos_partido_tipo_minuto", "tipo", "minuto"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    partido_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("partidos.id", ondelete="CASCADE"), nullable=False)
+    )
+    jugador_id: int = Field(foreign_key="jugadores.id")
+    tipo: TipoEvento = Field(sa_column=Column(SmallInteger, nullable=False))
+    minuto: int = Field(sa_column=Column(SmallInteger, nullable=False))
+
+
+class VersionTabla(SQLModel, table=True):
+    """Versión de cada tabla, se incrementa en cada commit que la modifica (ver invalidacion.py)"""
+    __tablename__ = "versiones_tabla"
+
+    tabla: str = Field(primary_key=True, max_length=64)
+    version: int = Field(default=0)
+
+
+class VersionEsquema(SQLModel, table=True):
+    """Migraciones aplicadas a la base (ver migraciones.py)"""
+    __tablename__ = "versiones_esquema"
+
+    version: int = Field(primary_key=True)
+    nombre: str = Field(max_length=100)
+    aplicada_en: datetime = Field(default_factory=datetime.utcnow)
+    duracion_ms: float = Field(default=0)
+
+
+class RespuestaIdempotente(SQLModel, table=True):
+    """Respuesta guardada para una Idempotency-Key (ver idempotencia.py)"""
+    __tablename__ = "idempotencia"
+
+    # sha256 de ruta + clave del cliente; huella = sha256 del cuerpo
+    clave: str = Field(primary_key=True, max_length=64)
+    huella: str = Field(max_length=64)
+
+    # estado_http = 0 mientras la petición original está en proceso
+    estado_http: int = Field(default=0)
+    tipo_contenido: Optional[str] = Field(default=None, max_length=100)
+    ubicacion: Optional[str] = Field(default=None, max_length=500)
+    cuerpo: Optional[bytes] = Field(default=None)
+
+    expira_en: datetime = Field(index=True)
+
+
 # Modelos Pydantic para API (Request/Response)
 class JugadorCreate(SQLModel):
     nombre_completo: str
@@ -171,6 +304,24 @@ class PartidoCreate(SQLModel):
     observaciones: Optional[str] = None
 
 
+class PartidoUpdate(SQLModel):
+    rival: Optional[str] = None
+    fecha_partido: Optional[date] = None
+    goles_sigmotaa: Optional[int] = None
+    goles_rival: Optional[int] = None
+    es_local: Optional[bool] = None
+    estadio: Optional[str] = None
+    observaciones: Optional[str] = None
+
+    @field_validator("rival", "fecha_partido", "goles_sigmotaa", "goles_rival", "es_local")
+    @classmethod
+    def sin_nulos(cls, valor):
+        """Se pueden omitir, pero no borrar: las columnas no admiten NULL"""
+        if valor is None:
+            raise ValueError("no puede ser null")
+        return valor
+
+
 class EstadisticaCreate(SQLModel):
     jugador_id: int
     partido_id: int
@@ -181,4 +332,21 @@ class EstadisticaCreate(SQLModel):
     balones_recuperados: int = 0
     tarjetas_amarillas: int = 0
     tarjetas_rojas: int = 0
-    faltas_cometidas: int = 0
\ No newline at end of file
+    faltas_cometidas: int = 0
+
+
+class EventoCreate(SQLModel):
+    jugador_id: int
+    tipo: TipoEvento
+    minuto: int = Field(ge=0, le=130)
+
+    @field_validator("tipo", mode="before")
+    @classmethod
+    def tipo_por_nombre(cls, valor):
+        """Aceptar el nombre que devuelven las lecturas ("GOL") además del código (1)"""
+        if isinstance(valor, str) and not valor.strip().isdigit():
+            try:
+                return TipoEvento[valor.strip().upper()]
+            except KeyError:
+                raise ValueError(f"Tipo de evento inválido; use {', '.join(t.name for t in TipoEvento)} o su código")
+        return valor
@@ -0,0 +1,134 @@
+"""
+Opciones de los formularios de carga (jugador y partido).
+
+El formulario solo lista el plantel activo y una ventana de partidos
+(próximos y recientes); ese conjunto se guarda en la caché compartida
+(ver cache.py) y cualquier commit sobre jugadores o partidos lo invalida.
+El resto del historial se busca con los endpoints paginados
+`/partidos/opciones?q=` y `/jugadores/opciones?q=`, así la página del
+formulario no crece con los años.
+"""
+import os
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+import database
+from cache import cache
+from models import Estado, Jugador, Partido
+
+TABLAS = ("jugadores", "partidos")
+RECIENTES = int(os.getenv("FORM_PARTIDOS_RECIENTES", "15"))
+PROXIMOS = int(os.getenv("FORM_PARTIDOS_PROXIMOS", "5"))
+PAGINA = int(os.getenv("OPCIONES_PAGINA", "20"))
+PAGINA_MAXIMA = 50
+
+
+def _partido(id_: int, fecha: date, rival: str) -> dict:
+    return {"id": id_, "fecha_partido": fecha, "rival": rival, "etiqueta": f"{fecha:%d/%m/%Y} - vs {rival}"}
+
+
+def _jugador(id_: int, numero: int, nombre: str) -> dict:
+    return {"id": id_, "numero_camiseta": numero, "nombre_completo": nombre, "etiqueta": f"#{numero} - {nombre}"}
+
+
+_COLUMNAS_PARTIDO = (Partido.id, Partido.fecha_partido, Partido.rival)
+_COLUMNAS_JUGADOR = (Jugador.id, Jugador.numero_camiseta, Jugador.nombre_completo)
+
+
+# ====== FORMULARIO ======
+
+def calcular(session: Session, hoy: date) -> dict:
+    jugadores = session.exec(
+        select(*_COLUMNAS_JUGADOR)
+        .where(Jugador.estado == Estado.ACTIVO)
+        .order_by(Jugador.numero_camiseta)
+    ).all()
+    proximos = session.exec(
+        select(*_COLUMNAS_PARTIDO)
+        .where(Partido.fecha_partido > hoy)
+        .order_by(Partido.fecha_partido, Partido.id)
+        .limit(PROXIMOS)
+    ).all()
+    recientes = session.exec(
+        select(*_COLUMNAS_PARTIDO)
+        .where(Partido.fecha_partido <= hoy)
+        .order_by(Partido.fecha_partido.desc(), Partido.id.desc())
+        .limit(RECIENTES)
+    ).all()
+
+    return {
+        "jugadores": [_jugador(*fila) for fila in jugadores],
+        "proximos": [_partido(*fila) for fila in proximos],
+        "recientes": [_partido(*fila) for fila in recientes]
+    }
+
+
+def formulario(session: Session) -> Tuple[dict, bool]:
+    """Opciones del formulario desde la caché (o calculadas y guardadas). Devuelve (datos, acierto)."""
+    hoy = date.today()
+    return cache.obtener_o_calcular(
+        database.club_de_sesion(session),
+        ("opciones_formulario", hoy),
+        TABLAS,
+        lambda: calcular(session, hoy)
+    )
+
+
+def partido_fuera_de_ventana(session: Session, datos: dict, partido_id: Optional[int]) -> Optional[dict]:
+    """El partido preseleccionado cuando no está entre los próximos ni los recientes"""
+    if not partido_id or any(p["id"] == partido_id for p in datos["proximos"] + datos["recientes"]):
+        return None
+    fila = session.exec(select(*_COLUMNAS_PARTIDO).where(Partido.id == partido_id)).first()
+    return _partido(*fila) if fila else None
+
+
+# ====== BÚSQUEDA PAGINADA ======
+
+def _pagina(filas: list, offset: int, limite: int, formato) -> dict:
+    return {
+        "opciones": [formato(*fila) for fila in filas[:limite]],
+        "siguiente": offset + limite if len(filas) > limite else None
+    }
+
+
+def buscar_partidos(session: Session, q: Optional[str], offset: int = 0, limite: int = PAGINA) -> dict:
+    """Partidos cuyo rival contiene `q`, del más nuevo al más viejo"""
+    statement = select(*_COLUMNAS_PARTIDO)
+    if q:
+        statement = statement.where(func.lower(Partido.rival).contains(q.strip().lower(), autoescape=True))
+    filas = session.exec(
+        statement
+        .order_by(Partido.fecha_partido.desc(), Partido.id.desc())
+        .offset(offset)
+        .limit(limite + 1)
+    ).all()
+    return _pagina(filas, offset, limite, _partido)
+
+
+def buscar_jugadores(
+        session: Session,
+        q: Optional[str],
+        estado: Optional[Estado] = None,
+        offset: int = 0,
+        limite: int = PAGINA
+) -> dict:
+    """Jugadores por nombre o número de camiseta"""
+    statement = select(*_COLUMNAS_JUGADOR)
+    if estado:
+        statement = statement.where(Jugador.estado == estado)
+    if q:
+        q = q.strip().lstrip("#")
+        if q.isdigit():
+            statement = statement.where(Jugador.numero_camiseta == int(q))
+        else:
+            statement = statement.where(func.lower(Jugador.nombre_completo).contains(q.lower(), autoescape=True))
+    filas = session.exec(
+        statement
+        .order_by(Jugador.numero_camiseta, Jugador.id)
+        .offset(offset)
+        .limit(limite + 1)
+    ).all()
+    return _pagina(filas, offset, limite, _jugador)
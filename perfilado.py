@@ -0,0 +1,474 @@
+"""
+Perfilado bajo demanda en producción (solo administración).
+
+Todo requiere la cabecera X-Admin-Token igual a ADMIN_TOKEN; sin
+ADMIN_TOKEN configurado no hay perfilado ni rutas /admin.
+
+- CPU: un hilo muestrea las pilas de todos los hilos con
+  `sys._current_frames()` cada PERFIL_INTERVALO_MS y cuenta pilas
+  idénticas. El resultado usa el formato "collapsed" (una pila por línea,
+  `hilo;modulo:funcion;... cantidad`) que leen flamegraph.pl, speedscope o
+  inferno.
+- Memoria: `tracemalloc` con instantánea base, diferencias contra la base
+  y el crecimiento neto de memoria trazada por ruta.
+- Por petición: con la cabecera `X-Perfil: cpu`, `memoria` o ambas se
+  perfila solo esa petición; la respuesta trae `X-Perfil-Id` para bajar el
+  resultado. El muestreo de CPU se limita a los hilos de la petición: el del
+  event loop y los del pool que ejecutan consultas para ella.
+
+Con varios workers las órdenes se reparten por archivos en PERFIL_DIR (un
+directorio compartido por los procesos de la máquina): cada worker lo
+revisa cada PERFIL_SONDEO_MS, ejecuta la orden y deja su resultado ahí, y
+el worker que atendió la petición los junta. El directorio se crea con
+permisos 0700 y se rechaza si pertenece a otro usuario.
+"""
+import json
+import logging
+import os
+import secrets
+import stat
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+CABECERA_TOKEN = "X-Admin-Token"
+CABECERA_PERFIL = "X-Perfil"
+
+DIRECTORIO = os.getenv("PERFIL_DIR", os.path.join(tempfile.gettempdir(), "sigmotaa_perfil"))
+INTERVALO_S = float(os.getenv("PERFIL_INTERVALO_MS", "5")) / 1000
+INTERVALO_PETICION_S = float(os.getenv("PERFIL_INTERVALO_PETICION_MS", "1")) / 1000
+SONDEO_S = float(os.getenv("PERFIL_SONDEO_MS", "500")) / 1000
+FRAMES_MEMORIA = int(os.getenv("PERFIL_MEMORIA_FRAMES", "10"))
+SEGUNDOS_MAXIMO = 120
+RETENCION_S = 3600
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("sigmotaa.perfil")
+
+# Hoja de la pila de un hilo en espera: pool sin trabajo, loop de asyncio o de uvloop sin eventos
+_OCIOSAS = {"threading.py:wait", "threading.py:_wait_for_tstate_lock", "selectors.py:select", "runners.py:run"}
+
+
+def habilitado() -> bool:
+    return ADMIN_TOKEN is not None
+
+
+def token_valido(valor: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and valor) and secrets.compare_digest(valor.encode(), ADMIN_TOKEN.encode())
+
+
+# ====== MUESTREO DE PILAS ======
+
+_nombres: Dict[object, str] = {}
+
+
+def _archivo(ruta: str) -> str:
+    """Ruta corta: relativa al proyecto o al paquete instalado"""
+    if ruta.startswith(RAIZ + os.sep):
+        return os.path.relpath(ruta, RAIZ)
+    if "site-packages" + os.sep in ruta:
+        return ruta.split("site-packages" + os.sep, 1)[1]
+    return os.path.basename(ruta)
+
+
+def _nombre(codigo) -> str:
+    """`routers/partidos.py:read_partido`, `sqlalchemy/orm/session.py:execute`"""
+    nombre = _nombres.get(codigo)
+    if nombre is None:
+        nombre = _nombres[codigo] = f"{_archivo(codigo.co_filename)}:{codigo.co_name}"
+    return nombre
+
+
+def _pila(frame) -> List[str]:
+    marcos = []
+    while frame is not None:
+        marcos.append(_nombre(frame.f_code))
+        frame = frame.f_back
+    marcos.reverse()
+    return marcos
+
+
+def muestrear(
+        detener: threading.Event,
+        intervalo: float,
+        hasta: Optional[float] = None,
+        incluir_ociosos: bool = False,
+        hilos: Optional[Set[int]] = None
+) -> Counter:
+    """Muestrear los hilos (todos menos este, o solo `hilos`) hasta `hasta` (time.time()) o hasta `detener`"""
+    propio = threading.get_ident()
+    pilas: Counter = Counter()
+    while not detener.is_set() and (hasta is None or time.time() < hasta):
+        nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if hilos is not None and ident not in hilos:
+                continue
+            # Este módulo: el propio muestreo y los hilos que esperan resultados
+            if ident == propio or frame.f_code.co_filename == __file__:
+                continue
+            if not incluir_ociosos and _nombre(frame.f_code) in _OCIOSAS:
+                continue
+            pilas[";".join([nombres.get(ident, str(ident)).replace(" ", "_")] + _pila(frame))] += 1
+        detener.wait(intervalo)
+    return pilas
+
+
+def colapsado(pilas: Counter) -> str:
+    return "".join(f"{pila} {cantidad}\n" for pila, cantidad in pilas.most_common())
+
+
+def _leer_colapsado(ruta: str, pilas: Counter) -> None:
+    with open(ruta) as archivo:
+        for linea in archivo:
+            pila, _, cantidad = linea.rstrip("\n").rpartition(" ")
+            if pila:
+                pilas[pila] += int(cantidad)
+
+
+# ====== MEMORIA ======
+
+_base: Optional[tracemalloc.Snapshot] = None
+_por_ruta: Dict[str, List[int]] = {}  # ruta -> [peticiones, neto_total, neto_max]
+_lock_memoria = threading.Lock()
+
+# Perfiles de petición con memoria en curso; el último en terminar detiene
+# tracemalloc si lo arrancó uno de ellos (o si se pidió detenerlo mientras tanto)
+_lock_traza = threading.Lock()
+_perfiles_memoria = 0
+_detener_traza = False
+
+
+def memoria_iniciar(frames: int = FRAMES_MEMORIA) -> dict:
+    global _base, _detener_traza
+    with _lock_traza:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        _detener_traza = False
+    with _lock_memoria:
+        _por_ruta.clear()
+    _base = tracemalloc.take_snapshot()
+    return memoria_estado()
+
+
+def memoria_detener() -> dict:
+    global _base, _detener_traza
+    _base = None
+    with _lock_traza:
+        if _perfiles_memoria:
+            _detener_traza = True
+        else:
+            tracemalloc.stop()
+    return memoria_estado()
+
+
+def _perfil_memoria_iniciar() -> None:
+    global _perfiles_memoria, _detener_traza
+    with _lock_traza:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(FRAMES_MEMORIA)
+            _detener_traza = True
+        _perfiles_memoria += 1
+
+
+def _perfil_memoria_terminar() -> None:
+    global _perfiles_memoria, _detener_traza
+    with _lock_traza:
+        _perfiles_memoria -= 1
+        if _perfiles_memoria == 0 and _detener_traza:
+            tracemalloc.stop()
+            _detener_traza = False
+
+
+def memoria_estado() -> dict:
+    actual, pico = tracemalloc.get_traced_memory()
+    return {
+        "pid": os.getpid(),
+        "activo": tracemalloc.is_tracing(),
+        "trazada_kb": round(actual / 1024, 1),
+        "pico_kb": round(pico / 1024, 1)
+    }
+
+
+def registrar_ruta(ruta: str, antes: int) -> None:
+    """Crecimiento neto de memoria trazada durante una petición (aproximado con peticiones concurrentes)"""
+    neto = tracemalloc.get_traced_memory()[0] - antes
+    with _lock_memoria:
+        datos = _por_ruta.setdefault(ruta, [0, 0, 0])
+        datos[0] += 1
+        datos[1] += neto
+        datos[2] = max(datos[2], neto)
+
+
+def _diferencias(antes: tracemalloc.Snapshot, despues: tracemalloc.Snapshot, agrupar: str, top: int) -> list:
+    filtros = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    estadisticas = despues.filter_traces(filtros).compare_to(antes.filter_traces(filtros), agrupar)
+    return [
+        {
+            "ubicacion": [f"{_archivo(f.filename)}:{f.lineno}" for f in e.traceback],
+            "diferencia_kb": round(e.size_diff / 1024, 1),
+            "total_kb": round(e.size / 1024, 1),
+            "bloques_diferencia": e.count_diff
+        }
+        for e in estadisticas[:top]
+    ]
+
+
+def memoria_informe(top: int = 25, agrupar: str = "lineno") -> dict:
+    informe = memoria_estado()
+    if not tracemalloc.is_tracing() or _base is None:
+        return informe
+    with _lock_memoria:
+        rutas = {
+            ruta: {"peticiones": n, "neto_promedio_kb": round(total / n / 1024, 2), "neto_max_kb": round(maximo / 1024, 2)}
+            for ruta, (n, total, maximo) in sorted(_por_ruta.items(), key=lambda r: -r[1][1])
+        }
+    informe["rutas"] = rutas
+    informe["diferencias"] = _diferencias(_base, tracemalloc.take_snapshot(), agrupar, top)
+    return informe
+
+
+# ====== ÓRDENES ENTRE WORKERS ======
+
+_detener = threading.Event()
+_procesadas: set = set()
+_hilo: Optional[threading.Thread] = None
+_inicio = time.time()
+
+
+def _ruta(nombre: str) -> str:
+    return os.path.join(DIRECTORIO, nombre)
+
+
+def _preparar_directorio() -> None:
+    """
+    Crear PERFIL_DIR solo para este usuario. En /tmp cualquiera puede crearlo
+    antes (o como enlace) y leer o plantar órdenes y resultados: se rechaza
+    si no es un directorio propio.
+    """
+    os.makedirs(DIRECTORIO, mode=0o700, exist_ok=True)
+    info = os.lstat(DIRECTORIO)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"PERFIL_DIR no es un directorio: {DIRECTORIO}")
+    if hasattr(os, "getuid"):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"PERFIL_DIR pertenece a otro usuario: {DIRECTORIO}")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(DIRECTORIO, 0o700)
+
+
+# Ni el temporal ni el destino pueden ser un enlace o un archivo puesto por otro
+_FLAGS_TEMPORAL = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+
+
+def _escribir(nombre: str, contenido: str) -> None:
+    """Escritura atómica: los demás procesos nunca leen un archivo a medias"""
+    temporal = _ruta(f".{nombre}.{os.getpid()}.{secrets.token_hex(4)}")
+    with os.fdopen(os.open(temporal, _FLAGS_TEMPORAL, 0o600), "w") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, _ruta(nombre))
+
+
+def ordenar(tipo: str, **parametros) -> dict:
+    """Publicar una orden para todos los workers (incluido este)"""
+    _preparar_directorio()
+    orden = {"id": uuid.uuid4().hex[:12], "tipo": tipo, "creada": time.time(), **parametros}
+    _escribir(f"orden-{orden['id']}.json", json.dumps(orden))
+    return orden
+
+
+def _ejecutar_orden(orden: dict) -> None:
+    try:
+        _atender(orden)
+    except Exception as e:
+        logger.warning("Orden de perfilado %s (%s) fallida: %s", orden["id"], orden["tipo"], e)
+
+
+def _atender(orden: dict) -> None:
+    tipo, id_ = orden["tipo"], orden["id"]
+    if tipo == "cpu":
+        pilas = muestrear(_detener, orden["intervalo"], hasta=orden["hasta"])
+        _escribir(f"resultado-{id_}-{os.getpid()}.txt", colapsado(pilas))
+        return
+    if tipo == "memoria_iniciar":
+        resultado = memoria_iniciar(orden["frames"])
+    elif tipo == "memoria_detener":
+        resultado = memoria_detener()
+    else:
+        resultado = memoria_informe(orden["top"], orden["agrupar"])
+    _escribir(f"resultado-{id_}-{os.getpid()}.json", json.dumps(resultado))
+
+
+def _revisar() -> None:
+    ahora = time.time()
+    for nombre in os.listdir(DIRECTORIO):
+        ruta = _ruta(nombre)
+        if nombre.startswith("."):
+            continue
+        if nombre.startswith("orden-") and nombre not in _procesadas:
+            _procesadas.add(nombre)
+            with open(ruta) as archivo:
+                orden = json.load(archivo)
+            # Las órdenes anteriores al arranque del worker no son para él
+            if orden["creada"] < _inicio - SONDEO_S:
+                continue
+            threading.Thread(target=_ejecutar_orden, args=(orden,), name="perfil-orden", daemon=True).start()
+        elif ahora - os.path.getmtime(ruta) > RETENCION_S:
+            os.remove(ruta)
+            _procesadas.discard(nombre)
+
+
+def _vigilar() -> None:
+    while not _detener.wait(SONDEO_S):
+        try:
+            _revisar()
+        except Exception as e:
+            logger.warning("No se pudieron revisar las órdenes de perfilado: %s", e)
+
+
+def recolectar(orden: dict, espera_s: float) -> Dict[str, str]:
+    """Esperar a los workers y devolver {pid: ruta del resultado}"""
+    time.sleep(max(espera_s, 0))
+    prefijo = f"resultado-{orden['id']}-"
+    return {
+        nombre[len(prefijo):].split(".")[0]: _ruta(nombre)
+        for nombre in os.listdir(DIRECTORIO) if nombre.startswith(prefijo)
+    }
+
+
+def cpu(segundos: float, intervalo: float = INTERVALO_S) -> Tuple[str, int]:
+    """Perfil de CPU de todos los workers. Devuelve (colapsado, workers)."""
+    orden = ordenar("cpu", hasta=time.time() + SONDEO_S + segundos, intervalo=intervalo)
+    resultados = recolectar(orden, orden["hasta"] - time.time() + SONDEO_S + 0.5)
+    pilas: Counter = Counter()
+    for ruta in resultados.values():
+        _leer_colapsado(ruta, pilas)
+    return colapsado(pilas), len(resultados)
+
+
+def memoria(tipo: str, **parametros) -> Dict[str, dict]:
+    """Orden de memoria a todos los workers. Devuelve {pid: resultado}."""
+    orden = ordenar(tipo, **parametros)
+    resultados = recolectar(orden, 2 * SONDEO_S + 0.5)
+    respuesta = {}
+    for pid, ruta in sorted(resultados.items()):
+        with open(ruta) as archivo:
+            respuesta[pid] = json.load(archivo)
+    return respuesta
+
+
+def iniciar() -> None:
+    """Arrancar el hilo que atiende las órdenes (en el lifespan)"""
+    global _hilo, _inicio
+    if not habilitado():
+        return
+    try:
+        _preparar_directorio()
+    except OSError as e:
+        logger.error("Perfilado entre workers desactivado: %s", e)
+        return
+    _detener.clear()
+    _inicio = time.time()
+    _procesadas.update(n for n in os.listdir(DIRECTORIO) if n.startswith("orden-"))
+    _hilo = threading.Thread(target=_vigilar, name="perfil-ordenes", daemon=True)
+    _hilo.start()
+
+
+def detener() -> None:
+    global _hilo
+    _detener.set()
+    if _hilo is not None:
+        _hilo.join(timeout=2)
+        _hilo = None
+
+
+# ====== PERFIL DE UNA PETICIÓN ======
+
+# Perfil de la petición en curso (el contexto se copia a los hilos del pool)
+_peticion: ContextVar[Optional["PerfilPeticion"]] = ContextVar("perfil_peticion", default=None)
+
+
+def registrar_hilo() -> None:
+    """Sumar el hilo actual a los que muestrea el perfil de la petición en curso"""
+    perfil = _peticion.get()
+    if perfil is not None:
+        perfil.hilos.add(threading.get_ident())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _hilo_de_la_consulta(conn, cursor, statement, parameters, context, executemany):
+    """Las rutas síncronas corren en un hilo del pool: se suma al ejecutar su primera consulta"""
+    registrar_hilo()
+
+
+class PerfilPeticion:
+    """Perfil de CPU y/o memoria mientras dura una petición"""
+
+    def __init__(self, modos: Iterable[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.modos = set(modos)
+        self.duracion_ms = 0.0
+        self.hilos: Set[int] = set()
+        self._detener = threading.Event()
+        self._pilas: Counter = Counter()
+        self._hilo: Optional[threading.Thread] = None
+        self._antes: Optional[tracemalloc.Snapshot] = None
+        self._inicio = 0.0
+
+    def _muestrear(self) -> None:
+        self._pilas = muestrear(self._detener, INTERVALO_PETICION_S, hilos=self.hilos)
+
+    @contextmanager
+    def seguir(self) -> Iterator[None]:
+        """Atender la petición dentro de este bloque: su hilo y los que consultan para ella se muestrean"""
+        token = _peticion.set(self)
+        registrar_hilo()
+        try:
+            yield
+        finally:
+            _peticion.reset(token)
+
+    def iniciar(self) -> None:
+        if "memoria" in self.modos:
+            _perfil_memoria_iniciar()
+            self._antes = tracemalloc.take_snapshot()
+        if "cpu" in self.modos:
+            self._hilo = threading.Thread(target=self._muestrear, name="perfil-peticion", daemon=True)
+            self._hilo.start()
+        self._inicio = time.perf_counter()
+
+    def terminar(self) -> None:
+        """Detener el muestreo y guardar los resultados (instantáneas y archivos: fuera del event loop)"""
+        self.duracion_ms = (time.perf_counter() - self._inicio) * 1000
+        _preparar_directorio()
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            _escribir(f"peticion-{self.id}.txt", colapsado(self._pilas))
+        if self._antes is not None:
+            try:
+                diferencias = _diferencias(self._antes, tracemalloc.take_snapshot(), "lineno", 25)
+            finally:
+                _perfil_memoria_terminar()
+            _escribir(f"peticion-{self.id}.json", json.dumps({"diferencias": diferencias}))
+
+
+def resultado_peticion(perfil_id: str, tipo: str) -> Optional[str]:
+    if not perfil_id.isalnum():
+        return None
+    ruta = _ruta(f"peticion-{perfil_id}.{'txt' if tipo == 'cpu' else 'json'}")
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta) as archivo:
+        return archivo.read()
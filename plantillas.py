@@ -0,0 +1,70 @@
+"""
+Renderizado en streaming de las vistas HTML con listas grandes.
+
+Las plantillas se renderizan con un entorno Jinja asíncrono (`generate_async`)
+y las filas llegan desde un cursor del lado del servidor (`yield_per`), así el
+navegador recibe el encabezado y las primeras filas mientras el resto de la
+tabla se sigue generando.
+"""
+import os
+from typing import AsyncIterator
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlmodel import Session
+
+TAMANO_LOTE = int(os.getenv("STREAM_TAMANO_LOTE", "200"))
+TAMANO_BLOQUE = int(os.getenv("STREAM_TAMANO_BLOQUE", "8192"))
+
+entorno_async = Environment(
+    loader=FileSystemLoader("templates"),
+    autoescape=select_autoescape(["html"]),
+    enable_async=True
+)
+
+
+async def filas_servidor(engine, statement, tamano_lote: int = TAMANO_LOTE) -> AsyncIterator:
+    """
+    Iterar el resultado de `statement` por lotes desde un cursor del servidor.
+
+    La sesión vive lo que dura el stream (no la de la dependencia, que se
+    cierra antes de enviar el cuerpo) y cada lote se trae en el threadpool.
+    """
+    session = Session(engine)
+    try:
+        resultado = await run_in_threadpool(
+            session.exec, statement.execution_options(yield_per=tamano_lote)
+        )
+        lotes = resultado.partitions()
+        while True:
+            lote = await run_in_threadpool(next, lotes, None)
+            if lote is None:
+                break
+            for fila in lote:
+                yield fila
+    finally:
+        await run_in_threadpool(session.close)
+
+
+async def _en_bloques(partes: AsyncIterator[str], tamano: int) -> AsyncIterator[str]:
+    """Agrupar los fragmentos de Jinja en bloques para no enviar miles de writes"""
+    buffer = []
+    acumulado = 0
+    async for parte in partes:
+        buffer.append(parte)
+        acumulado += len(parte)
+        if acumulado >= tamano:
+            yield "".join(buffer)
+            buffer, acumulado = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(nombre: str, contexto: dict, tamano_bloque: int = TAMANO_BLOQUE) -> StreamingResponse:
+    """Respuesta HTML que se envía a medida que la plantilla se renderiza"""
+    template = entorno_async.get_template(nombre)
+    return StreamingResponse(
+        _en_bloques(template.generate_async(contexto), tamano_bloque),
+        media_type="text/html; charset=utf-8"
+    )
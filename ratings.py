@@ -0,0 +1,260 @@
+"""
+Rating Elo de sigmotaa FC y de cada rival.
+
+Cada partido guarda una foto (`RatingPartido`) con los ratings de ambos
+equipos antes y después del partido y el resultado esperado. El rating
+actual de un equipo es su foto más reciente, así que un partido nuevo se
+calcula en O(1) a partir de dos consultas indexadas. Si se carga, modifica
+o elimina un partido anterior al último calculado, las fotos se rehacen
+solo desde esa fecha.
+
+Los partidos próximos (fecha futura) no tienen resultado todavía y no tienen
+foto: se calculan cuando llega su fecha (ver calendario.py).
+"""
+import os
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_
+from sqlmodel import Session, select
+
+from models import Partido, RatingPartido
+
+RATING_INICIAL = float(os.getenv("RATING_INICIAL", "1500"))
+K = float(os.getenv("RATING_K", "20"))
+# Puntos que suma la localía al rating del equipo local
+LOCALIA = float(os.getenv("RATING_LOCALIA", "65"))
+
+EQUIPO = "sigmotaa FC"
+
+
+# ====== FÓRMULAS ======
+
+def esperado(rating_sigmotaa: float, rating_rival: float, es_local: bool) -> float:
+    """Puntuación esperada de sigmotaa (victoria = 1, empate = 0.5)"""
+    diferencia = rating_sigmotaa - rating_rival + (LOCALIA if es_local else -LOCALIA)
+    return 1 / (1 + 10 ** (-diferencia / 400))
+
+
+def _multiplicador_goles(diferencia: int) -> float:
+    """Las goleadas mueven más el rating (fórmula del World Football Elo)"""
+    diferencia = abs(diferencia)
+    if diferencia <= 1:
+        return 1.0
+    if diferencia == 2:
+        return 1.5
+    return (11 + diferencia) / 8
+
+
+def calcular(partido: Partido, rating_sigmotaa: float, rating_rival: float) -> RatingPartido:
+    """Foto del partido a partir de los ratings previos de ambos equipos"""
+    esperado_sigmotaa = esperado(rating_sigmotaa, rating_rival, partido.es_local)
+    if partido.goles_sigmotaa > partido.goles_rival:
+        puntuacion = 1.0
+    elif partido.goles_sigmotaa < partido.goles_rival:
+        puntuacion = 0.0
+    else:
+        puntuacion = 0.5
+
+    multiplicador = _multiplicador_goles(partido.goles_sigmotaa - partido.goles_rival)
+    cambio = K * multiplicador * (puntuacion - esperado_sigmotaa)
+    return RatingPartido(
+        partido_id=partido.id,
+        fecha_partido=partido.fecha_partido,
+        rival=partido.rival,
+        rating_sigmotaa_antes=rating_sigmotaa,
+        rating_rival_antes=rating_rival,
+        esperado=esperado_sigmotaa,
+        rating_sigmotaa_despues=rating_sigmotaa + cambio,
+        rating_rival_despues=rating_rival - cambio
+    )
+
+
+# ====== CONSULTAS ======
+
+def _orden_desc():
+    return RatingPartido.fecha_partido.desc(), RatingPartido.partido_id.desc()
+
+
+def _anteriores(fecha: date, partido_id: int):
+    """Fotos estrictamente anteriores a (fecha, partido_id)"""
+    return or_(
+        RatingPartido.fecha_partido < fecha,
+        and_(RatingPartido.fecha_partido == fecha, RatingPartido.partido_id < partido_id)
+    )
+
+
+def _rating_sigmotaa(session: Session, *condiciones) -> float:
+    rating = session.exec(
+        select(RatingPartido.rating_sigmotaa_despues).where(*condiciones).order_by(*_orden_desc()).limit(1)
+    ).first()
+    return rating if rating is not None else RATING_INICIAL
+
+
+def _rating_rival(session: Session, rival: str, *condiciones) -> float:
+    rating = session.exec(
+        select(RatingPartido.rating_rival_despues)
+        .where(RatingPartido.rival == rival, *condiciones)
+        .order_by(*_orden_desc())
+        .limit(1)
+    ).first()
+    return rating if rating is not None else RATING_INICIAL
+
+
+def _ratings_rivales(session: Session, *condiciones) -> Dict[str, float]:
+    """Último rating de cada rival con una sola consulta"""
+    ultimas = (
+        select(RatingPartido.rival, func.max(RatingPartido.fecha_partido).label("fecha"))
+        .where(*condiciones)
+        .group_by(RatingPartido.rival)
+        .subquery()
+    )
+    filas = session.exec(
+        select(RatingPartido.rival, RatingPartido.partido_id, RatingPartido.rating_rival_despues)
+        .join(ultimas, and_(ultimas.c.rival == RatingPartido.rival, ultimas.c.fecha == RatingPartido.fecha_partido))
+        .where(*condiciones)
+    ).all()
+
+    # Dos partidos contra el mismo rival en la misma fecha: gana el de mayor id
+    ratings: Dict[str, Tuple[int, float]] = {}
+    for rival, partido_id, rating in filas:
+        if rival not in ratings or partido_id > ratings[rival][0]:
+            ratings[rival] = (partido_id, rating)
+    return {rival: rating for rival, (_, rating) in ratings.items()}
+
+
+# ====== ACTUALIZACIÓN ======
+
+def registrar_partido(session: Session, partido: Partido) -> Optional[RatingPartido]:
+    """
+    Calcular la foto de un partido recién guardado (necesita `partido.id`).
+    Si es el más reciente cuesta O(1); si es un partido atrasado se rehacen
+    las fotos desde su fecha. Un partido próximo no tiene foto. No hace commit.
+    """
+    if not partido.jugado():
+        return None
+
+    posterior = session.exec(
+        select(RatingPartido.partido_id)
+        .where(RatingPartido.fecha_partido > partido.fecha_partido)
+        .limit(1)
+    ).first()
+    if posterior is not None:
+        recalcular(session, desde=partido.fecha_partido)
+        return session.get(RatingPartido, partido.id)
+
+    foto = calcular(
+        partido,
+        _rating_sigmotaa(session, _anteriores(partido.fecha_partido, partido.id)),
+        _rating_rival(session, partido.rival, _anteriores(partido.fecha_partido, partido.id))
+    )
+    session.merge(foto)
+    return foto
+
+
+def pronostico(session: Session, partido: Partido) -> RatingPartido:
+    """Resultado esperado de un partido próximo con los ratings vigentes (no se guarda)"""
+    return calcular(partido, _rating_sigmotaa(session), _rating_rival(session, partido.rival))
+
+
+def recalcular(session: Session, desde: Optional[date] = None, hoy: Optional[date] = None) -> int:
+    """
+    Rehacer las fotos de los partidos jugados desde `desde` (todos si es
+    None), partiendo de los ratings vigentes justo antes de esa fecha. No
+    hace commit.
+    """
+    borrar = delete(RatingPartido)
+    partidos = (
+        select(Partido)
+        .where(Partido.fecha_partido <= (hoy or date.today()))
+        .order_by(Partido.fecha_partido, Partido.id)
+    )
+    if desde:
+        previas = RatingPartido.fecha_partido < desde
+        rating_sigmotaa = _rating_sigmotaa(session, previas)
+        rivales = _ratings_rivales(session, previas)
+        borrar = borrar.where(RatingPartido.fecha_partido >= desde)
+        partidos = partidos.where(Partido.fecha_partido >= desde)
+    else:
+        rating_sigmotaa, rivales = RATING_INICIAL, {}
+    session.exec(borrar)
+
+    fotos = []
+    for partido in session.exec(partidos):
+        foto = calcular(partido, rating_sigmotaa, rivales.get(partido.rival, RATING_INICIAL))
+        rating_sigmotaa = foto.rating_sigmotaa_despues
+        rivales[partido.rival] = foto.rating_rival_despues
+        fotos.append(foto)
+
+    session.add_all(fotos)
+    return len(fotos)
+
+
+def registrar_jugados(session: Session, hoy: Optional[date] = None) -> int:
+    """Fotos de los partidos que pasaron de próximos a jugados. No hace commit."""
+    hoy = hoy or date.today()
+    primera = session.exec(
+        select(func.min(Partido.fecha_partido))
+        .outerjoin(RatingPartido, RatingPartido.partido_id == Partido.id)
+        .where(RatingPartido.partido_id.is_(None), Partido.fecha_partido <= hoy)
+    ).one()
+    if primera is None:
+        return 0
+    return recalcular(session, desde=primera, hoy=hoy)
+
+
+def pendientes(session: Session) -> bool:
+    """Hay partidos jugados pero ninguna foto (base anterior a los ratings)"""
+    hay_fotos = session.exec(select(RatingPartido.partido_id).limit(1)).first() is not None
+    hay_partidos = session.exec(
+        select(Partido.id).where(Partido.fecha_partido <= date.today()).limit(1)
+    ).first() is not None
+    return hay_partidos and not hay_fotos
+
+
+# ====== LECTURA ======
+
+def actuales(session: Session) -> dict:
+    """Rating vigente de sigmotaa y de cada rival, de mayor a menor"""
+    equipos = [{"equipo": EQUIPO, "rating": round(_rating_sigmotaa(session), 1)}]
+    equipos.extend(
+        {"equipo": rival, "rating": round(rating, 1)}
+        for rival, rating in _ratings_rivales(session).items()
+    )
+    equipos.sort(key=lambda e: e["rating"], reverse=True)
+    return {
+        "rating_inicial": RATING_INICIAL,
+        "k": K,
+        "localia": LOCALIA,
+        "equipos": equipos
+    }
+
+
+def historial(
+        session: Session,
+        rival: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None
+) -> List[dict]:
+    """Fotos partido a partido en orden cronológico"""
+    statement = select(RatingPartido).order_by(RatingPartido.fecha_partido, RatingPartido.partido_id)
+    if rival:
+        statement = statement.where(RatingPartido.rival == rival)
+    if desde:
+        statement = statement.where(RatingPartido.fecha_partido >= desde)
+    if hasta:
+        statement = statement.where(RatingPartido.fecha_partido <= hasta)
+
+    return [
+        {
+            "partido_id": foto.partido_id,
+            "fecha_partido": foto.fecha_partido,
+            "rival": foto.rival,
+            "esperado": round(foto.esperado, 3),
+            "rating_sigmotaa_antes": round(foto.rating_sigmotaa_antes, 1),
+            "rating_sigmotaa_despues": round(foto.rating_sigmotaa_despues, 1),
+            "rating_rival_antes": round(foto.rating_rival_antes, 1),
+            "rating_rival_despues": round(foto.rating_rival_despues, 1)
+        }
+        for foto in session.exec(statement)
+    ]
@@ -0,0 +1,377 @@
+"""
+Reportes de temporada en paralelo.
+
+Un trabajo genera un HTML estático por jugador (la misma plantilla del
+historial) más un índice con el resumen del equipo, y los empaqueta en un
+zip. El plantel se reparte en lotes entre procesos de un
+`ProcessPoolExecutor`: cada proceso abre su propio engine de solo lectura,
+trae los datos de todo su lote con tres consultas y renderiza con un
+entorno Jinja síncrono. La temporada es el año calendario de los partidos.
+
+El estado de cada trabajo se guarda en un manifiesto JSON junto al zip en
+REPORTES_DIR, así cualquier worker del servidor responde la consulta de
+progreso o la descarga, no solo el que lanzó el trabajo.
+"""
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import contains_eager
+from sqlmodel import Session, select
+
+import agregados
+import database
+from models import Estadistica, Jugador, Partido
+
+REPORTES_DIR = Path(os.getenv("REPORTES_DIR", "./reportes"))
+PROCESOS = int(os.getenv("REPORTES_PROCESOS", str(os.cpu_count() or 1)))
+TAMANO_LOTE = int(os.getenv("REPORTES_LOTE", "25"))
+MAX_TRABAJOS = int(os.getenv("REPORTES_MAX_TRABAJOS", "20"))
+
+_PLANTILLAS = Path(__file__).resolve().parent / "templates"
+
+
+@dataclass
+class TrabajoReporte:
+    id: str
+    temporada: int
+    club: Optional[str]
+    estado: str = "pendiente"  # pendiente | en_curso | completado | error
+    jugadores: int = 0
+    completados: int = 0
+    creado: datetime = field(default_factory=datetime.utcnow)
+    terminado: Optional[datetime] = None
+    duracion_s: Optional[float] = None
+    archivo: Optional[str] = None
+    error: Optional[str] = None
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "temporada": self.temporada,
+            "club": self.club,
+            "estado": self.estado,
+            "jugadores": self.jugadores,
+            "completados": self.completados,
+            "creado": self.creado,
+            "terminado": self.terminado,
+            "duracion_s": self.duracion_s,
+            "error": self.error
+        }
+
+
+_ID_TRABAJO = re.compile(r"[0-9a-f]{12}")
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _ejecutor() -> ProcessPoolExecutor:
+    """Pool de procesos compartido (spawn: los hijos no heredan conexiones abiertas)"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESOS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_proceso
+            )
+        return _pool
+
+
+def cerrar() -> None:
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _rango(temporada: int):
+    return date(temporada, 1, 1), date(temporada, 12, 31)
+
+
+# ====== PROCESO HIJO ======
+
+# Estado propio de cada proceso del pool: se crea una vez y se reutiliza entre lotes
+_entorno_proceso: Optional[Environment] = None
+_engines_proceso: Dict[str, object] = {}
+
+
+def _entorno() -> Environment:
+    return Environment(loader=FileSystemLoader(str(_PLANTILLAS)), autoescape=select_autoescape(["html"]))
+
+
+def _inicializar_proceso() -> None:
+    """Importar y compilar la plantilla al arrancar el proceso, no en el primer lote"""
+    global _entorno_proceso
+    _entorno_proceso = _entorno()
+    _entorno_proceso.get_template("estadisticas/historial.html")
+
+
+def _engine_solo_lectura(url: str, opciones: dict):
+    """Engine propio del proceso; la base se abre en modo de solo lectura"""
+    clave = f"{url}|{sorted(opciones.items())}"
+    if clave not in _engines_proceso:
+        _engines_proceso[clave] = _crear_engine_solo_lectura(url, opciones)
+    return _engines_proceso[clave]
+
+
+def _crear_engine_solo_lectura(url: str, opciones: dict):
+    if url.startswith("sqlite:///"):
+        ruta = os.path.abspath(url[len("sqlite:///"):])
+        return create_engine(
+            f"sqlite:///file:{ruta}?mode=ro&uri=true",
+            connect_args={"check_same_thread": False},
+            execution_options=opciones
+        )
+    return create_engine(
+        url,
+        connect_args={"options": "-c default_transaction_read_only=on"},
+        execution_options=opciones,
+        pool_size=1
+    )
+
+
+def _totales_lote(session: Session, jugador_ids: List[int], desde: date, hasta: date) -> Dict[int, dict]:
+    """Totales de todos los jugadores del lote con un GROUP BY"""
+    filas = session.exec(
+        select(
+            Estadistica.jugador_id,
+            func.count(Estadistica.id),
+            func.sum(Estadistica.minutos_jugados),
+            func.sum(Estadistica.goles_anotados),
+            func.sum(Estadistica.asistencias),
+            func.sum(Estadistica.tarjetas_amarillas),
+            func.sum(Estadistica.tarjetas_rojas),
+            func.sum(Estadistica.intercepciones),
+            func.sum(Estadistica.balones_recuperados)
+        )
+        .join(Partido)
+        .where(
+            Estadistica.jugador_id.in_(jugador_ids),
+            Partido.fecha_partido >= desde,
+            Partido.fecha_partido <= hasta
+        )
+        .group_by(Estadistica.jugador_id)
+    ).all()
+
+    claves = (
+        "partidos_jugados", "minutos_totales", "goles_totales", "asistencias_totales",
+        "tarjetas_amarillas", "tarjetas_rojas", "intercepciones_totales", "balones_recuperados_totales"
+    )
+    vacio = dict.fromkeys(claves, 0)
+    totales = {jugador_id: dict(vacio) for jugador_id in jugador_ids}
+    for jugador_id, *valores in filas:
+        totales[jugador_id] = dict(zip(claves, valores))
+    return totales
+
+
+def generar_lote(
+        url: str,
+        opciones: dict,
+        temporada: int,
+        jugador_ids: List[int],
+        directorio: str
+) -> List[dict]:
+    """Renderizar los reportes de un lote de jugadores (se ejecuta en otro proceso)"""
+    desde, hasta = _rango(temporada)
+    plantilla = (_entorno_proceso or _entorno()).get_template("estadisticas/historial.html")
+    engine = _engine_solo_lectura(url, opciones)
+
+    with Session(engine) as session:
+        jugadores = session.exec(select(Jugador).where(Jugador.id.in_(jugador_ids))).all()
+        totales = _totales_lote(session, jugador_ids, desde, hasta)
+
+        # Partido por partido de todo el lote en una consulta
+        por_jugador = defaultdict(list)
+        estadisticas = session.exec(
+            select(Estadistica)
+            .join(Partido)
+            .options(contains_eager(Estadistica.partido))
+            .where(
+                Estadistica.jugador_id.in_(jugador_ids),
+                Partido.fecha_partido >= desde,
+                Partido.fecha_partido <= hasta
+            )
+            .order_by(Partido.fecha_partido.desc())
+        ).all()
+        for est in estadisticas:
+            por_jugador[est.jugador_id].append(est)
+
+        resultado = []
+        for jugador in jugadores:
+            html = plantilla.render(
+                jugador=jugador,
+                estadisticas=por_jugador[jugador.id],
+                totales=totales[jugador.id],
+                temporada=temporada
+            )
+            Path(directorio, f"jugador_{jugador.id}.html").write_text(html, encoding="utf-8")
+            resultado.append({
+                "id": jugador.id,
+                "nombre_completo": jugador.nombre_completo,
+                "numero_camiseta": jugador.numero_camiseta,
+                "posicion": jugador.posicion.value,
+                "totales": totales[jugador.id]
+            })
+        return resultado
+
+
+# ====== MANIFIESTOS ======
+
+def _manifiesto(trabajo_id: str) -> Path:
+    return REPORTES_DIR / f"trabajo_{trabajo_id}.json"
+
+
+def _guardar(trabajo: TrabajoReporte) -> None:
+    """Escribir el estado del trabajo (reemplazo atómico: nadie lee un JSON a medias)"""
+    REPORTES_DIR.mkdir(parents=True, exist_ok=True)
+    datos = {**trabajo.resumen(), "archivo": trabajo.archivo}
+    ruta = _manifiesto(trabajo.id)
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+    temporal.write_text(json.dumps(datos, default=lambda v: v.isoformat()), encoding="utf-8")
+    os.replace(temporal, ruta)
+
+
+def _cargar(ruta: Path) -> Optional[TrabajoReporte]:
+    try:
+        datos = json.loads(ruta.read_text(encoding="utf-8"))
+        datos["creado"] = datetime.fromisoformat(datos["creado"])
+        if datos["terminado"]:
+            datos["terminado"] = datetime.fromisoformat(datos["terminado"])
+        return TrabajoReporte(**datos)
+    except (OSError, ValueError, TypeError, KeyError):
+        # Borrado por otro worker entre el listado y la lectura, o ilegible
+        return None
+
+
+def _todos() -> List[TrabajoReporte]:
+    if not REPORTES_DIR.is_dir():
+        return []
+    trabajos = (_cargar(ruta) for ruta in REPORTES_DIR.glob("trabajo_*.json"))
+    return [t for t in trabajos if t is not None]
+
+
+# ====== TRABAJOS ======
+
+def _lotes(ids: List[int], tamano: int) -> List[List[int]]:
+    return [ids[i:i + tamano] for i in range(0, len(ids), tamano)]
+
+
+def _ejecutar(trabajo: TrabajoReporte) -> None:
+    inicio = time.perf_counter()
+    trabajo.estado = "en_curso"
+    _guardar(trabajo)
+    directorio = Path(tempfile.mkdtemp(prefix=f"reporte_{trabajo.id}_"))
+
+    try:
+        engine = database.engine_lectura_club(trabajo.club)
+        desde, hasta = _rango(trabajo.temporada)
+        with Session(engine) as session:
+            ids = list(session.exec(select(Jugador.id).order_by(Jugador.numero_camiseta)).all())
+            equipo = agregados.balance_partidos(
+                session, Partido.fecha_partido >= desde, Partido.fecha_partido <= hasta
+            )
+        trabajo.jugadores = len(ids)
+        _guardar(trabajo)
+
+        url = engine.url.render_as_string(hide_password=False)
+        opciones = dict(engine.get_execution_options())
+        futuros = [
+            _ejecutor().submit(generar_lote, url, opciones, trabajo.temporada, lote, str(directorio))
+            for lote in _lotes(ids, TAMANO_LOTE)
+        ]
+
+        plantel = []
+        for futuro in as_completed(futuros):
+            parcial = futuro.result()
+            plantel.extend(parcial)
+            trabajo.completados += len(parcial)
+            _guardar(trabajo)
+        plantel.sort(key=lambda j: j["numero_camiseta"])
+
+        indice = _entorno().get_template("reportes/temporada.html").render(
+            temporada=trabajo.temporada,
+            club=trabajo.club,
+            equipo=equipo,
+            plantel=plantel,
+            generado=datetime.utcnow()
+        )
+        (directorio / "index.html").write_text(indice, encoding="utf-8")
+
+        REPORTES_DIR.mkdir(parents=True, exist_ok=True)
+        archivo = REPORTES_DIR / f"temporada_{trabajo.temporada}_{trabajo.id}.zip"
+        with zipfile.ZipFile(archivo, "w", zipfile.ZIP_DEFLATED) as zip_:
+            for html in sorted(directorio.iterdir()):
+                zip_.write(html, html.name)
+
+        trabajo.archivo = str(archivo)
+        trabajo.estado = "completado"
+    except BrokenProcessPool as e:
+        # Un proceso murió (p. ej. sin memoria): el próximo trabajo usa un pool nuevo
+        cerrar()
+        trabajo.estado = "error"
+        trabajo.error = f"Proceso de reportes terminado abruptamente: {e}"
+    except Exception as e:
+        trabajo.estado = "error"
+        trabajo.error = str(e)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+        trabajo.terminado = datetime.utcnow()
+        trabajo.duracion_s = round(time.perf_counter() - inicio, 3)
+        _guardar(trabajo)
+
+
+def _descartar_viejos() -> None:
+    """Mantener como máximo MAX_TRABAJOS terminados (y sus zip), de todos los workers"""
+    terminados = sorted(
+        (t for t in _todos() if t.estado in ("completado", "error")),
+        key=lambda t: t.creado
+    )
+    for trabajo in terminados[:max(0, len(terminados) - MAX_TRABAJOS)]:
+        if trabajo.archivo:
+            Path(trabajo.archivo).unlink(missing_ok=True)
+        _manifiesto(trabajo.id).unlink(missing_ok=True)
+
+
+def iniciar(temporada: int, club: Optional[str] = None) -> TrabajoReporte:
+    """Registrar el trabajo y lanzarlo en segundo plano"""
+    trabajo = TrabajoReporte(id=uuid.uuid4().hex[:12], temporada=temporada, club=club)
+    with _lock:
+        _descartar_viejos()
+        _guardar(trabajo)
+    threading.Thread(target=_ejecutar, args=(trabajo,), name=f"reporte-{trabajo.id}", daemon=True).start()
+    return trabajo
+
+
+def obtener(trabajo_id: str, club: Optional[str] = None) -> Optional[TrabajoReporte]:
+    if not _ID_TRABAJO.fullmatch(trabajo_id):
+        return None
+    trabajo = _cargar(_manifiesto(trabajo_id))
+    if trabajo is None or trabajo.club != club:
+        return None
+    return trabajo
+
+
+def listar(club: Optional[str] = None) -> List[TrabajoReporte]:
+    return sorted(
+        (t for t in _todos() if t.club == club),
+        key=lambda t: t.creado,
+        reverse=True
+    )
@@ -0,0 +1,453 @@
+"""
+Respaldos en caliente de la base de datos.
+
+- SQLite: API de backup en línea (`sqlite3.Connection.backup`) copiando
+  `RESPALDO_PAGINAS_POR_PASO` páginas por paso y durmiendo entre pasos; el
+  bloqueo de lectura sobre el origen solo dura un paso, así las escrituras
+  de la aplicación esperan milisegundos y no todo el respaldo. Cada
+  escritura de otra conexión reinicia la copia desde la primera página; tras
+  `RESPALDO_MAX_REINICIOS` reinicios o `RESPALDO_MAX_S` segundos se abandona
+  y se copia con `VACUUM INTO`, una sola transacción de lectura que ninguna
+  escritura interrumpe.
+- PostgreSQL: exportación lógica equivalente a `pg_dump` con `COPY ... TO
+  STDOUT` por tabla, dentro de una transacción REPEATABLE READ (una sola
+  foto consistente de todas las tablas, sin bloquear a los escritores).
+
+Cada respaldo es un directorio en `RESPALDO_DIR` con un `manifiesto.json`
+(conteo de filas por tabla, sha256 de cada archivo, duración e impacto en la
+latencia de escritura del proceso). Solo se respalda la base principal: con
+DATABASE_URL_CLUB se rechaza el respaldo en lugar de dejar fuera a los clubes.
+Uso desde la línea de comandos:
+
+    python respaldos.py crear
+    python respaldos.py listar
+    python respaldos.py verificar [directorio] [--destino URL]
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import SQLModel
+
+import database
+import models  # noqa: F401  (registra las tablas en SQLModel.metadata)
+
+logger = logging.getLogger("sigmotaa.respaldos")
+
+RESPALDO_DIR = Path(os.getenv("RESPALDO_DIR", "./respaldos"))
+RESPALDO_RETENER = int(os.getenv("RESPALDO_RETENER", "7"))
+RESPALDO_INTERVALO_MIN = float(os.getenv("RESPALDO_INTERVALO_MIN", "0"))
+PAGINAS_POR_PASO = int(os.getenv("RESPALDO_PAGINAS_POR_PASO", "256"))
+PAUSA_ENTRE_PASOS = float(os.getenv("RESPALDO_PAUSA_MS", "10")) / 1000
+MAX_REINICIOS = int(os.getenv("RESPALDO_MAX_REINICIOS", "3"))
+MAX_SEGUNDOS_POR_PASOS = float(os.getenv("RESPALDO_MAX_S", "60"))
+# Ventana previa al respaldo con la que se compara la latencia de escritura
+VENTANA_LATENCIA = float(os.getenv("RESPALDO_VENTANA_LATENCIA_S", "300"))
+
+MANIFIESTO = "manifiesto.json"
+ARCHIVO_SQLITE = "sigmotaa_fc.db"
+ESQUEMA_POSTGRES = "esquema.sql"
+
+_en_curso = threading.Lock()
+
+
+class RespaldoError(Exception):
+    """El respaldo no se pudo crear o no pasó la verificación"""
+
+
+class _CopiaInterrumpida(Exception):
+    """La copia por pasos no termina: las escrituras la reinician una y otra vez"""
+
+
+def _sha256(ruta: Path) -> str:
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def _tablas() -> List[str]:
+    return [tabla.name for tabla in SQLModel.metadata.sorted_tables]
+
+
+# ====== SQLITE ======
+
+def _respaldar_sqlite(destino: Path) -> dict:
+    origen_ruta = database.engine.url.database
+    archivo = destino / ARCHIVO_SQLITE
+    pasos = 0
+    reinicios = 0
+    anteriores = None
+    inicio = time.monotonic()
+
+    def progreso(status, restantes, total):
+        nonlocal pasos, reinicios, anteriores
+        pasos += 1
+        # Cada paso copia al menos una página: si no quedan menos, una escritura reinició la copia
+        if anteriores is not None and restantes >= anteriores:
+            reinicios += 1
+        anteriores = restantes
+        if restantes and (reinicios > MAX_REINICIOS or time.monotonic() - inicio > MAX_SEGUNDOS_POR_PASOS):
+            # Una excepción en el callback cancela el backup
+            raise _CopiaInterrumpida()
+        # Ceder entre pasos: los escritores toman el lock mientras dormimos
+        if restantes and PAUSA_ENTRE_PASOS:
+            time.sleep(PAUSA_ENTRE_PASOS)
+
+    origen = sqlite3.connect(origen_ruta, timeout=30)
+    try:
+        metodo = "backup"
+        copia = sqlite3.connect(archivo)
+        try:
+            origen.backup(copia, pages=PAGINAS_POR_PASO, progress=progreso)
+        except _CopiaInterrumpida:
+            copia.close()
+            archivo.unlink()
+            logger.warning(
+                "Backup por pasos abandonado tras %d reinicios en %.1fs; se copia con VACUUM INTO",
+                reinicios, time.monotonic() - inicio
+            )
+            metodo = "vacuum_into"
+            origen.execute("VACUUM INTO ?", (str(archivo),))
+            copia = sqlite3.connect(archivo)
+        except Exception:
+            copia.close()
+            raise
+
+        try:
+            existentes = {fila[0] for fila in copia.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conteos = {
+                tabla: copia.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0]
+                for tabla in _tablas()
+                if tabla in existentes
+            }
+        finally:
+            copia.close()
+    finally:
+        origen.close()
+
+    return {
+        "motor": "sqlite",
+        "metodo": metodo,
+        "pasos": pasos,
+        "reinicios": reinicios,
+        "conteos": conteos,
+        "archivos": {ARCHIVO_SQLITE: _sha256(archivo)}
+    }
+
+
+def _verificar_sqlite(directorio: Path, manifiesto: dict) -> dict:
+    # Restaurar en un archivo temporal: el respaldo original no se toca
+    with tempfile.TemporaryDirectory() as tmp:
+        restaurado = Path(tmp) / ARCHIVO_SQLITE
+        shutil.copyfile(directorio / ARCHIVO_SQLITE, restaurado)
+
+        conexion = sqlite3.connect(restaurado)
+        try:
+            integridad = conexion.execute("PRAGMA integrity_check").fetchone()[0]
+            claves = conexion.execute("PRAGMA foreign_key_check").fetchall()
+            conteos = {
+                tabla: conexion.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0]
+                for tabla in manifiesto["conteos"]
+            }
+        finally:
+            conexion.close()
+
+    errores = []
+    if integridad != "ok":
+        errores.append(f"integrity_check: {integridad}")
+    if claves:
+        errores.append(f"foreign_key_check: {len(claves)} filas huérfanas")
+    return {"conteos": conteos, "errores": errores}
+
+
+# ====== POSTGRESQL ======
+
+def _ddl_postgres() -> str:
+    dialecto = database.engine.dialect
+    sentencias = []
+    for tabla in SQLModel.metadata.sorted_tables:
+        sentencias.append(str(CreateTable(tabla).compile(dialect=dialecto)).strip())
+        sentencias.extend(str(CreateIndex(indice).compile(dialect=dialecto)) for indice in tabla.indexes)
+    return ";\n\n".join(sentencias) + ";\n"
+
+
+def _respaldar_postgres(destino: Path) -> dict:
+    (destino / ESQUEMA_POSTGRES).write_text(_ddl_postgres(), encoding="utf-8")
+    existentes = set(inspect(database.engine).get_table_names())
+
+    conteos = {}
+    conexion = database.engine.connect().execution_options(isolation_level="REPEATABLE READ")
+    try:
+        with conexion.begin():
+            conexion.exec_driver_sql("SET TRANSACTION READ ONLY")
+            cursor = conexion.connection.driver_connection.cursor()
+            for tabla in _tablas():
+                if tabla not in existentes:
+                    continue
+                filas = 0
+                with open(destino / f"{tabla}.copy", "wb") as f:
+                    with cursor.copy(f'COPY "{tabla}" TO STDOUT') as copy:
+                        for bloque in copy:
+                            f.write(bloque)
+                            filas += bytes(bloque).count(b"\n")
+                conteos[tabla] = filas
+    finally:
+        conexion.close()
+
+    archivos = {ESQUEMA_POSTGRES: _sha256(destino / ESQUEMA_POSTGRES)}
+    archivos.update({f"{tabla}.copy": _sha256(destino / f"{tabla}.copy") for tabla in conteos})
+    return {"motor": "postgresql", "conteos": conteos, "archivos": archivos}
+
+
+def _verificar_postgres(directorio: Path, manifiesto: dict, destino_url: Optional[str]) -> dict:
+    # En formato texto de COPY cada fila es exactamente una línea
+    conteos = {}
+    for tabla in manifiesto["conteos"]:
+        with open(directorio / f"{tabla}.copy", "rb") as f:
+            conteos[tabla] = sum(1 for _ in f)
+
+    errores = []
+    if destino_url:
+        # Restauración completa en una base vacía y recuento desde allí
+        destino = create_engine(database._normalizar_url(destino_url))
+        try:
+            with destino.begin() as conn:
+                conn.exec_driver_sql((directorio / ESQUEMA_POSTGRES).read_text(encoding="utf-8"))
+                cursor = conn.connection.driver_connection.cursor()
+                for tabla in manifiesto["conteos"]:
+                    with open(directorio / f"{tabla}.copy", "rb") as f, \
+                            cursor.copy(f'COPY "{tabla}" FROM STDIN') as copy:
+                        for bloque in iter(lambda: f.read(1 << 20), b""):
+                            copy.write(bloque)
+            with destino.connect() as conn:
+                conteos = {
+                    tabla: conn.execute(text(f'SELECT COUNT(*) FROM "{tabla}"')).scalar_one()
+                    for tabla in manifiesto["conteos"]
+                }
+        except Exception as e:
+            errores.append(f"restauración: {e}")
+        finally:
+            destino.dispose()
+
+    return {"conteos": conteos, "errores": errores}
+
+
+# ====== CREAR / VERIFICAR / ROTAR ======
+
+def listar() -> List[dict]:
+    """Respaldos existentes, del más reciente al más antiguo"""
+    if not RESPALDO_DIR.exists():
+        return []
+    respaldos = []
+    for directorio in sorted(RESPALDO_DIR.iterdir(), reverse=True):
+        manifiesto = directorio / MANIFIESTO
+        if directorio.is_dir() and manifiesto.exists():
+            datos = json.loads(manifiesto.read_text(encoding="utf-8"))
+            datos["directorio"] = str(directorio)
+            respaldos.append(datos)
+    return respaldos
+
+
+def rotar(retener: int = RESPALDO_RETENER) -> List[str]:
+    """Borrar los respaldos más antiguos dejando los `retener` más recientes"""
+    borrados = []
+    for datos in listar()[retener:]:
+        shutil.rmtree(datos["directorio"], ignore_errors=True)
+        borrados.append(datos["directorio"])
+
+    # Restos de respaldos interrumpidos
+    if RESPALDO_DIR.exists():
+        for parcial in RESPALDO_DIR.glob("*.parcial"):
+            shutil.rmtree(parcial, ignore_errors=True)
+    return borrados
+
+
+def _sin_clubes() -> None:
+    """Un respaldo de la base principal no incluye las bases ni los schemas de los clubes"""
+    if database.DATABASE_URL_CLUB:
+        raise RespaldoError(
+            "Con DATABASE_URL_CLUB cada club tiene su propia base o schema y este respaldo"
+            " solo copiaría la principal; respaldar cada una con sqlite3 .backup o pg_dump"
+        )
+
+
+def crear_respaldo() -> dict:
+    """Crear un respaldo completo, escribir su manifiesto y aplicar la retención"""
+    _sin_clubes()
+    if not _en_curso.acquire(blocking=False):
+        raise RespaldoError("Ya hay un respaldo en curso")
+
+    try:
+        RESPALDO_DIR.mkdir(parents=True, exist_ok=True)
+        nombre = datetime.utcnow().strftime("%Y%m%dT%H%M%S_%f")
+        parcial = RESPALDO_DIR / f"{nombre}.parcial"
+        parcial.mkdir()
+
+        inicio = time.time()
+        try:
+            if database.engine.dialect.name == "sqlite":
+                manifiesto = _respaldar_sqlite(parcial)
+            else:
+                manifiesto = _respaldar_postgres(parcial)
+        except Exception:
+            shutil.rmtree(parcial, ignore_errors=True)
+            raise
+        fin = time.time()
+
+        # Solo ve las escrituras de este proceso (en la CLI no hay con qué comparar)
+        antes = database.medidor_escrituras.resumen(inicio - VENTANA_LATENCIA, inicio)
+        durante = database.medidor_escrituras.resumen(inicio, fin)
+        agregada = None
+        if antes["media_ms"] is not None and durante["media_ms"] is not None:
+            agregada = round(durante["media_ms"] - antes["media_ms"], 3)
+
+        manifiesto.update({
+            "nombre": nombre,
+            "creado": datetime.utcnow().isoformat(),
+            "duracion_s": round(fin - inicio, 3),
+            "latencia_escritura": {
+                "antes": antes,
+                "durante": durante,
+                "media_agregada_ms": agregada
+            }
+        })
+        (parcial / MANIFIESTO).write_text(json.dumps(manifiesto, indent=2), encoding="utf-8")
+
+        # El directorio solo toma su nombre final cuando el respaldo está completo
+        final = RESPALDO_DIR / nombre
+        parcial.rename(final)
+        manifiesto["directorio"] = str(final)
+        manifiesto["rotados"] = rotar()
+
+        logger.info(
+            "Respaldo %s creado en %.2fs (latencia de escritura agregada: %s ms)",
+            nombre, manifiesto["duracion_s"], agregada
+        )
+        return manifiesto
+    finally:
+        _en_curso.release()
+
+
+def verificar(directorio: Optional[str] = None, destino_url: Optional[str] = None) -> dict:
+    """
+    Restaurar el respaldo (el más reciente si no se indica) y comprobarlo:
+    sha256 de los archivos, integridad y conteo de filas contra el manifiesto.
+    """
+    if directorio is None:
+        respaldos = listar()
+        if not respaldos:
+            raise RespaldoError(f"No hay respaldos en {RESPALDO_DIR}")
+        directorio = respaldos[0]["directorio"]
+
+    ruta = Path(directorio)
+    manifiesto = json.loads((ruta / MANIFIESTO).read_text(encoding="utf-8"))
+
+    errores = [
+        f"sha256 distinto: {archivo}"
+        for archivo, esperado in manifiesto["archivos"].items()
+        if _sha256(ruta / archivo) != esperado
+    ]
+
+    if manifiesto["motor"] == "sqlite":
+        restauracion = _verificar_sqlite(ruta, manifiesto)
+    else:
+        restauracion = _verificar_postgres(ruta, manifiesto, destino_url)
+    errores.extend(restauracion["errores"])
+
+    for tabla, esperado in manifiesto["conteos"].items():
+        obtenido = restauracion["conteos"].get(tabla)
+        if obtenido != esperado:
+            errores.append(f"{tabla}: {obtenido} filas, el manifiesto dice {esperado}")
+
+    return {
+        "directorio": str(ruta),
+        "motor": manifiesto["motor"],
+        "conteos": restauracion["conteos"],
+        "valido": not errores,
+        "errores": errores
+    }
+
+
+# ====== PROGRAMACIÓN ======
+
+def _ultimo_respaldo_reciente(segundos: float) -> bool:
+    """Con varios workers, el primero que respalda evita que los demás repitan"""
+    respaldos = listar()
+    if not respaldos:
+        return False
+    creado = datetime.fromisoformat(respaldos[0]["creado"])
+    return (datetime.utcnow() - creado).total_seconds() < segundos * 0.9
+
+
+async def _respaldos_programados(intervalo_min: float) -> None:
+    segundos = intervalo_min * 60
+    while True:
+        await asyncio.sleep(segundos)
+        if _ultimo_respaldo_reciente(segundos):
+            continue
+        try:
+            await run_in_threadpool(crear_respaldo)
+        except RespaldoError as e:
+            logger.warning("Respaldo programado omitido: %s", e)
+        except Exception:
+            logger.exception("Falló el respaldo programado")
+
+
+def iniciar_programados(intervalo_min: float = RESPALDO_INTERVALO_MIN) -> Optional[asyncio.Task]:
+    """Lanzar los respaldos periódicos (desactivados si el intervalo es 0)"""
+    if intervalo_min <= 0:
+        return None
+    try:
+        _sin_clubes()
+    except RespaldoError as e:
+        logger.error("Respaldos programados desactivados: %s", e)
+        return None
+    return asyncio.create_task(_respaldos_programados(intervalo_min))
+
+
+# ====== LÍNEA DE COMANDOS ======
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("crear", "listar", "verificar"):
+        print("Uso: python respaldos.py crear | listar | verificar [directorio] [--destino URL]")
+        return 2
+
+    comando, resto = argv[0], argv[1:]
+    if comando == "crear":
+        resultado = crear_respaldo()
+    elif comando == "listar":
+        resultado = [
+            {k: r.get(k) for k in ("nombre", "motor", "creado", "duracion_s", "conteos", "directorio")}
+            for r in listar()
+        ]
+    else:
+        destino = None
+        if "--destino" in resto:
+            i = resto.index("--destino")
+            destino = resto[i + 1]
+            resto = resto[:i] + resto[i + 2:]
+        resultado = verificar(resto[0] if resto else None, destino)
+
+    print(json.dumps(resultado, indent=2, default=str))
+    return 0 if not isinstance(resultado, dict) or resultado.get("valido", True) else 1
+
+
+if __name__ == "__main__":
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
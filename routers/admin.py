@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Literal, Optional
+
+import perfilado
+import respaldos
+
+
+def requiere_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Sin ADMIN_TOKEN las rutas no existen; con él, exigen X-Admin-Token"""
+    if not perfilado.habilitado():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not perfilado.token_valido(x_admin_token):
+        raise HTTPException(status_code=401, detail="X-Admin-Token inválido")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(requiere_admin)],
+    include_in_schema=perfilado.habilitado()
+)
+
+
+# ====== CPU ======
+
+@router.post("/perfil/cpu", response_class=PlainTextResponse)
+async def perfil_cpu(
+        segundos: float = Query(10, gt=0, le=perfilado.SEGUNDOS_MAXIMO),
+        intervalo_ms: float = Query(perfilado.INTERVALO_S * 1000, ge=1, le=1000)
+):
+    """Muestrear todos los workers durante `segundos`; devuelve pilas en formato collapsed"""
+    try:
+        texto, workers = await run_in_threadpool(perfilado.cpu, segundos, intervalo_ms / 1000)
+        return PlainTextResponse(
+            texto,
+            headers={
+                "X-Perfil-Workers": str(workers),
+                "Content-Disposition": 'attachment; filename="perfil-cpu.collapsed"'
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al perfilar CPU: {str(e)}")
+
+
+@router.get("/perfil/peticiones/{perfil_id}")
+def perfil_peticion(perfil_id: str, tipo: Literal["cpu", "memoria"] = "cpu"):
+    """Perfil de una petición hecha con la cabecera X-Perfil (ver X-Perfil-Id)"""
+    contenido = perfilado.resultado_peticion(perfil_id, tipo)
+    if contenido is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    media_type = "text/plain" if tipo == "cpu" else "application/json"
+    return PlainTextResponse(contenido, media_type=media_type)
+
+
+# ====== MEMORIA ======
+
+@router.post("/memoria/iniciar")
+async def memoria_iniciar(frames: int = Query(perfilado.FRAMES_MEMORIA, ge=1, le=100)):
+    """Activar tracemalloc en todos los workers y tomar la instantánea base"""
+    return await run_in_threadpool(perfilado.memoria, "memoria_iniciar", frames=frames)
+
+
+@router.get("/memoria")
+async def memoria_informe(
+        top: int = Query(25, ge=1, le=500),
+        agrupar: Literal["lineno", "filename", "traceback"] = "lineno"
+):
+    """Diferencias contra la base y crecimiento neto por ruta, por worker"""
+    return await run_in_threadpool(perfilado.memoria, "memoria_informe", top=top, agrupar=agrupar)
+
+
+@router.post("/memoria/detener")
+async def memoria_detener():
+    """Desactivar tracemalloc en todos los workers"""
+    return await run_in_threadpool(perfilado.memoria, "memoria_detener")
+
+
+# ====== RESPALDOS ======
+
+@router.get("/respaldos")
+def listar_respaldos():
+    """Respaldos disponibles con su manifiesto (conteos, duración, latencia agregada)"""
+    return [
+        {clave: valor for clave, valor in datos.items() if clave != "directorio"}
+        for datos in respaldos.listar()
+    ]
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+
+import clubes
+import database
+
+router = APIRouter(prefix="/clubes", tags=["clubes"])
+
+
+# ====== API ENDPOINTS ======
+
+@router.get("/")
+def listar_clubes():
+    """Clubes configurados y engines abiertos en este worker"""
+    if database.engines_club is None:
+        raise HTTPException(status_code=404, detail="Multi-club no configurado (DATABASE_URL_CLUB)")
+    return {
+        "clubes": database.CLUBES,
+        "club_por_defecto": database.CLUB_POR_DEFECTO,
+        "engines": database.engines_club.resumen()
+    }
+
+
+@router.get("/resumen")
+def resumen_clubes(
+        clubes_filtro: Optional[str] = Query(None, alias="clubes", description="Lista separada por comas"),
+        top: int = Query(10, ge=1, le=100)
+):
+    """Resumen global: consulta cada club en paralelo y combina los resultados"""
+    if database.engines_club is None:
+        raise HTTPException(status_code=404, detail="Multi-club no configurado (DATABASE_URL_CLUB)")
+
+    try:
+        seleccion = database.CLUBES
+        if clubes_filtro:
+            seleccion = [database.validar_club(c) for c in clubes_filtro.split(",") if c.strip()]
+        if not seleccion:
+            raise HTTPException(status_code=400, detail="Indique 'clubes' o configure CLUBES")
+
+        return clubes.resumen_clubes(seleccion, top)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al consultar los clubes: {str(e)}")
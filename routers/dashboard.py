@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.templating import Jinja2Templates
+from sqlmodel import Session
+from typing import Optional
+
+import tablero
+from cache import cache
+from database import get_read_session
+
+router = APIRouter(tags=["dashboard"])
+templates = Jinja2Templates(directory="templates")
+
+
+# ====== API ENDPOINTS ======
+
+@router.get("/api/dashboard")
+def dashboard_json(
+        temporada: Optional[int] = Query(None, ge=1900, le=2100),
+        session: Session = Depends(get_read_session)
+):
+    """Indicadores de la temporada (desde la caché; X-Cache indica HIT o MISS)"""
+    try:
+        datos, acierto = tablero.obtener(session, temporada)
+        return JSONResponse(
+            jsonable_encoder({**datos, "cache": cache.resumen()}),
+            headers={"X-Cache": "HIT" if acierto else "MISS"}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el tablero: {str(e)}")
+
+
+# ====== HTML VIEWS ======
+
+@router.get("/dashboard", response_class=HTMLResponse)
+def dashboard_html(
+        request: Request,
+        temporada: Optional[int] = Query(None, ge=1900, le=2100),
+        session: Session = Depends(get_read_session)
+):
+    """Vista HTML: Tablero de la temporada"""
+    datos, acierto = tablero.obtener(session, temporada)
+    return templates.TemplateResponse(
+        "dashboard.html",
+        {"request": request, **datos},
+        headers={"X-Cache": "HIT" if acierto else "MISS"}
+    )
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager
 from sqlmodel import Session, select
-from typing import Optional
-
-from database import get_session
-from models import Estadistica, EstadisticaCreate, Jugador, Partido, Estado
+from typing import Optional, Tuple
+from datetime import date
+
+import agregados
+import cola_escritura
+import lectura
+import opciones
+from database import club_de_sesion, get_session, get_read_session
+from en_vivo import hub, diferencias_estadistica
+from models import Estadistica, EstadisticaCreate, Jugador, Partido, Position, ResultadoPartido
+from plantillas import filas_servidor, stream_template
 
 router = APIRouter(prefix="/estadisticas", tags=["estadisticas"])
 templates = Jinja2Templates(directory="templates")
@@ -13,6 +23,40 @@ templates = Jinja2Templates(directory="templates")
 
 # ====== API ENDPOINTS ======
 
+def _insertar_estadistica(session: Session, estadistica: EstadisticaCreate) -> Estadistica:
+    """Validar e insertar la estadística con sus agregados. No hace commit."""
+    # Validar que existan jugador y partido
+    jugador = session.get(Jugador, estadistica.jugador_id)
+    if not jugador:
+        raise HTTPException(status_code=404, detail="Jugador no encontrado")
+
+    partido = session.get(Partido, estadistica.partido_id)
+    if not partido:
+        raise HTTPException(status_code=404, detail="Partido no encontrado")
+
+    # Verificar que no exista ya una estadística para este jugador en este partido
+    existing = session.exec(
+        select(Estadistica).where(
+            Estadistica.jugador_id == estadistica.jugador_id,
+            Estadistica.partido_id == estadistica.partido_id
+        )
+    ).first()
+
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail="Ya existe una estadística para este jugador en este partido"
+        )
+
+    db_estadistica = Estadistica.model_validate(estadistica)
+    session.add(db_estadistica)
+
+    # Totales del partido y disciplina del jugador en la misma transacción
+    agregados.aplicar_estadistica(session, db_estadistica, partido.fecha_partido)
+    session.flush()
+    return db_estadistica
+
+
 @router.post("/", response_model=Estadistica)
 def create_estadistica(
         estadistica: EstadisticaCreate,
@@ -20,38 +64,15 @@ def create_estadistica(
 ):
     """Crear una nueva estadística"""
     try:
-        # Validar que existan jugador y partido
-        jugador = session.get(Jugador, estadistica.jugador_id)
-        if not jugador:
-            raise HTTPException(status_code=404, detail="Jugador no encontrado")
-
-        partido = session.get(Partido, estadistica.partido_id)
-        if not partido:
-            raise HTTPException(status_code=404, detail="Partido no encontrado")
-
-        # Verificar que no exista ya una estadística para este jugador en este partido
-        existing = session.exec(
-            select(Estadistica).where(
-                Estadistica.jugador_id == estadistica.jugador_id,
-                Estadistica.partido_id == estadistica.partido_id
-            )
-        ).first()
-
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail="Ya existe una estadística para este jugador en este partido"
-            )
-
-        # Actualizar estado del jugador si recibe tarjetas
-        if estadistica.tarjetas_rojas > 0 or estadistica.tarjetas_amarillas >= 2:
-            jugador.estado = Estado.SUSPENDIDO
-            session.add(jugador)
-
-        db_estadistica = Estadistica.model_validate(estadistica)
-        session.add(db_estadistica)
-        session.commit()
-        session.refresh(db_estadistica)
+        # Con SQLite se agrupa con otras altas concurrentes en un solo commit
+        db_estadistica = cola_escritura.ejecutar(session, lambda s: _insertar_estadistica(s, estadistica))
+
+        hub.publicar(
+            db_estadistica.partido_id,
+            "estadistica",
+            diferencias_estadistica(db_estadistica),
+            club=club_de_sesion(session)
+        )
         return db_estadistica
 
     except HTTPException:
@@ -61,14 +82,35 @@ def create_estadistica(
         raise HTTPException(status_code=500, detail=f"Error al crear estadística: {str(e)}")
 
 
+def _rango_fechas(
+        desde: Optional[date],
+        hasta: Optional[date],
+        temporada: Optional[int]
+) -> Tuple[Optional[date], Optional[date]]:
+    """La temporada (año calendario) se combina con desde/hasta"""
+    if temporada:
+        desde = max(desde, date(temporada, 1, 1)) if desde else date(temporada, 1, 1)
+        hasta = min(hasta, date(temporada, 12, 31)) if hasta else date(temporada, 12, 31)
+    return desde, hasta
+
+
 @router.get("/", response_model=list[Estadistica])
 def read_estadisticas(
         jugador_id: Optional[int] = None,
         partido_id: Optional[int] = None,
-        session: Session = Depends(get_session)
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        temporada: Optional[int] = Query(None, ge=1900, le=2100),
+        posicion: Optional[Position] = None,
+        resultado: Optional[ResultadoPartido] = None,
+        session: Session = Depends(get_read_session)
 ):
-    """Obtener lista de estadísticas con filtros opcionales"""
+    """Obtener lista de estadísticas con filtros opcionales (fechas, temporada, posición, resultado)"""
     try:
+        desde, hasta = _rango_fechas(desde, hasta, temporada)
+        if lectura.activa("estadisticas"):
+            return lectura.estadisticas(session, jugador_id, partido_id, desde, hasta, posicion, resultado)
+
         statement = select(Estadistica)
 
         if jugador_id:
@@ -76,6 +118,18 @@ def read_estadisticas(
         if partido_id:
             statement = statement.where(Estadistica.partido_id == partido_id)
 
+        # Un solo JOIN por tabla y solo si hay filtros sobre ella
+        if desde or hasta or resultado:
+            statement = statement.join(Partido, Partido.id == Estadistica.partido_id)
+            if desde:
+                statement = statement.where(Partido.fecha_partido >= desde)
+            if hasta:
+                statement = statement.where(Partido.fecha_partido <= hasta)
+            if resultado:
+                statement = statement.where(Partido.resultado == resultado)
+        if posicion:
+            statement = statement.join(Jugador, Jugador.id == Estadistica.jugador_id).where(Jugador.posicion == posicion)
+
         estadisticas = session.exec(statement).all()
         return estadisticas
     except Exception as e:
@@ -83,8 +137,11 @@ def read_estadisticas(
 
 
 @router.get("/{estadistica_id}", response_model=Estadistica)
-def read_estadistica(estadistica_id: int, session: Session = Depends(get_session)):
+def read_estadistica(estadistica_id: int, session: Session = Depends(get_read_session)):
     """Obtener una estadística por ID"""
+    if lectura.activa("estadistica"):
+        return lectura.estadistica(session, estadistica_id)
+
     estadistica = session.get(Estadistica, estadistica_id)
     if not estadistica:
         raise HTTPException(status_code=404, detail="Estadística no encontrada")
@@ -99,8 +156,14 @@ def delete_estadistica(estadistica_id: int, session: Session = Depends(get_sessi
         if not estadistica:
             raise HTTPException(status_code=404, detail="Estadística no encontrada")
 
+        partido_id = estadistica.partido_id
+        agregados.aplicar_estadistica(
+            session, estadistica, estadistica.partido.fecha_partido, signo=-1
+        )
         session.delete(estadistica)
         session.commit()
+
+        hub.publicar(partido_id, "estadistica_eliminada", {"id": estadistica_id}, club=club_de_sesion(session))
         return {"message": "Estadística eliminada correctamente"}
 
     except Exception as e:
@@ -110,28 +173,29 @@ def delete_estadistica(estadistica_id: int, session: Session = Depends(get_sessi
 
 # ====== HTML VIEWS ======
 
+def _contexto_formulario(request: Request, session: Session, partido_id: Optional[int]) -> dict:
+    """Plantel activo y ventana de partidos desde la caché (ver opciones.py)"""
+    datos, _ = opciones.formulario(session)
+    return {
+        "request": request,
+        "jugadores": datos["jugadores"],
+        "proximos": datos["proximos"],
+        "recientes": datos["recientes"],
+        "partido_extra": opciones.partido_fuera_de_ventana(session, datos, partido_id),
+        "partido_id": partido_id
+    }
+
+
 @router.get("/html/crear", response_class=HTMLResponse)
 def crear_estadistica_form(
         request: Request,
         partido_id: Optional[int] = None,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
     """Vista HTML: Formulario de creación"""
-    jugadores = session.exec(select(Jugador).where(Jugador.estado == Estado.ACTIVO)).all()
-    partidos = session.exec(select(Partido)).all()
-
-    partido_seleccionado = None
-    if partido_id:
-        partido_seleccionado = session.get(Partido, partido_id)
-
     return templates.TemplateResponse(
         "estadisticas/crear.html",
-        {
-            "request": request,
-            "jugadores": jugadores,
-            "partidos": partidos,
-            "partido_seleccionado": partido_seleccionado
-        }
+        _contexto_formulario(request, session, partido_id)
     )
 
 
@@ -165,59 +229,65 @@ async def crear_estadistica_submit(
             faltas_cometidas=faltas_cometidas
         )
 
-        create_estadistica(estadistica_data, session)
+        await run_in_threadpool(create_estadistica, estadistica_data, session)
         return RedirectResponse(
             url=f"/partidos/html/detalle/{partido_id}",
             status_code=303
         )
 
     except HTTPException as e:
-        jugadores = session.exec(select(Jugador).where(Jugador.estado == Estado.ACTIVO)).all()
-        partidos = session.exec(select(Partido)).all()
-
         return templates.TemplateResponse(
             "estadisticas/crear.html",
-            {
-                "request": request,
-                "jugadores": jugadores,
-                "partidos": partidos,
-                "error": e.detail
-            }
+            {**_contexto_formulario(request, session, partido_id), "error": e.detail}
         )
 
 
+def _totales_jugador(session: Session, jugador_id: int) -> dict:
+    """Totales del jugador con una sola consulta agregada"""
+    fila = session.exec(
+        select(
+            func.count(Estadistica.id),
+            func.coalesce(func.sum(Estadistica.minutos_jugados), 0),
+            func.coalesce(func.sum(Estadistica.goles_anotados), 0),
+            func.coalesce(func.sum(Estadistica.asistencias), 0),
+            func.coalesce(func.sum(Estadistica.tarjetas_amarillas), 0),
+            func.coalesce(func.sum(Estadistica.tarjetas_rojas), 0),
+            func.coalesce(func.sum(Estadistica.intercepciones), 0),
+            func.coalesce(func.sum(Estadistica.balones_recuperados), 0)
+        ).where(Estadistica.jugador_id == jugador_id)
+    ).one()
+
+    claves = (
+        "partidos_jugados", "minutos_totales", "goles_totales", "asistencias_totales",
+        "tarjetas_amarillas", "tarjetas_rojas", "intercepciones_totales", "balones_recuperados_totales"
+    )
+    return dict(zip(claves, fila))
+
+
 @router.get("/html/jugador/{jugador_id}", response_class=HTMLResponse)
-def historial_jugador_html(
+async def historial_jugador_html(
         request: Request,
         jugador_id: int,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
-    """Vista HTML: Historial de estadísticas de un jugador"""
-    jugador = session.get(Jugador, jugador_id)
+    """Vista HTML: Historial de estadísticas de un jugador (renderizada en streaming)"""
+    jugador = await run_in_threadpool(session.get, Jugador, jugador_id)
     if not jugador:
         raise HTTPException(status_code=404, detail="Jugador no encontrado")
 
-    # Obtener estadísticas ordenadas por fecha de partido
-    estadisticas = session.exec(
+    totales = await run_in_threadpool(_totales_jugador, session, jugador_id)
+
+    # Estadísticas ordenadas por fecha de partido, leídas por lotes
+    estadisticas = filas_servidor(
+        session.get_bind(),
         select(Estadistica)
         .where(Estadistica.jugador_id == jugador_id)
         .join(Partido)
+        .options(contains_eager(Estadistica.partido))
         .order_by(Partido.fecha_partido.desc())
-    ).all()
-
-    # Calcular totales
-    totales = {
-        "partidos_jugados": len(estadisticas),
-        "minutos_totales": sum(e.minutos_jugados for e in estadisticas),
-        "goles_totales": sum(e.goles_anotados for e in estadisticas),
-        "asistencias_totales": sum(e.asistencias for e in estadisticas),
-        "tarjetas_amarillas": sum(e.tarjetas_amarillas for e in estadisticas),
-        "tarjetas_rojas": sum(e.tarjetas_rojas for e in estadisticas),
-        "intercepciones_totales": sum(e.intercepciones for e in estadisticas),
-        "balones_recuperados_totales": sum(e.balones_recuperados for e in estadisticas)
-    }
+    )
 
-    return templates.TemplateResponse(
+    return stream_template(
         "estadisticas/historial.html",
         {
             "request": request,
@@ -225,4 +295,4 @@ def historial_jugador_html(
             "estadisticas": estadisticas,
             "totales": totales
         }
-    )
\ No newline at end of file
+    )
@@ -1,42 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select
 from typing import Optional
 from datetime import date, datetime
 
-from database import get_session
+import agregados
+import cola_escritura
+import disciplina
+import lectura
+import opciones
+import similitud
+from database import get_session, get_read_session
 from models import (
-    Jugador, JugadorCreate, JugadorUpdate,
+    Jugador, JugadorCreate, JugadorUpdate, DisciplinaJugador,
     Position, Estado, PieDominante
 )
+from plantillas import filas_servidor, stream_template
 
 router = APIRouter(prefix="/jugadores", tags=["jugadores"])
 templates = Jinja2Templates(directory="templates")
 
+# Jugadores por comparación (GET /jugadores/comparar)
+COMPARAR_MINIMO, COMPARAR_MAXIMO = 2, 6
+
 
 # ====== API ENDPOINTS ======
 
+def _insertar_jugador(session: Session, jugador: JugadorCreate) -> Jugador:
+    """Validar e insertar el jugador. No hace commit."""
+    # Verificar número de camiseta único
+    existing = session.exec(
+        select(Jugador).where(Jugador.numero_camiseta == jugador.numero_camiseta)
+    ).first()
+
+    if existing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El número de camiseta {jugador.numero_camiseta} ya está en uso"
+        )
+
+    db_jugador = Jugador.model_validate(jugador)
+    session.add(db_jugador)
+    session.flush()
+    return db_jugador
+
+
 @router.post("/", response_model=Jugador)
 def create_jugador(jugador: JugadorCreate, session: Session = Depends(get_session)):
     """Crear un nuevo jugador"""
     try:
-        # Verificar número de camiseta único
-        existing = session.exec(
-            select(Jugador).where(Jugador.numero_camiseta == jugador.numero_camiseta)
-        ).first()
-
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"El número de camiseta {jugador.numero_camiseta} ya está en uso"
-            )
-
-        db_jugador = Jugador.model_validate(jugador)
-        session.add(db_jugador)
-        session.commit()
-        session.refresh(db_jugador)
-        return db_jugador
+        # Con SQLite se agrupa con otras altas concurrentes en un solo commit
+        return cola_escritura.ejecutar(session, lambda s: _insertar_jugador(s, jugador))
 
     except HTTPException:
         raise
@@ -48,10 +64,13 @@ def create_jugador(jugador: JugadorCreate, session: Session = Depends(get_sessio
 @router.get("/", response_model=list[Jugador])
 def read_jugadores(
         estado: Optional[Estado] = None,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
     """Obtener lista de todos los jugadores"""
     try:
+        if lectura.activa("jugadores"):
+            return lectura.jugadores(session, estado)
+
         statement = select(Jugador)
         if estado:
             statement = statement.where(Jugador.estado == estado)
@@ -61,9 +80,96 @@ def read_jugadores(
         raise HTTPException(status_code=500, detail=f"Error al obtener jugadores: {str(e)}")
 
 
+@router.get("/opciones")
+def opciones_jugadores(
+        q: Optional[str] = Query(None, max_length=100),
+        estado: Optional[Estado] = None,
+        offset: int = Query(0, ge=0),
+        limite: int = Query(opciones.PAGINA, ge=1, le=opciones.PAGINA_MAXIMA),
+        session: Session = Depends(get_read_session)
+):
+    """Búsqueda paginada de jugadores por nombre o número para los formularios"""
+    try:
+        return opciones.buscar_jugadores(session, q, estado, offset, limite)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar jugadores: {str(e)}")
+
+
+@router.get("/comparar")
+def comparar_jugadores(
+        ids: str = Query(..., description="Entre 2 y 6 ids separados por coma"),
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        session: Session = Depends(get_read_session)
+):
+    """Totales, tasas cada 90' y partidos compartidos de 2 a 6 jugadores, lado a lado"""
+    try:
+        try:
+            lista = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids debe ser una lista de enteros separados por coma")
+        if not COMPARAR_MINIMO <= len(lista) <= COMPARAR_MAXIMO:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Se comparan entre {COMPARAR_MINIMO} y {COMPARAR_MAXIMO} jugadores distintos"
+            )
+
+        resultado = agregados.comparar_jugadores(session, lista, desde, hasta)
+        if resultado is None:
+            raise HTTPException(status_code=404, detail="Jugador no encontrado")
+        return resultado
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al comparar jugadores: {str(e)}")
+
+
+@router.post("/disciplina/recalcular")
+def recalcular_disciplina(session: Session = Depends(get_session)):
+    """Reconstruir tarjetas acumuladas y suspensiones de todos los jugadores"""
+    try:
+        resultado = disciplina.recalcular(session)
+        session.commit()
+        return resultado
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al recalcular disciplina: {str(e)}")
+
+
+@router.get("/{jugador_id}/disciplina")
+def read_disciplina_jugador(jugador_id: int, session: Session = Depends(get_read_session)):
+    """Tarjetas acumuladas y sanciones pendientes de un jugador"""
+    jugador = session.get(Jugador, jugador_id)
+    if not jugador:
+        raise HTTPException(status_code=404, detail="Jugador no encontrado")
+    return disciplina.resumen(session.get(DisciplinaJugador, jugador_id), jugador_id)
+
+
+@router.get("/{jugador_id}/similares")
+def read_similares(
+        jugador_id: int,
+        k: int = Query(10, ge=1, le=similitud.K_MAXIMO),
+        estado: Optional[Estado] = None,
+        session: Session = Depends(get_read_session)
+):
+    """Los k jugadores más parecidos por físico, edad, posición, pie y producción cada 90'"""
+    try:
+        resultado = similitud.similares(session, jugador_id, k, estado)
+        if resultado is None:
+            raise HTTPException(status_code=404, detail="Jugador no encontrado")
+        return resultado
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar jugadores similares: {str(e)}")
+
+
 @router.get("/{jugador_id}", response_model=Jugador)
-def read_jugador(jugador_id: int, session: Session = Depends(get_session)):
+def read_jugador(jugador_id: int, session: Session = Depends(get_read_session)):
     """Obtener un jugador por ID"""
+    if lectura.activa("jugador"):
+        return lectura.jugador(session, jugador_id)
+
     jugador = session.get(Jugador, jugador_id)
     if not jugador:
         raise HTTPException(status_code=404, detail="Jugador no encontrado")
@@ -98,6 +204,8 @@ def update_jugador(
 
         # Actualizar campos
         jugador_data = jugador_update.model_dump(exclude_unset=True)
+        if jugador_data.get("estado") not in (None, db_jugador.estado):
+            disciplina.marcar_estado_manual(session, jugador_id)
         for key, value in jugador_data.items():
             setattr(db_jugador, key, value)
 
@@ -135,12 +243,16 @@ def delete_jugador(jugador_id: int, session: Session = Depends(get_session)):
 # ====== HTML VIEWS ======
 
 @router.get("/html/lista", response_class=HTMLResponse)
-def lista_jugadores_html(request: Request, session: Session = Depends(get_session)):
-    """Vista HTML: Lista de jugadores"""
-    jugadores = session.exec(select(Jugador)).all()
-    return templates.TemplateResponse(
+async def lista_jugadores_html(request: Request, session: Session = Depends(get_read_session)):
+    """Vista HTML: Lista de jugadores (renderizada en streaming)"""
+    conteo = await run_in_threadpool(agregados.conteo_jugadores, session)
+    jugadores = filas_servidor(
+        session.get_bind(),
+        select(Jugador).order_by(Jugador.numero_camiseta)
+    )
+    return stream_template(
         "jugadores/lista.html",
-        {"request": request, "jugadores": jugadores}
+        {"request": request, "jugadores": jugadores, "conteo": conteo}
     )
 
 
@@ -148,7 +260,7 @@ def lista_jugadores_html(request: Request, session: Session = Depends(get_sessio
 def detalle_jugador_html(
         request: Request,
         jugador_id: int,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
     """Vista HTML: Detalle de jugador con estadísticas"""
     jugador = session.get(Jugador, jugador_id)
@@ -209,7 +321,7 @@ async def crear_jugador_submit(
             fotografia_url=fotografia_url if fotografia_url else None
         )
 
-        create_jugador(jugador_data, session)
+        await run_in_threadpool(create_jugador, jugador_data, session)
         return RedirectResponse(url="/jugadores/html/lista", status_code=303)
 
     except HTTPException as e:
@@ -229,7 +341,7 @@ async def crear_jugador_submit(
 def editar_jugador_form(
         request: Request,
         jugador_id: int,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
     """Vista HTML: Formulario de edición"""
     jugador = session.get(Jugador, jugador_id)
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import delete, func
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 
-from database import get_session
-from models import Partido, PartidoCreate, ResultadoPartido
+import agregados
+import cola_escritura
+import disciplina
+import eventos
+import lectura
+import opciones
+import ratings
+from cache import cache
+from database import club_de_sesion, get_session, get_read_session
+from en_vivo import hub, diferencias_estadistica
+from models import (
+    Estadistica, EventoCreate, EventoPartido, Jugador, Partido, PartidoCreate, PartidoUpdate,
+    RatingPartido, ResultadoPartido, TipoEvento
+)
+from plantillas import filas_servidor, stream_template
 
 router = APIRouter(prefix="/partidos", tags=["partidos"])
 templates = Jinja2Templates(directory="templates")
@@ -14,50 +30,323 @@ templates = Jinja2Templates(directory="templates")
 
 # ====== API ENDPOINTS ======
 
+def _insertar_partido(session: Session, partido: PartidoCreate) -> Partido:
+    """Insertar el partido con su disciplina y rating. No hace commit."""
+    db_partido = Partido(**partido.model_dump())
+
+    # Calcular resultado automáticamente
+    db_partido.resultado = db_partido.calcular_resultado()
+
+    session.add(db_partido)
+    session.flush()
+
+    # Los jugadores sancionados cumplen una fecha
+    disciplina.registrar_partido(session, db_partido)
+    # Rating Elo: O(1) si es el partido más reciente
+    ratings.registrar_partido(session, db_partido)
+    return db_partido
+
+
 @router.post("/", response_model=Partido)
 def create_partido(partido: PartidoCreate, session: Session = Depends(get_session)):
     """Crear un nuevo partido"""
     try:
-        db_partido = Partido.model_validate(partido)
+        # Con SQLite se agrupa con otras altas concurrentes en un solo commit
+        return cola_escritura.ejecutar(session, lambda s: _insertar_partido(s, partido))
 
-        # Calcular resultado automáticamente
-        db_partido.resultado = db_partido.calcular_resultado()
+    except HTTPException:
+        raise
 
-        session.add(db_partido)
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al crear partido: {str(e)}")
+
+
+def _eliminar_partidos(session: Session, condicion) -> dict:
+    """
+    Borrar partidos y sus estadísticas con sentencias set-based.
+
+    Las estadísticas y eventos se borran explícitamente (además del ON DELETE CASCADE)
+    para que funcione también en bases creadas antes de declarar la cascada.
+    No hace commit: el llamador controla la transacción.
+    """
+    ids_partidos = select(Partido.id).where(condicion)
+    primera_fecha = session.exec(select(func.min(Partido.fecha_partido)).where(condicion)).one()
+
+    jugadores_afectados = session.exec(
+        select(Estadistica.jugador_id)
+        .where(Estadistica.partido_id.in_(ids_partidos))
+        .distinct()
+    ).all()
+
+    estadisticas_eliminadas = session.exec(
+        delete(Estadistica)
+        .where(Estadistica.partido_id.in_(ids_partidos))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    eventos_eliminados = session.exec(
+        delete(EventoPartido)
+        .where(EventoPartido.partido_id.in_(ids_partidos))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    partidos_eliminados = session.exec(
+        delete(Partido)
+        .where(condicion)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Reconstruir la disciplina de los jugadores que perdieron estadísticas
+    if jugadores_afectados:
+        disciplina.recalcular(session, jugadores_afectados)
+
+    # Rehacer los ratings desde el primer partido eliminado
+    if primera_fecha is not None:
+        ratings.recalcular(session, desde=primera_fecha)
+
+    return {
+        "partidos_eliminados": partidos_eliminados,
+        "estadisticas_eliminadas": estadisticas_eliminadas,
+        "eventos_eliminados": eventos_eliminados,
+        "jugadores_afectados": list(jugadores_afectados)
+    }
+
+
+@router.delete("/")
+def delete_partidos_rango(
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        session: Session = Depends(get_session)
+):
+    """Eliminar en bloque los partidos de un rango de fechas junto con sus estadísticas"""
+    if desde is None and hasta is None:
+        raise HTTPException(status_code=400, detail="Debe indicar 'desde' y/o 'hasta'")
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="'desde' no puede ser posterior a 'hasta'")
+
+    condiciones = []
+    if desde:
+        condiciones.append(Partido.fecha_partido >= desde)
+    if hasta:
+        condiciones.append(Partido.fecha_partido <= hasta)
+
+    try:
+        ids = session.exec(select(Partido.id).where(*condiciones)).all()
+        if not ids:
+            return {
+                "partidos_eliminados": 0,
+                "estadisticas_eliminadas": 0,
+                "eventos_eliminados": 0,
+                "jugadores_afectados": []
+            }
+
+        resultado = _eliminar_partidos(session, Partido.id.in_(ids))
         session.commit()
-        session.refresh(db_partido)
-        return db_partido
+
+        club = club_de_sesion(session)
+        for partido_id in ids:
+            hub.publicar(partido_id, "partido_eliminado", {"id": partido_id}, club=club)
+        return resultado
 
     except Exception as e:
         session.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al crear partido: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al eliminar partidos: {str(e)}")
+
+
+# Columnas por las que se puede ordenar el listado
+ORDEN_PARTIDOS = {
+    "fecha_partido", "total_minutos", "total_goles", "total_asistencias",
+    "total_amarillas", "total_rojas", "total_jugadores"
+}
 
 
 @router.get("/", response_model=list[Partido])
 def read_partidos(
         resultado: Optional[ResultadoPartido] = None,
-        session: Session = Depends(get_session)
+        ordenar_por: str = "fecha_partido",
+        ascendente: bool = False,
+        min_total_goles: Optional[int] = None,
+        min_total_amarillas: Optional[int] = None,
+        session: Session = Depends(get_read_session)
 ):
     """Obtener lista de todos los partidos"""
+    if ordenar_por not in ORDEN_PARTIDOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ordenar_por debe ser uno de: {', '.join(sorted(ORDEN_PARTIDOS))}"
+        )
+
     try:
-        statement = select(Partido).order_by(Partido.fecha_partido.desc())
+        if lectura.activa("partidos"):
+            return lectura.partidos(
+                session, ordenar_por, ascendente, resultado, min_total_goles, min_total_amarillas
+            )
+
+        columna = getattr(Partido, ordenar_por)
+        statement = select(Partido).order_by(
+            columna.asc() if ascendente else columna.desc(),
+            Partido.fecha_partido.desc()
+        )
         if resultado:
             statement = statement.where(Partido.resultado == resultado)
+        if min_total_goles is not None:
+            statement = statement.where(Partido.total_goles >= min_total_goles)
+        if min_total_amarillas is not None:
+            statement = statement.where(Partido.total_amarillas >= min_total_amarillas)
         partidos = session.exec(statement).all()
         return partidos
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener partidos: {str(e)}")
 
 
+@router.get("/consistencia")
+def consistencia_partidos(
+        verificar_totales: bool = False,
+        session: Session = Depends(get_read_session)
+):
+    """Partidos cuyos goles registrados por jugadores no coinciden con el marcador"""
+    return agregados.inconsistencias(session, verificar_totales)
+
+
+@router.post("/totales/recalcular")
+def recalcular_totales_partidos(session: Session = Depends(get_session)):
+    """Reconstruir los totales denormalizados de todos los partidos"""
+    try:
+        actualizados = agregados.recalcular_totales(session)
+        session.commit()
+        return {"partidos_actualizados": actualizados}
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al recalcular totales: {str(e)}")
+
+
+@router.get("/ratings")
+def ratings_actuales(session: Session = Depends(get_read_session)):
+    """Rating Elo vigente de sigmotaa FC y de cada rival"""
+    try:
+        return ratings.actuales(session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener ratings: {str(e)}")
+
+
+@router.get("/ratings/historial")
+def historial_ratings(
+        rival: Optional[str] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        session: Session = Depends(get_read_session)
+):
+    """Evolución del rating partido a partido (opcionalmente contra un rival)"""
+    try:
+        return ratings.historial(session, rival, desde, hasta)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener historial de ratings: {str(e)}")
+
+
+@router.post("/ratings/recalcular")
+def recalcular_ratings(desde: Optional[date] = None, session: Session = Depends(get_session)):
+    """Rehacer los ratings desde una fecha (o desde el primer partido)"""
+    try:
+        partidos = ratings.recalcular(session, desde)
+        session.commit()
+        return {"partidos_recalculados": partidos}
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al recalcular ratings: {str(e)}")
+
+
+@router.get("/eventos/histograma")
+def histograma_eventos(
+        tamano: int = Query(15, ge=1, le=130),
+        tipo: Optional[List[TipoEvento]] = Query(None),
+        partido_id: Optional[int] = None,
+        jugador_id: Optional[int] = None,
+        session: Session = Depends(get_read_session)
+):
+    """Eventos por tipo y tramo de minutos (p. ej. goles después del 75)"""
+    try:
+        return eventos.histograma(session, tamano, tipo, partido_id, jugador_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener histograma de eventos: {str(e)}")
+
+
+@router.get("/opciones")
+def opciones_partidos(
+        q: Optional[str] = Query(None, max_length=100),
+        offset: int = Query(0, ge=0),
+        limite: int = Query(opciones.PAGINA, ge=1, le=opciones.PAGINA_MAXIMA),
+        session: Session = Depends(get_read_session)
+):
+    """Búsqueda paginada de partidos por rival para los formularios"""
+    try:
+        return opciones.buscar_partidos(session, q, offset, limite)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar partidos: {str(e)}")
+
+
 @router.get("/{partido_id}", response_model=Partido)
-def read_partido(partido_id: int, session: Session = Depends(get_session)):
+def read_partido(partido_id: int, session: Session = Depends(get_read_session)):
     """Obtener un partido por ID"""
+    if lectura.activa("partido"):
+        return lectura.partido(session, partido_id)
+
     partido = session.get(Partido, partido_id)
     if not partido:
         raise HTTPException(status_code=404, detail="Partido no encontrado")
     return partido
 
 
+@router.patch("/{partido_id}", response_model=Partido)
+def update_partido(
+        partido_id: int,
+        partido_update: PartidoUpdate,
+        session: Session = Depends(get_session)
+):
+    """Actualizar un partido existente (marcador, datos del encuentro)"""
+    try:
+        db_partido = session.get(Partido, partido_id)
+        if not db_partido:
+            raise HTTPException(status_code=404, detail="Partido no encontrado")
+
+        # Actualizar campos y recalcular el resultado
+        fecha_anterior = db_partido.fecha_partido
+        partido_data = partido_update.model_dump(exclude_unset=True)
+        cambios = {}
+        for key, value in partido_data.items():
+            if getattr(db_partido, key) != value:
+                setattr(db_partido, key, value)
+                cambios[key] = value
+
+        resultado = db_partido.calcular_resultado()
+        if resultado != db_partido.resultado:
+            db_partido.resultado = resultado
+            cambios["resultado"] = resultado.value
+
+        session.add(db_partido)
+
+        # Un cambio en el marcador, la fecha, la localía o el rival rehace los ratings desde ahí
+        if cambios.keys() & {"goles_sigmotaa", "goles_rival", "fecha_partido", "es_local", "rival"}:
+            session.flush()
+            ratings.recalcular(session, desde=min(fecha_anterior, db_partido.fecha_partido))
+        # Mover la fecha cambia qué partidos cuentan como cumplidos (y cuáles ya se jugaron)
+        if "fecha_partido" in cambios:
+            disciplina.recalcular(session)
+
+        session.commit()
+        session.refresh(db_partido)
+
+        if cambios:
+            hub.publicar(partido_id, "partido", cambios, club=club_de_sesion(session))
+        return db_partido
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al actualizar partido: {str(e)}")
+
+
 @router.delete("/{partido_id}")
 def delete_partido(partido_id: int, session: Session = Depends(get_session)):
     """Eliminar un partido"""
@@ -66,44 +355,136 @@ def delete_partido(partido_id: int, session: Session = Depends(get_session)):
         if not partido:
             raise HTTPException(status_code=404, detail="Partido no encontrado")
 
-        session.delete(partido)
+        resultado = _eliminar_partidos(session, Partido.id == partido_id)
         session.commit()
-        return {"message": "Partido eliminado correctamente"}
+        hub.publicar(partido_id, "partido_eliminado", {"id": partido_id}, club=club_de_sesion(session))
+        return {"message": "Partido eliminado correctamente", **resultado}
 
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=f"Error al eliminar partido: {str(e)}")
 
 
+def _estado_en_vivo(session: Session, partido_id: int) -> Optional[dict]:
+    """Estado inicial compacto que recibe cada cliente al conectarse"""
+    partido = session.get(Partido, partido_id)
+    if not partido:
+        return None
+    return {
+        "id": partido.id,
+        "rival": partido.rival,
+        "goles_sigmotaa": partido.goles_sigmotaa,
+        "goles_rival": partido.goles_rival,
+        "resultado": partido.resultado.value,
+        "estadisticas": [diferencias_estadistica(e) for e in partido.estadisticas]
+    }
+
+
+@router.get("/{partido_id}/live")
+async def live_partido(partido_id: int, session: Session = Depends(get_read_session)):
+    """Feed en vivo del partido (Server-Sent Events)"""
+    # Suscribir antes de leer el estado para no perder eventos intermedios
+    suscriptor = hub.suscribir(partido_id, club_de_sesion(session))
+    try:
+        inicial = await run_in_threadpool(_estado_en_vivo, session, partido_id)
+    except Exception:
+        hub.cancelar(suscriptor)
+        raise
+
+    if inicial is None:
+        hub.cancelar(suscriptor)
+        raise HTTPException(status_code=404, detail="Partido no encontrado")
+
+    return StreamingResponse(
+        hub.flujo(suscriptor, inicial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/{partido_id}/eventos")
+def registrar_eventos(
+        partido_id: int,
+        lote: List[EventoCreate],
+        session: Session = Depends(get_session)
+):
+    """Registrar un lote de eventos y sumarlos a las estadísticas del partido"""
+    try:
+        if len(lote) > eventos.MAX_LOTE:
+            raise HTTPException(status_code=400, detail=f"Máximo {eventos.MAX_LOTE} eventos por lote")
+
+        partido = session.get(Partido, partido_id)
+        if not partido:
+            raise HTTPException(status_code=404, detail="Partido no encontrado")
+
+        ids_jugadores = {e.jugador_id for e in lote}
+        existentes = set(session.exec(select(Jugador.id).where(Jugador.id.in_(ids_jugadores))).all())
+        if ids_jugadores - existentes:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Jugadores no encontrados: {sorted(ids_jugadores - existentes)}"
+            )
+
+        try:
+            modificadas = eventos.registrar_lote(session, partido, lote)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        session.flush()
+        cambios = [diferencias_estadistica(e) for e in modificadas]
+        session.commit()
+
+        club = club_de_sesion(session)
+        for datos in cambios:
+            hub.publicar(partido_id, "estadistica", datos, club=club)
+        return {"eventos_registrados": len(lote), "estadisticas_actualizadas": len(modificadas)}
+
+    except HTTPException:
+        session.rollback()
+        raise
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al registrar eventos: {str(e)}")
+
+
+@router.get("/{partido_id}/eventos")
+def listar_eventos(
+        partido_id: int,
+        tipo: Optional[TipoEvento] = None,
+        desde_minuto: Optional[int] = None,
+        hasta_minuto: Optional[int] = None,
+        session: Session = Depends(get_read_session)
+):
+    """Eventos del partido en orden cronológico"""
+    try:
+        if not session.get(Partido, partido_id):
+            raise HTTPException(status_code=404, detail="Partido no encontrado")
+        return eventos.listar(session, partido_id, tipo, desde_minuto, hasta_minuto)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener eventos: {str(e)}")
+
+
 # ====== HTML VIEWS ======
 
 @router.get("/html/lista", response_class=HTMLResponse)
-def lista_partidos_html(request: Request, session: Session = Depends(get_session)):
-    """Vista HTML: Lista de partidos"""
-    partidos = session.exec(
+async def lista_partidos_html(request: Request, session: Session = Depends(get_read_session)):
+    """Vista HTML: Lista de partidos (renderizada en streaming)"""
+    # Estadísticas generales desde la caché (se invalida al escribir partidos); las filas llegan por lotes
+    estadisticas, _ = await run_in_threadpool(
+        cache.obtener_o_calcular,
+        club_de_sesion(session),
+        "balance_partidos",
+        ("partidos",),
+        lambda: agregados.balance_partidos(session)
+    )
+    partidos = filas_servidor(
+        session.get_bind(),
         select(Partido).order_by(Partido.fecha_partido.desc())
-    ).all()
-
-    # Calcular estadísticas generales
-    total_partidos = len(partidos)
-    victorias = len([p for p in partidos if p.resultado == ResultadoPartido.VICTORIA])
-    empates = len([p for p in partidos if p.resultado == ResultadoPartido.EMPATE])
-    derrotas = len([p for p in partidos if p.resultado == ResultadoPartido.DERROTA])
-
-    goles_favor = sum(p.goles_sigmotaa for p in partidos)
-    goles_contra = sum(p.goles_rival for p in partidos)
-
-    estadisticas = {
-        "total": total_partidos,
-        "victorias": victorias,
-        "empates": empates,
-        "derrotas": derrotas,
-        "goles_favor": goles_favor,
-        "goles_contra": goles_contra,
-        "diferencia": goles_favor - goles_contra
-    }
+    )
 
-    return templates.TemplateResponse(
+    return stream_template(
         "partidos/lista.html",
         {
             "request": request,
@@ -117,16 +498,23 @@ def lista_partidos_html(request: Request, session: Session = Depends(get_session
 def detalle_partido_html(
         request: Request,
         partido_id: int,
-        session: Session = Depends(get_session)
+        session: Session = Depends(get_read_session)
 ):
     """Vista HTML: Detalle de partido con estadísticas de jugadores"""
-    partido = session.get(Partido, partido_id)
+    # Cargar estadísticas y jugadores en dos consultas (evita un SELECT por fila)
+    partido = session.exec(
+        select(Partido)
+        .where(Partido.id == partido_id)
+        .options(selectinload(Partido.estadisticas).selectinload(Estadistica.jugador))
+    ).first()
     if not partido:
         raise HTTPException(status_code=404, detail="Partido no encontrado")
 
+    # Un partido próximo no tiene foto: pronóstico con los ratings vigentes
+    rating = session.get(RatingPartido, partido_id) if partido.jugado() else ratings.pronostico(session, partido)
     return templates.TemplateResponse(
         "partidos/detalle.html",
-        {"request": request, "partido": partido}
+        {"request": request, "partido": partido, "rating": rating}
     )
 
 
@@ -165,7 +553,7 @@ async def crear_partido_submit(
             observaciones=observaciones if observaciones else None
         )
 
-        partido = create_partido(partido_data, session)
+        partido = await run_in_threadpool(create_partido, partido_data, session)
         return RedirectResponse(
             url=f"/partidos/html/detalle/{partido.id}",
             status_code=303
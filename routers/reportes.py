@@ -0,0 +1,60 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+import reportes
+from database import club_de
+
+router = APIRouter(prefix="/reportes", tags=["reportes"])
+
+
+# ====== API ENDPOINTS ======
+
+@router.post("/", status_code=202)
+def crear_reporte(
+        request: Request,
+        response: Response,
+        temporada: Optional[int] = Query(None, ge=1900, le=2100, description="Año calendario (por defecto el actual)")
+):
+    """Lanzar la generación de los reportes de temporada de todo el plantel"""
+    try:
+        trabajo = reportes.iniciar(temporada or date.today().year, club_de(request))
+        response.headers["Location"] = f"/reportes/{trabajo.id}"
+        return trabajo.resumen()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al iniciar el reporte: {str(e)}")
+
+
+@router.get("/")
+def listar_reportes(request: Request):
+    """Trabajos de reporte, del más reciente al más antiguo"""
+    return [trabajo.resumen() for trabajo in reportes.listar(club_de(request))]
+
+
+@router.get("/{trabajo_id}")
+def estado_reporte(trabajo_id: str, request: Request):
+    """Estado y progreso de un trabajo"""
+    trabajo = reportes.obtener(trabajo_id, club_de(request))
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    return trabajo.resumen()
+
+
+@router.get("/{trabajo_id}/descarga")
+def descargar_reporte(trabajo_id: str, request: Request):
+    """Descargar el zip con el índice de la temporada y un HTML por jugador"""
+    trabajo = reportes.obtener(trabajo_id, club_de(request))
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    if trabajo.estado != "completado":
+        raise HTTPException(status_code=409, detail=f"El reporte está {trabajo.estado}")
+
+    return FileResponse(
+        trabajo.archivo,
+        media_type="application/zip",
+        filename=f"temporada_{trabajo.temporada}.zip"
+    )
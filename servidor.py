@@ -0,0 +1,116 @@
+"""
+Arranque de producción: gunicorn con workers de uvicorn.
+
+Un proceso por núcleo (WEB_CONCURRENCY), cada uno con uvloop y httptools.
+El arbiter de gunicorn vuelve a levantar los workers que terminan, y los
+workers se reciclan:
+- por número de peticiones (MAX_REQUESTS, con MAX_REQUESTS_JITTER para que
+  no se reinicien todos a la vez);
+- por memoria (WORKER_MAX_RSS_MB): al superarla el worker termina de forma
+  ordenada y el arbiter crea otro.
+
+Recarga sin cortes: `kill -HUP $(cat $PIDFILE)` levanta workers con el
+código nuevo y apaga los viejos cuando terminan sus peticiones en curso
+(hasta GRACEFUL_TIMEOUT segundos).
+
+Sin PRELOAD cada worker importa la aplicación después del fork, así que crea
+sus propios engines. Con PRELOAD=1 (menos memoria) el hook post_fork
+descarta las conexiones heredadas del padre.
+
+Uso:
+    python servidor.py
+    WEB_CONCURRENCY=8 PORT=8000 python servidor.py
+"""
+import os
+import signal
+
+# Producción: sin log de cada sentencia SQL (se lee al importar database)
+os.environ.setdefault("SQL_ECHO", "0")
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+KEEPALIVE_S = int(os.getenv("KEEPALIVE_S", "5"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# Conexiones simultáneas por worker antes de responder 503 (0 = sin límite)
+LIMITE_CONEXIONES = int(os.getenv("LIMIT_CONCURRENCY", "1000"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+MAX_RSS_MB = int(os.getenv("WORKER_MAX_RSS_MB", "0"))
+TIMEOUT_S = int(os.getenv("WORKER_TIMEOUT", "60"))
+GRACEFUL_TIMEOUT_S = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+PRELOAD = os.getenv("PRELOAD", "0") == "1"
+PIDFILE = os.getenv("PIDFILE") or None
+ACCESS_LOG = os.getenv("ACCESS_LOG", "0") == "1"
+
+
+def _rss_mb() -> float:
+    """Memoria residente actual del proceso"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class WorkerSigmotaa(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": LIMITE_CONEXIONES or None,
+    }
+
+    async def callback_notify(self) -> None:
+        """Latido periódico hacia el arbiter; también revisa la memoria"""
+        await super().callback_notify()
+        if MAX_RSS_MB and self.alive and _rss_mb() > MAX_RSS_MB:
+            self.alive = False
+            self.log.warning("Worker %s supera %d MB, se recicla", self.pid, MAX_RSS_MB)
+            # Uvicorn trata SIGTERM como apagado ordenado: termina las peticiones en curso
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+def post_fork(server, worker) -> None:
+    if PRELOAD:
+        import database
+        database.tras_fork()
+
+
+class Servidor(BaseApplication):
+    def __init__(self, opciones: dict):
+        self.opciones = opciones
+        super().__init__()
+
+    def load_config(self) -> None:
+        for clave, valor in self.opciones.items():
+            self.cfg.set(clave, valor)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def opciones() -> dict:
+    return {
+        "bind": f"{HOST}:{PORT}",
+        "workers": WORKERS,
+        "worker_class": "servidor.WorkerSigmotaa",
+        "keepalive": KEEPALIVE_S,
+        "backlog": BACKLOG,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "timeout": TIMEOUT_S,
+        "graceful_timeout": GRACEFUL_TIMEOUT_S,
+        "preload_app": PRELOAD,
+        "pidfile": PIDFILE,
+        "accesslog": "-" if ACCESS_LOG else None,
+        "post_fork": post_fork,
+    }
+
+
+if __name__ == "__main__":
+    Servidor(opciones()).run()
@@ -0,0 +1,356 @@
+"""
+Jugadores parecidos (scouting y armado del plantel).
+
+Cada jugador es una fila de una matriz NumPy en memoria, por club:
+
+- altura, peso, edad y producción cada 90 minutos (goles, asistencias,
+  intercepciones, balones recuperados, faltas), normalizadas a puntaje z;
+- posición y pie dominante en one-hot, con pesos SIMILITUD_PESO_POSICION y
+  SIMILITUD_PESO_PIE.
+
+Los minutos se cuentan como mínimo SIMILITUD_MINUTOS_MINIMOS (90) para que
+un jugador con pocos minutos no aparezca con tasas extremas.
+
+La matriz se actualiza por partes: los eventos de la `Session` anotan qué
+jugadores tocó cada commit (altas y cambios de jugadores o estadísticas) y
+en la siguiente consulta solo se releen esas filas. Lo que no se puede
+atribuir a jugadores concretos (UPDATE/DELETE en bloque, borrado de
+partidos con sus estadísticas en cascada) y los commits de otros workers
+se detectan comparando las versiones de `versiones_tabla` (ver
+invalidacion.py) y provocan una reconstrucción completa.
+
+La búsqueda calcula las distancias por bloques de SIMILITUD_BLOQUE filas
+(||a||² - 2a·b + ||b||², un producto matriz-vector por bloque) y se queda
+con los k menores con `argpartition`, sin ordenar la matriz entera.
+"""
+import os
+import threading
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import numpy as np
+from sqlalchemy import event, func, inspect, select
+from sqlmodel import Session
+
+import database
+import invalidacion
+from models import Estadistica, Estado, Jugador, Partido, PieDominante, Position, VersionTabla
+
+TABLAS = ("jugadores", "estadisticas", "partidos")
+BLOQUE = int(os.getenv("SIMILITUD_BLOQUE", "65536"))
+MINUTOS_MINIMOS = float(os.getenv("SIMILITUD_MINUTOS_MINIMOS", "90"))
+PESO_POSICION = float(os.getenv("SIMILITUD_PESO_POSICION", "1.0"))
+PESO_PIE = float(os.getenv("SIMILITUD_PESO_PIE", "0.5"))
+K_MAXIMO = 50
+
+POSICIONES = list(Position)
+PIES = list(PieDominante)
+ESTADOS = list(Estado)
+PRODUCCION = ("goles_anotados", "asistencias", "intercepciones", "balones_recuperados", "faltas_cometidas")
+CARACTERISTICAS = (
+    ["altura_cm", "peso_kg", "edad"]
+    + [f"{campo}_90" for campo in PRODUCCION]
+    + [f"posicion:{p.value}" for p in POSICIONES]
+    + [f"pie:{p.value}" for p in PIES]
+)
+
+# Columnas de la matriz cruda: altura, peso, nacimiento (ordinal), minutos y sumas de producción
+_ALTURA, _PESO, _NACIMIENTO, _MINUTOS = 0, 1, 2, 3
+_SUMAS = slice(4, 4 + len(PRODUCCION))
+
+CLAVE_SESION = "similitud_jugadores"
+
+
+class Vista(NamedTuple):
+    """Matriz normalizada y datos de cada fila; se reemplaza entera, nunca se modifica"""
+    hoy: date
+    ids: np.ndarray
+    fila: Dict[int, int]
+    matriz: np.ndarray
+    normas: np.ndarray
+    estados: np.ndarray
+    nombres: List[str]
+    numeros: np.ndarray
+    posiciones: np.ndarray
+    pies: np.ndarray
+
+
+class IndiceSimilitud:
+    """Matriz de características de los jugadores de un club"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.firma: Optional[Dict[str, int]] = None  # versiones de TABLAS que refleja la matriz
+        self.pendientes: Set[int] = set()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.crudos = np.empty((0, 4 + len(PRODUCCION)))
+        self.posiciones = np.empty(0, dtype=np.int8)
+        self.pies = np.empty(0, dtype=np.int8)
+        self.estados = np.empty(0, dtype=np.int8)
+        self.numeros = np.empty(0, dtype=np.int16)
+        self.nombres: List[str] = []
+        self.vista: Optional[Vista] = None
+        self.reconstrucciones = 0
+        self.refrescos = 0
+
+    # ====== CARGA ======
+
+    @staticmethod
+    def _leer(session: Session, ids: Optional[Set[int]] = None) -> list:
+        """Atributos y sumas de producción por jugador en una sola consulta agrupada"""
+        sentencia = (
+            select(
+                Jugador.id, Jugador.nombre_completo, Jugador.numero_camiseta, Jugador.altura_cm,
+                Jugador.peso_kg, Jugador.fecha_nacimiento, Jugador.posicion, Jugador.pie_dominante,
+                Jugador.estado, func.coalesce(func.sum(Estadistica.minutos_jugados), 0),
+                *(func.coalesce(func.sum(getattr(Estadistica, campo)), 0) for campo in PRODUCCION)
+            )
+            .select_from(Jugador)
+            .outerjoin(Estadistica, Estadistica.jugador_id == Jugador.id)
+            .group_by(Jugador.id)
+            .order_by(Jugador.id)
+        )
+        if ids is not None:
+            sentencia = sentencia.where(Jugador.id.in_(list(ids)))
+        return session.execute(sentencia).all()
+
+    @staticmethod
+    def _columnas(filas: list) -> tuple:
+        codigo_posicion = {p: i for i, p in enumerate(POSICIONES)}
+        codigo_pie = {p: i for i, p in enumerate(PIES)}
+        codigo_estado = {e: i for i, e in enumerate(ESTADOS)}
+        ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+        crudos = np.array(
+            [(f[3], f[4], f[5].toordinal(), *f[9:]) for f in filas], dtype=np.float64
+        ).reshape(len(filas), 4 + len(PRODUCCION))
+        return (
+            ids, crudos,
+            np.array([codigo_posicion[f[6]] for f in filas], dtype=np.int8),
+            np.array([codigo_pie[f[7]] for f in filas], dtype=np.int8),
+            np.array([codigo_estado[f[8]] for f in filas], dtype=np.int8),
+            np.array([f[2] for f in filas], dtype=np.int16),
+            [f[1] for f in filas]
+        )
+
+    def reconstruir(self, session: Session) -> None:
+        (self.ids, self.crudos, self.posiciones, self.pies,
+         self.estados, self.numeros, self.nombres) = self._columnas(self._leer(session))
+        self.pendientes.clear()
+        self.vista = None
+        self.reconstrucciones += 1
+
+    def refrescar(self, session: Session, ids: Set[int]) -> None:
+        """Releer solo las filas de `ids`: actualiza, agrega las nuevas y quita las borradas"""
+        (nuevos_ids, crudos, posiciones, pies, estados, numeros, nombres) = self._columnas(self._leer(session, ids))
+        conservar = ~np.isin(self.ids, list(ids))
+        self.ids = np.concatenate([self.ids[conservar], nuevos_ids])
+        self.crudos = np.concatenate([self.crudos[conservar], crudos])
+        self.posiciones = np.concatenate([self.posiciones[conservar], posiciones])
+        self.pies = np.concatenate([self.pies[conservar], pies])
+        self.estados = np.concatenate([self.estados[conservar], estados])
+        self.numeros = np.concatenate([self.numeros[conservar], numeros])
+        self.nombres = [n for n, c in zip(self.nombres, conservar) if c] + nombres
+        self.vista = None
+        self.refrescos += 1
+
+    # ====== NORMALIZACIÓN ======
+
+    def normalizar(self, hoy: date) -> Vista:
+        n = len(self.ids)
+        minutos = np.maximum(self.crudos[:, _MINUTOS], MINUTOS_MINIMOS)
+        numericas = np.column_stack([
+            self.crudos[:, _ALTURA],
+            self.crudos[:, _PESO],
+            (hoy.toordinal() - self.crudos[:, _NACIMIENTO]) / 365.25,
+            self.crudos[:, _SUMAS] * (90 / minutos)[:, None]
+        ])
+        desvio = numericas.std(axis=0) if n else np.ones(numericas.shape[1])
+        desvio[desvio == 0] = 1
+        puntajes = (numericas - (numericas.mean(axis=0) if n else 0)) / desvio
+
+        categorias = np.zeros((n, len(POSICIONES) + len(PIES)))
+        filas = np.arange(n)
+        categorias[filas, self.posiciones] = PESO_POSICION
+        categorias[filas, len(POSICIONES) + self.pies] = PESO_PIE
+
+        matriz = np.ascontiguousarray(np.hstack([puntajes, categorias]), dtype=np.float32)
+        self.vista = Vista(
+            hoy=hoy,
+            ids=self.ids,
+            fila={int(i): f for f, i in enumerate(self.ids)},
+            matriz=matriz,
+            normas=np.einsum("ij,ij->i", matriz, matriz),
+            estados=self.estados,
+            nombres=self.nombres,
+            numeros=self.numeros,
+            posiciones=self.posiciones,
+            pies=self.pies
+        )
+        return self.vista
+
+
+_indices: Dict[Optional[str], IndiceSimilitud] = {}
+_lock = threading.Lock()
+
+
+def _indice(club: Optional[str]) -> IndiceSimilitud:
+    with _lock:
+        indice = _indices.get(club)
+        if indice is None:
+            indice = _indices[club] = IndiceSimilitud()
+        return indice
+
+
+def _versiones(session: Session) -> Dict[str, int]:
+    return dict(session.execute(
+        select(VersionTabla.tabla, VersionTabla.version).where(VersionTabla.tabla.in_(TABLAS))
+    ).all())
+
+
+def vista(session: Session) -> Vista:
+    """Matriz del club de `session`, al día con la base"""
+    indice = _indice(database.club_de_sesion(session))
+    versiones = _versiones(session)
+    hoy = date.today()
+    with indice.lock:
+        if indice.firma != versiones:
+            indice.reconstruir(session)
+            indice.firma = versiones
+        elif indice.pendientes:
+            pendientes, indice.pendientes = indice.pendientes, set()
+            indice.refrescar(session, pendientes)
+        if indice.vista is None or indice.vista.hoy != hoy:
+            indice.normalizar(hoy)
+        return indice.vista
+
+
+def _mas_cercanos(v: Vista, consulta: np.ndarray, validas: np.ndarray, k: int) -> tuple:
+    """Índices y distancias² de los k más cercanos, por bloques de filas"""
+    candidatos, distancias = [], []
+    norma_consulta = float(consulta @ consulta)
+    for inicio in range(0, len(v.ids), BLOQUE):
+        fin = inicio + BLOQUE
+        d = v.normas[inicio:fin] - 2 * (v.matriz[inicio:fin] @ consulta) + norma_consulta
+        d[~validas[inicio:fin]] = np.inf
+        if len(d) > k:
+            mejores = np.argpartition(d, k)[:k]
+        else:
+            mejores = np.arange(len(d))
+        candidatos.append(mejores + inicio)
+        distancias.append(d[mejores])
+
+    candidatos, distancias = np.concatenate(candidatos), np.concatenate(distancias)
+    if len(distancias) > k:
+        mejores = np.argpartition(distancias, k)[:k]
+        candidatos, distancias = candidatos[mejores], distancias[mejores]
+    orden = np.argsort(distancias, kind="stable")
+    finitas = np.isfinite(distancias[orden])
+    return candidatos[orden][finitas], distancias[orden][finitas]
+
+
+def similares(session: Session, jugador_id: int, k: int, estado: Optional[Estado] = None) -> Optional[dict]:
+    """Los k jugadores más parecidos a `jugador_id` (None si no existe)"""
+    v = vista(session)
+    fila = v.fila.get(jugador_id)
+    if fila is None:
+        return None
+
+    validas = np.ones(len(v.ids), dtype=bool)
+    if estado is not None:
+        validas &= v.estados == ESTADOS.index(estado)
+    validas[fila] = False
+
+    filas, distancias = _mas_cercanos(v, v.matriz[fila], validas, k)
+    return {
+        "jugador_id": jugador_id,
+        "caracteristicas": CARACTERISTICAS,
+        "similares": [
+            {
+                "id": int(v.ids[f]),
+                "nombre_completo": v.nombres[f],
+                "numero_camiseta": int(v.numeros[f]),
+                "posicion": POSICIONES[v.posiciones[f]],
+                "pie_dominante": PIES[v.pies[f]],
+                "estado": ESTADOS[v.estados[f]],
+                "distancia": round(float(np.sqrt(max(d, 0.0))), 4)
+            }
+            for f, d in zip(filas, distancias)
+        ]
+    }
+
+
+def resumen() -> dict:
+    with _lock:
+        indices = dict(_indices)
+    return {
+        club or "principal": {
+            "jugadores": len(indice.ids),
+            "pendientes": len(indice.pendientes),
+            "reconstrucciones": indice.reconstrucciones,
+            "refrescos": indice.refrescos
+        }
+        for club, indice in indices.items()
+    }
+
+
+# ====== CAMBIOS POR EVENTOS DE SESIÓN ======
+
+def _anotar(session: Session) -> dict:
+    return session.info.setdefault(CLAVE_SESION, {"ids": set(), "completo": False})
+
+
+@event.listens_for(Session, "after_flush")
+def _jugadores_del_flush(session, contexto) -> None:
+    cambios = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Jugador):
+            cambios = cambios or _anotar(session)
+            cambios["ids"].add(obj.id)
+        elif isinstance(obj, Estadistica):
+            cambios = cambios or _anotar(session)
+            cambios["ids"].add(obj.jugador_id)
+            cambios["ids"].update(inspect(obj).attrs.jugador_id.history.deleted or ())
+        elif isinstance(obj, Partido) and obj in session.deleted:
+            _anotar(session)["completo"] = True  # sus estadísticas se borran en cascada
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _cambios_en_bloque(estado) -> None:
+    if not (estado.is_update or estado.is_delete):
+        return
+    tabla = getattr(estado.statement, "table", None)
+    if tabla is None or tabla.name not in TABLAS:
+        return
+    if tabla.name == "partidos" and estado.is_update:
+        return  # totales y marcadores: no son características
+    _anotar(estado.session)["completo"] = True
+
+
+def _registrar_cambios(session, versiones: Dict[str, int]) -> None:
+    """Tras cada commit (ver invalidacion.al_confirmar)"""
+    cambios = session.info.pop(CLAVE_SESION, None)
+    nuevas = {t: v for t, v in versiones.items() if t in TABLAS}
+    if not nuevas:
+        return
+    with _lock:
+        indice = _indices.get(session.info.get("club"))
+    if indice is None:
+        return
+
+    with indice.lock:
+        if indice.firma is None or all(indice.firma.get(t) == v for t, v in nuevas.items()):
+            return  # sin construir, o ya reconstruida con este commit
+        consecutivas = all(indice.firma.get(t) == v - 1 for t, v in nuevas.items())
+        if consecutivas and not (cambios and cambios["completo"]):
+            indice.firma.update(nuevas)
+            indice.pendientes.update(i for i in (cambios or {}).get("ids", ()) if i is not None)
+        else:
+            indice.firma = None
+
+
+invalidacion.al_confirmar.append(_registrar_cambios)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(session) -> None:
+    session.info.pop(CLAVE_SESION, None)
@@ -0,0 +1,68 @@
+"""
+Indicadores del tablero principal (/dashboard).
+
+Balance de la temporada, goleador, plantel disponible y próximos partidos
+salen de cuatro consultas agregadas y se guardan en la caché compartida
+(ver cache.py): cualquier commit que toque sus tablas los invalida. La
+temporada es el año calendario y solo cuentan los partidos hasta hoy; los
+partidos con fecha futura son los próximos.
+"""
+import os
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from sqlmodel import Session, select
+
+import agregados
+import database
+from cache import cache
+from models import Partido
+
+TABLAS = ("partidos", "estadisticas", "jugadores", "disciplina_jugadores")
+PROXIMOS = int(os.getenv("DASHBOARD_PROXIMOS", "5"))
+
+
+def calcular(session: Session, temporada: int, hoy: date) -> dict:
+    desde, hasta = date(temporada, 1, 1), min(date(temporada, 12, 31), hoy)
+    jugados = (Partido.fecha_partido >= desde, Partido.fecha_partido <= hasta)
+
+    goleador = agregados.goleadores(session, 1, *jugados)
+    proximos = session.exec(
+        select(Partido.id, Partido.fecha_partido, Partido.rival, Partido.es_local, Partido.estadio)
+        .where(Partido.fecha_partido > hoy)
+        .order_by(Partido.fecha_partido, Partido.id)
+        .limit(PROXIMOS)
+    ).all()
+
+    return {
+        "temporada": temporada,
+        "balance": agregados.balance_partidos(session, *jugados),
+        "goleador": goleador[0] if goleador else None,
+        "plantel": agregados.conteo_jugadores(session),
+        "proximos": [
+            {"id": id_, "fecha_partido": fecha, "rival": rival, "es_local": es_local, "estadio": estadio}
+            for id_, fecha, rival, es_local, estadio in proximos
+        ],
+        "calculado": datetime.utcnow()
+    }
+
+
+def obtener(session: Session, temporada: Optional[int] = None) -> Tuple[dict, bool]:
+    """Tablero desde la caché (o calculado y guardado). Devuelve (datos, acierto)."""
+    hoy = date.today()
+    temporada = temporada or hoy.year
+    return cache.obtener_o_calcular(
+        database.club_de_sesion(session),
+        ("dashboard", temporada, hoy),
+        TABLAS,
+        lambda: calcular(session, temporada, hoy)
+    )
+
+
+def calentar() -> None:
+    """Precalcular el tablero del club por defecto antes de la primera visita"""
+    club = database.CLUB_POR_DEFECTO if database.engines_club is not None else None
+    if club:
+        club = database.validar_club(club)
+    with Session(database.engine_lectura_club(club), info={"club": club}) as session:
+        obtener(session)
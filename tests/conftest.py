@@ -0,0 +1,103 @@
+"""
+Fixtures compartidas: la aplicación corre contra una base SQLite temporal
+(una por sesión de pytest) que se vacía antes de cada test.
+"""
+import os
+import tempfile
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="sigmotaa_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DIRECTORIO}/tests.db"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ.pop("DATABASE_URL_CLUB", None)
+os.environ["SQL_ECHO"] = "0"
+os.environ["SQL_DEBUG"] = "1"
+
+import itertools
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlmodel import Session, SQLModel
+
+import database
+import main
+
+# Tablas de control que no se vacían entre tests
+_CONSERVADAS = {"versiones_tabla", "versiones_esquema"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture(autouse=True)
+def base_vacia(client):
+    """Borrar los datos con la Session, para que la caché se invalide como en producción"""
+    with Session(database.engine) as session:
+        for tabla in reversed(SQLModel.metadata.sorted_tables):
+            if tabla.name not in _CONSERVADAS:
+                session.execute(delete(tabla))
+        session.commit()
+
+
+@pytest.fixture
+def session():
+    with Session(database.engine) as sesion:
+        yield sesion
+
+
+@pytest.fixture
+def limite_consultas():
+    """
+    Fijar el número de consultas de un bloque:
+
+        with limite_consultas(2):
+            client.get("/jugadores/html/lista")
+    """
+    return database.limite_consultas
+
+
+@pytest.fixture
+def crear_jugador(client):
+    numeros = itertools.count(1)
+
+    def crear(**campos) -> dict:
+        datos = {
+            "nombre_completo": "Jugador de prueba",
+            "numero_camiseta": next(numeros),
+            "fecha_nacimiento": "1998-05-10",
+            "nacionalidad": "CO",
+            "altura_cm": 178,
+            "peso_kg": 74.0,
+            "pie_dominante": "DERECHO",
+            "posicion": "VOLANTE CENTRAL",
+            "anio_ingreso": 2020,
+            **campos
+        }
+        respuesta = client.post("/jugadores/", json=datos)
+        assert respuesta.status_code == 200, respuesta.text
+        return respuesta.json()
+
+    return crear
+
+
+@pytest.fixture
+def crear_partido(client):
+    dias = itertools.count(1)
+
+    def crear(**campos) -> dict:
+        datos = {
+            "rival": "Rival de prueba",
+            "fecha_partido": date.fromordinal(date(2024, 1, 1).toordinal() + next(dias)).isoformat(),
+            "goles_sigmotaa": 1,
+            "goles_rival": 0,
+            **campos
+        }
+        respuesta = client.post("/partidos/", json=datos)
+        assert respuesta.status_code == 200, respuesta.text
+        return respuesta.json()
+
+    return crear
@@ -0,0 +1,33 @@
+import admision
+import plantillas
+from routers import jugadores
+
+
+def test_cupo_retenido_mientras_se_envian_las_filas(client, crear_jugador, monkeypatch):
+    for i in range(5):
+        crear_jugador(nombre_completo=f"Jugador {i}")
+
+    en_ejecucion = []
+
+    async def filas_observadas(engine, statement, *args, **kwargs):
+        async for fila in plantillas.filas_servidor(engine, statement, *args, **kwargs):
+            en_ejecucion.append(admision.ANALITICA.en_ejecucion)
+            yield fila
+
+    monkeypatch.setattr(jugadores, "filas_servidor", filas_observadas)
+    respuesta = client.get("/jugadores/html/lista")
+
+    assert respuesta.status_code == 200
+    assert len(en_ejecucion) == 5
+    assert all(n == 1 for n in en_ejecucion)
+    assert admision.ANALITICA.en_ejecucion == 0
+
+
+def test_rechazo_con_503_si_la_cola_esta_llena(client, monkeypatch):
+    monkeypatch.setattr(admision.ANALITICA, "cola", 0)
+    monkeypatch.setattr(admision.ANALITICA, "_semaforo", type(admision.ANALITICA._semaforo)(0))
+
+    respuesta = client.get("/jugadores/html/lista")
+
+    assert respuesta.status_code == 503
+    assert respuesta.headers["Retry-After"] == str(admision.ANALITICA.retry_after)
@@ -0,0 +1,46 @@
+import lectura
+from database import contar_consultas
+
+
+def test_lista_html_de_jugadores_no_crece_con_las_filas(client, crear_jugador, limite_consultas):
+    for i in range(30):
+        crear_jugador(nombre_completo=f"Jugador {i:02d}")
+
+    with limite_consultas(2) as registro:
+        respuesta = client.get("/jugadores/html/lista")
+
+    assert respuesta.status_code == 200
+    assert respuesta.text.count("Jugador ") >= 30
+    assert registro.repetidas() == []
+
+
+def test_lista_de_jugadores_en_una_consulta(client, crear_jugador, limite_consultas):
+    for i in range(10):
+        crear_jugador(nombre_completo=f"Jugador {i:02d}")
+
+    with limite_consultas(1):
+        respuesta = client.get("/jugadores/?limit=100")
+
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()) == 10
+    assert respuesta.headers["X-SQL-Queries"] == "1"
+
+
+def test_cabecera_cuenta_lo_previo_al_cuerpo_en_streaming(client, crear_jugador):
+    crear_jugador()
+    with contar_consultas() as registro:
+        respuesta = client.get("/jugadores/html/lista")
+
+    # Las filas se consultan mientras se envía el cuerpo, después de las cabeceras
+    assert int(respuesta.headers["X-SQL-Queries"]) < registro.total
+
+
+def test_la_lectura_core_es_opcional_y_responde_igual(client, crear_jugador, crear_partido, monkeypatch):
+    jugador = crear_jugador()
+    partido = crear_partido()
+    assert not lectura.ACTIVAS
+
+    rutas = ("/jugadores/", f"/jugadores/{jugador['id']}", "/partidos/", f"/partidos/{partido['id']}")
+    orm = [client.get(ruta).json() for ruta in rutas]
+    monkeypatch.setattr(lectura, "ACTIVAS", set(lectura.RUTAS))
+    assert [client.get(ruta).json() for ruta in rutas] == orm
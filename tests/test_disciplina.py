@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+
+import calendario
+
+
+def _estadistica(client, jugador, partido, **tarjetas) -> dict:
+    datos = {
+        "jugador_id": jugador["id"],
+        "partido_id": partido["id"],
+        "minutos_jugados": 90,
+        "goles_anotados": 0,
+        "tarjetas_amarillas": 0,
+        "tarjetas_rojas": 0,
+        **tarjetas
+    }
+    respuesta = client.post("/estadisticas/", json=datos)
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+
+def _disciplina(client, jugador) -> dict:
+    return client.get(f"/jugadores/{jugador['id']}/disciplina").json()
+
+
+def _estado(client, jugador) -> str:
+    return client.get(f"/jugadores/{jugador['id']}").json()["estado"]
+
+
+def test_borrar_una_roja_cumplida_no_consume_la_siguiente(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    roja = _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+    crear_partido()
+    assert _disciplina(client, jugador)["partidos_cumplidos"] == 1
+    assert _estado(client, jugador) == "ACTIVO"
+
+    assert client.delete(f"/estadisticas/{roja['id']}").status_code == 200
+    disciplina = _disciplina(client, jugador)
+    assert disciplina["partidos_cumplidos"] == 0
+    assert disciplina["fecha_ultima_sancion"] is None
+
+    _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+    assert _disciplina(client, jugador)["partidos_pendientes"] == 1
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+
+def test_borrar_la_roja_levanta_la_suspension_del_motor(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    roja = _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+    assert client.delete(f"/estadisticas/{roja['id']}").status_code == 200
+    assert _disciplina(client, jugador)["partidos_pendientes"] == 0
+    assert _estado(client, jugador) == "ACTIVO"
+
+
+def test_la_suspension_manual_no_se_levanta(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    client.patch(f"/jugadores/{jugador['id']}", json={"estado": "SUSPENDIDO"})
+
+    _estadistica(client, jugador, crear_partido(), tarjetas_amarillas=1)
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+    assert client.post("/jugadores/disciplina/recalcular").status_code == 200
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+
+def test_suspension_del_motor_confirmada_a_mano_no_se_levanta(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+    client.patch(f"/jugadores/{jugador['id']}", json={"estado": "LESIONADO"})
+    client.patch(f"/jugadores/{jugador['id']}", json={"estado": "SUSPENDIDO"})
+
+    crear_partido()
+    assert _disciplina(client, jugador)["partidos_pendientes"] == 0
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+
+def test_eventos_de_un_mismo_partido_no_duplican_la_sancion(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    partido = crear_partido()
+
+    for tipo in (4, 3):
+        respuesta = client.post(
+            f"/partidos/{partido['id']}/eventos",
+            json=[{"jugador_id": jugador["id"], "tipo": tipo, "minuto": 30}]
+        )
+        assert respuesta.status_code == 200, respuesta.text
+
+    disciplina = _disciplina(client, jugador)
+    assert disciplina["rojas_directas"] == 1
+    assert disciplina["amarillas_acumuladas"] == 1
+    assert disciplina["partidos_pendientes"] == 1
+
+
+def test_un_partido_proximo_no_cumple_la_sancion(client, crear_jugador, crear_partido, session):
+    jugador = crear_jugador()
+    _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+
+    fecha = date.today() + timedelta(days=30)
+    crear_partido(fecha_partido=fecha.isoformat())
+    assert _disciplina(client, jugador)["partidos_pendientes"] == 1
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+    # Llega la fecha del partido
+    calendario.cerrar_fechas(session, hoy=fecha)
+    session.commit()
+    assert _disciplina(client, jugador)["partidos_pendientes"] == 0
+    assert _estado(client, jugador) == "ACTIVO"
+
+
+def test_el_sancionado_que_juega_el_partido_no_lo_cumple(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    _estadistica(client, jugador, crear_partido(), tarjetas_rojas=1)
+    partido = crear_partido()
+    assert _estado(client, jugador) == "ACTIVO"
+
+    _estadistica(client, jugador, partido)
+    incremental = _disciplina(client, jugador)
+    assert incremental["partidos_cumplidos"] == 0
+    assert incremental["partidos_pendientes"] == 1
+    assert _estado(client, jugador) == "SUSPENDIDO"
+
+    client.post("/jugadores/disciplina/recalcular")
+    assert _disciplina(client, jugador) == incremental
@@ -0,0 +1,17 @@
+def test_eventos_aceptan_el_nombre_del_tipo(client, crear_jugador, crear_partido):
+    jugador = crear_jugador()
+    partido = crear_partido()
+
+    respuesta = client.post(
+        f"/partidos/{partido['id']}/eventos",
+        json=[{"jugador_id": jugador["id"], "tipo": "ROJA", "minuto": 30}]
+    )
+    assert respuesta.status_code == 200, respuesta.text
+    assert client.get(f"/partidos/{partido['id']}/eventos").json()[0]["tipo"] == "ROJA"
+    assert client.get(f"/jugadores/{jugador['id']}/disciplina").json()["rojas_directas"] == 1
+
+    respuesta = client.post(
+        f"/partidos/{partido['id']}/eventos",
+        json=[{"jugador_id": jugador["id"], "tipo": "PENAL", "minuto": 31}]
+    )
+    assert respuesta.status_code == 422
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+from sqlmodel import Session
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import database
+import idempotencia
+from models import RespuestaIdempotente
+
+
+def _pendiente(clave: str, expira_en: datetime) -> None:
+    with Session(database.engine) as session:
+        session.add(RespuestaIdempotente(clave=clave, huella="otra", estado_http=0, expira_en=expira_en))
+        session.commit()
+
+
+def test_reserva_vencida_se_puede_tomar():
+    _pendiente("caida", datetime.utcnow() - timedelta(seconds=1))
+    assert idempotencia._reservar("caida", "nueva")
+
+    with Session(database.engine) as session:
+        registro = session.get(RespuestaIdempotente, "caida")
+        assert registro.huella == "nueva"
+        assert registro.expira_en <= datetime.utcnow() + idempotencia.RESERVA
+
+
+def test_reserva_vigente_no_se_toma():
+    _pendiente("en_curso", datetime.utcnow() + timedelta(seconds=30))
+    assert not idempotencia._reservar("en_curso", "nueva")
+
+
+def test_respuesta_guardada_por_el_ttl(client, session):
+    datos = {"rival": "Otro", "fecha_partido": "2025-03-01", "goles_sigmotaa": 0, "goles_rival": 0}
+    cabeceras = {idempotencia.CABECERA: "clave-1"}
+
+    primera = client.post("/partidos/", json=datos, headers=cabeceras)
+    repetida = client.post("/partidos/", json=datos, headers=cabeceras)
+
+    assert primera.status_code == 200
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert repetida.json()["id"] == primera.json()["id"]
+
+    registro = session.get(RespuestaIdempotente, idempotencia._hash(b"/partidos/", b"clave-1"))
+    assert registro.estado_http == 200
+    assert registro.expira_en > datetime.utcnow() + idempotencia.TTL - timedelta(minutes=1)
+
+
+def _app_lenta(ejecuciones: list) -> Starlette:
+    async def crear(request):
+        ejecuciones.append(1)
+        await asyncio.sleep(0.05)
+        respuesta = JSONResponse({"id": len(ejecuciones)})
+        respuesta.set_cookie("a", "1")
+        respuesta.set_cookie("b", "2")
+        return respuesta
+
+    app = Starlette(routes=[Route("/crear", crear, methods=["POST"])])
+    app.add_middleware(idempotencia.IdempotenciaMiddleware)
+    return app
+
+
+def test_duplicados_simultaneos_esperan_a_la_primera(client):
+    ejecuciones = []
+
+    async def enviar_dos():
+        transporte = httpx.ASGITransport(app=_app_lenta(ejecuciones))
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            cabeceras = {idempotencia.CABECERA: "simultanea"}
+            return await asyncio.gather(
+                cliente.post("/crear", json={}, headers=cabeceras),
+                cliente.post("/crear", json={}, headers=cabeceras)
+            )
+
+    primera, segunda = asyncio.run(enviar_dos())
+
+    assert len(ejecuciones) == 1
+    assert [primera.status_code, segunda.status_code] == [200, 200]
+    assert primera.json() == segunda.json()
+    assert sorted(c.split(";")[0] for c in primera.headers.get_list("set-cookie")) == ["a=1", "b=2"]
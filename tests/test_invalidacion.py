@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+import database
+import invalidacion
+import opciones
+import similitud
+import tablero
+from models import Partido, RespuestaIdempotente, VersionTabla
+
+
+def _sobre_versiones(registro) -> int:
+    return sum(n for huella, n in registro.huellas.items() if "versiones_tabla" in huella)
+
+
+def test_las_tablas_de_la_cache_estan_vigiladas():
+    for tablas in (tablero.TABLAS, opciones.TABLAS, similitud.TABLAS):
+        assert set(tablas) <= invalidacion.VIGILADAS
+
+
+def test_sesiones_sin_tablas_vigiladas_no_versionan():
+    with database.contar_consultas() as registro, Session(database.engine) as session:
+        session.add(RespuestaIdempotente(
+            clave="x", huella="x", estado_http=0, expira_en=datetime.utcnow() + timedelta(seconds=5)
+        ))
+        session.commit()
+    assert _sobre_versiones(registro) == 0
+
+
+def test_un_commit_vigilado_versiona_con_una_sentencia(crear_partido, session):
+    partido = session.get(Partido, crear_partido()["id"])
+    antes = session.get(VersionTabla, "partidos").version
+
+    with database.contar_consultas() as registro:
+        partido.observaciones = "Suspendido por lluvia"
+        session.add(partido)
+        session.commit()
+
+    assert _sobre_versiones(registro) == 1
+    session.expire_all()
+    assert session.exec(select(VersionTabla.version).where(VersionTabla.tabla == "partidos")).one() > antes
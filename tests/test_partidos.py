@@ -0,0 +1,8 @@
+def test_borrar_rango_vacio_misma_forma(client, crear_partido):
+    crear_partido()
+    vacio = client.delete("/partidos/", params={"desde": "2030-01-01"}).json()
+    lleno = client.delete("/partidos/", params={"hasta": "2030-01-01"}).json()
+
+    assert vacio["eventos_eliminados"] == 0
+    assert lleno["partidos_eliminados"] == 1
+    assert vacio.keys() == lleno.keys()
@@ -0,0 +1,85 @@
+import os
+import stat
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+import perfilado
+
+
+def test_perfiles_de_memoria_solapados():
+    assert not tracemalloc.is_tracing()
+    primero = perfilado.PerfilPeticion(["memoria"])
+    segundo = perfilado.PerfilPeticion(["memoria"])
+    primero.iniciar()
+    segundo.iniciar()
+
+    primero.terminar()
+    assert tracemalloc.is_tracing()
+
+    segundo.terminar()
+    assert not tracemalloc.is_tracing()
+    assert perfilado.resultado_peticion(segundo.id, "memoria") is not None
+
+
+def test_perfil_de_peticion_no_detiene_la_traza_del_admin():
+    perfilado.memoria_iniciar()
+    try:
+        perfil = perfilado.PerfilPeticion(["memoria"])
+        perfil.iniciar()
+        perfil.terminar()
+        assert tracemalloc.is_tracing()
+    finally:
+        perfilado.memoria_detener()
+    assert not tracemalloc.is_tracing()
+
+
+def test_el_perfil_de_peticion_solo_muestrea_sus_hilos():
+    detener = threading.Event()
+
+    def ajeno():
+        while not detener.is_set():
+            sum(range(1000))
+
+    hilo = threading.Thread(target=ajeno, name="ajeno")
+    hilo.start()
+    perfil = perfilado.PerfilPeticion(["cpu"])
+    perfil.iniciar()
+    try:
+        with perfil.seguir():
+            fin = time.time() + 0.05
+            while time.time() < fin:
+                sum(range(1000))
+    finally:
+        perfil.terminar()
+        detener.set()
+        hilo.join()
+
+    resultado = perfilado.resultado_peticion(perfil.id, "cpu")
+    assert "MainThread" in resultado
+    assert "ajeno" not in resultado
+
+
+def test_directorio_de_otro_usuario_rechazado(tmp_path, monkeypatch):
+    directorio = tmp_path / "perfil"
+    monkeypatch.setattr(perfilado, "DIRECTORIO", str(directorio))
+    perfilado._preparar_directorio()
+    assert stat.S_IMODE(os.lstat(directorio).st_mode) == 0o700
+
+    monkeypatch.setattr(os, "getuid", lambda: os.lstat(directorio).st_uid + 1)
+    with pytest.raises(PermissionError):
+        perfilado._preparar_directorio()
+
+
+def test_escritura_no_sigue_enlaces(tmp_path, monkeypatch):
+    monkeypatch.setattr(perfilado, "DIRECTORIO", str(tmp_path))
+    monkeypatch.setattr(perfilado.secrets, "token_hex", lambda _: "fijo")
+    victima = tmp_path / "victima"
+    victima.write_text("intacto")
+    (tmp_path / f".orden-x.json.{os.getpid()}.fijo").symlink_to(victima)
+
+    with pytest.raises(OSError):
+        perfilado._escribir("orden-x.json", "{}")
+    assert victima.read_text() == "intacto"
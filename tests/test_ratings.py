@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+import calendario
+
+
+def _historial(client) -> list:
+    return client.get("/partidos/ratings/historial").json()
+
+
+def test_un_partido_proximo_no_mueve_los_ratings(client, crear_partido, session):
+    crear_partido(rival="Jugado FC", goles_sigmotaa=2, goles_rival=0)
+    fecha = date.today() + timedelta(days=10)
+    proximo = crear_partido(rival="Proximo FC", fecha_partido=fecha.isoformat(), goles_sigmotaa=0, goles_rival=0)
+
+    assert [foto["rival"] for foto in _historial(client)] == ["Jugado FC"]
+    assert "Proximo FC" not in {e["equipo"] for e in client.get("/partidos/ratings").json()["equipos"]}
+
+    # Se carga el resultado antes de la fecha: sigue sin foto
+    respuesta = client.patch(f"/partidos/{proximo['id']}", json={"goles_sigmotaa": 1, "goles_rival": 3})
+    assert respuesta.status_code == 200
+    assert len(_historial(client)) == 1
+
+    # Llega la fecha
+    calendario.cerrar_fechas(session, hoy=fecha)
+    session.commit()
+    fotos = _historial(client)
+    assert [foto["rival"] for foto in fotos] == ["Jugado FC", "Proximo FC"]
+    assert fotos[1]["rating_sigmotaa_despues"] < fotos[1]["rating_sigmotaa_antes"]
+
+
+def test_marcador_null_se_rechaza(client, crear_partido):
+    partido = crear_partido()
+
+    respuesta = client.patch(f"/partidos/{partido['id']}", json={"goles_rival": None})
+    assert respuesta.status_code == 422
+    assert client.patch(f"/partidos/{partido['id']}", json={"goles_rival": 2}).status_code == 200
+
+
+def test_detalle_de_un_partido_proximo_muestra_el_pronostico(client, crear_partido):
+    fecha = date.today() + timedelta(days=3)
+    proximo = crear_partido(fecha_partido=fecha.isoformat())
+
+    respuesta = client.get(f"/partidos/html/detalle/{proximo['id']}")
+    assert respuesta.status_code == 200
+    assert "Resultado esperado" in respuesta.text
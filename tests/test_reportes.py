@@ -0,0 +1,30 @@
+import pytest
+
+import reportes
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(reportes, "REPORTES_DIR", tmp_path)
+    return tmp_path
+
+
+def test_el_estado_se_lee_desde_cualquier_worker(directorio):
+    trabajo = reportes.TrabajoReporte(id="0123456789ab", temporada=2024, club=None)
+    reportes._guardar(trabajo)
+
+    # Otro worker solo ve el manifiesto
+    trabajo.estado = "completado"
+    trabajo.terminado = trabajo.creado
+    trabajo.archivo = str(directorio / "temporada_2024_0123456789ab.zip")
+    reportes._guardar(trabajo)
+
+    leido = reportes.obtener("0123456789ab")
+    assert leido.resumen() == trabajo.resumen()
+    assert leido.archivo == trabajo.archivo
+    assert [t.id for t in reportes.listar()] == ["0123456789ab"]
+    assert reportes.obtener("0123456789ab", club="otro") is None
+
+
+def test_ids_invalidos_no_salen_del_directorio(directorio):
+    assert reportes.obtener("../../etc/passwd") is None
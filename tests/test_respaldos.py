@@ -0,0 +1,65 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import database
+import perfilado
+import respaldos
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(respaldos, "RESPALDO_DIR", tmp_path)
+    return tmp_path
+
+
+def test_respaldo_verificado(directorio, crear_jugador):
+    crear_jugador()
+    manifiesto = respaldos.crear_respaldo()
+
+    assert manifiesto["conteos"]["jugadores"] == 1
+    assert respaldos.verificar(manifiesto["directorio"])["valido"]
+
+
+def test_con_clubes_no_hay_respaldo_parcial(directorio, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL_CLUB", "sqlite:///./clubes/{club}.db")
+
+    with pytest.raises(respaldos.RespaldoError):
+        respaldos.crear_respaldo()
+    assert respaldos.iniciar_programados(60) is None
+    assert not list(directorio.iterdir())
+
+
+def test_las_escrituras_que_reinician_la_copia_pasan_a_vacuum_into(directorio, crear_jugador, monkeypatch):
+    crear_jugador()
+    monkeypatch.setattr(respaldos, "PAGINAS_POR_PASO", 1)
+    monkeypatch.setattr(respaldos, "MAX_REINICIOS", 2)
+
+    # Una escritura de otra conexión en cada pausa entre pasos
+    def escribir(_):
+        with sqlite3.connect(database.engine.url.database) as conexion:
+            conexion.execute("UPDATE versiones_tabla SET version = version + 1")
+    monkeypatch.setattr(respaldos, "time", SimpleNamespace(
+        sleep=escribir, monotonic=time.monotonic, time=time.time
+    ))
+
+    manifiesto = respaldos.crear_respaldo()
+
+    assert manifiesto["metodo"] == "vacuum_into"
+    assert manifiesto["reinicios"] == 3
+    assert respaldos.verificar(manifiesto["directorio"])["valido"]
+
+
+def test_el_listado_exige_el_token_de_administracion(client, directorio, monkeypatch):
+    monkeypatch.setattr(perfilado, "ADMIN_TOKEN", "secreto")
+    respaldos.crear_respaldo()
+
+    assert client.get("/api/respaldos").status_code == 404
+    assert client.get("/admin/respaldos").status_code == 401
+
+    listado = client.get("/admin/respaldos", headers={"X-Admin-Token": "secreto"})
+    assert listado.status_code == 200
+    assert len(listado.json()) == 1
+    assert "directorio" not in listado.json()[0]